@@ -0,0 +1,188 @@
+"""Geometry backends that SuperSolid trees are rendered with
+
+OpenSCADBackend renders any tree, in an OpenSCAD subprocess. NumpyBackend only renders trees that are
+convex hulls, primitives and polyhedra under transforms, but it does so directly with scipy's qhull,
+without writing any files. prepare picks the fastest capable backend for the whole tree, and
+otherwise lets the faster backends render the hulls they can, so OpenSCAD gets them as ready
+made polyhedra and never runs CGAL on them.
+"""
+import copy
+import os
+import numpy as np
+import mesh
+import scad
+from render import OPENSCAD, render_stl
+from super_solid import Cube, Cylinder, Sphere, Polyhedron, Hull, Difference, Intersection
+
+PRIMITIVES = (Cube, Cylinder, Sphere, Polyhedron)
+
+
+class Backend():
+    """Renders SuperSolid trees to STL files"""
+    name = None
+
+    def supports(self, node):
+        """Whether the whole subtree of node can be rendered by this backend"""
+        raise NotImplementedError()
+
+    def render(self, node, stl_path):
+        raise NotImplementedError()
+
+
+class OpenSCADBackend(Backend):
+    name = 'openscad'
+
+    def __init__(self, openscad=OPENSCAD, precision=scad.DEFAULT_PRECISION):
+        """
+        Args:
+            openscad: OpenSCAD executable
+            precision: numbers in the .scad files are rounded to a multiple of this
+        """
+        self.openscad = openscad
+        self.precision = precision
+
+    def supports(self, node):
+        return True
+
+    def render(self, node, stl_path, scad_path=None):
+        """Write the tree next to the STL file, or use the already written scad_path, and render it"""
+        if scad_path is None:
+            scad_path = os.path.splitext(stl_path)[0] + '.scad'
+            node.write_scad(scad_path, precision=self.precision)
+        return render_stl(scad_path, stl_path, openscad=self.openscad)
+
+
+class NumpyBackend(Backend):
+    """Renders hulls, primitives and polyhedra under transforms, which are all a single convex hull or mesh"""
+    name = 'numpy'
+
+    def __init__(self):
+        self.memo = {}  # node id: (node, supported), the node is kept so the id stays unique
+
+    def supports(self, node):
+        """Transforms with a single supported child, hulls of trees without booleans, and primitives"""
+        memo = self.memo
+        stack = [(node, False)]
+        while stack:
+            current, expanded = stack.pop()
+            if id(current) in memo:
+                continue
+            if not expanded:
+                stack.append((current, True))
+                stack.extend((child, False) for child in current.children if id(child) not in memo)
+                continue
+            children = [memo[id(child)][1] for child in current.children]
+            if isinstance(current, PRIMITIVES):
+                supported = 'mesh'
+            elif isinstance(current, (Difference, Intersection)):
+                supported = False
+            elif isinstance(current, Hull):
+                # the hull only needs the points of the children, they are exact without booleans
+                supported = 'mesh' if all(children) else False
+            elif current.is_transform and len(children) == 1 and children[0] == 'mesh':
+                supported = 'mesh'
+            else:
+                # unions are only valid below a hull, where their points are all that matters
+                supported = 'points' if all(children) else False
+            memo[id(current)] = (current, supported)
+        return memo[id(node)][1] == 'mesh'
+
+    def to_mesh(self, node):
+        """The mesh of a supported tree, in the frame of node"""
+        matrix = np.eye(4)
+        base = node
+        while base.is_transform:
+            matrix = matrix @ base.matrix
+            base = base.children[0]
+        if isinstance(base, Polyhedron):
+            return base.to_mesh().transform(matrix)
+        return convex_hull(node.get_points())
+
+    def render(self, node, stl_path):
+        self.to_mesh(node).save(stl_path)
+        return stl_path
+
+
+def convex_hull(points):
+    """Convex hull of points as a mesh, with the triangles facing outward
+    Raises:
+        ValueError: if the points do not span a volume
+    """
+    from scipy.spatial import ConvexHull, QhullError
+    try:
+        hull = ConvexHull(points)
+    except QhullError as e:
+        raise ValueError(f'Degenerate convex hull of {len(points)} points') from e
+    vertices = hull.points[hull.simplices]
+    normals = np.cross(vertices[:, 1] - vertices[:, 0], vertices[:, 2] - vertices[:, 0])
+    inward = np.einsum('ij,ij->i', normals, hull.equations[:, :3]) < 0
+    vertices[inward] = vertices[inward][:, ::-1]
+    return mesh.Mesh(vertices)
+
+
+def lower(root, backend):
+    """Replace the hulls that backend can render by polyhedra of their meshes
+    Transforms above the hulls are kept, so shared subtrees stay shared.
+    Args:
+        root: SuperSolid tree
+        backend: a backend with a to_mesh method, like NumpyBackend
+    Returns:
+        the new tree, root itself if nothing was replaced
+    """
+    memo = {}
+    stack = [(root, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if id(node) in memo:
+            continue
+        if not expanded:
+            if isinstance(node, Hull) and backend.supports(node):
+                try:
+                    memo[id(node)] = backend.to_mesh(node).to_polyhedron()
+                    continue
+                except ValueError:  # flat hulls are left to OpenSCAD
+                    pass
+            stack.append((node, True))
+            stack.extend((child, False) for child in node.children if id(child) not in memo)
+            continue
+        children = [memo[id(child)] for child in node.children]
+        if all(a is b for a, b in zip(children, node.children)):
+            memo[id(node)] = node
+        else:
+            clone = copy.copy(node)
+            clone.children = children
+            memo[id(node)] = clone
+    return memo[id(root)]
+
+
+def get_backends(name='auto', openscad=OPENSCAD, precision=scad.DEFAULT_PRECISION):
+    """Backends in order of preference
+    Args:
+        name: 'auto' for all backends, or the name of a single backend
+    """
+    backends = [NumpyBackend(), OpenSCADBackend(openscad=openscad, precision=precision)]
+    if name == 'auto':
+        return backends
+    selected = [backend for backend in backends if backend.name == name]
+    if not selected:
+        raise ValueError(f'Unknown backend {name}, use auto or one of {", ".join(b.name for b in backends)}')
+    return selected
+
+
+def select_backend(node, backends):
+    """The first backend that can render the whole tree"""
+    for backend in backends:
+        if backend.supports(node):
+            return backend
+    raise ValueError(f'None of the backends {", ".join(b.name for b in backends)} can render this tree')
+
+
+def prepare(node, backends):
+    """Pick the backend for a tree, and lower the subtrees that faster backends can render
+    Returns:
+        (backend, tree to render with it)
+    """
+    backend = select_backend(node, backends)
+    for faster in backends[:backends.index(backend)]:
+        node = lower(node, faster)
+    return backend, node
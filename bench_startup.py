@@ -0,0 +1,35 @@
+"""Startup benchmark: time `import main` and `main.py --help` in fresh interpreters
+
+Every worker process pays this cost, so heavy dependencies (scipy, yaml)
+should only be imported when they are first used.
+"""
+import argparse
+import subprocess
+import sys
+import time
+
+COMMANDS = {
+    'import main': [sys.executable, '-c', 'import main'],
+    'main.py --help': [sys.executable, 'main.py', '--help'],
+    'import hotswap_holder': [sys.executable, '-c', 'import hotswap_holder'],
+}
+
+
+def time_command(command, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return min(times), sum(times) / len(times)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', default=10, type=int,
+                           help='Number of runs per command')
+    args = parser.parse_args()
+
+    for name, command in COMMANDS.items():
+        best, mean = time_command(command, args.repeat)
+        print(f'{name:>24}: best {best * 1000:7.1f} ms, mean {mean * 1000:7.1f} ms')
@@ -0,0 +1,113 @@
+from types import SimpleNamespace
+import numpy as np
+
+# relative weights of the operations in the render cost estimate
+BOOLEAN_WEIGHT = 1.0
+HULL_WEIGHT = 0.05
+
+BOOLEAN_NAMES = ('union', 'difference', 'intersection')
+
+
+def get_fragments(r, segments):
+    """Number of fragments OpenSCAD uses for a circle of radius r (see get_fragments_from_r)
+    Args:
+        r: radius
+        segments: number of segments ($fn), see resolved_segments of Cylinder and Sphere
+    """
+    if r < 1e-6:
+        return 3
+    return max(int(segments), 3)
+
+
+def primitive_size(node):
+    """Number of vertices and facets (triangles) of a primitive node"""
+    if node.name == 'cube':
+        return 8, 12
+    if node.name == 'cylinder':
+        n = get_fragments(max(node.r1, node.r2), node.resolved_segments())
+        if min(node.r1, node.r2) <= 0:
+            return n + 1, 2 * n - 2
+        return 2 * n, 4 * n - 4
+    if node.name == 'sphere':
+        n = get_fragments(node.r, node.resolved_segments())
+        rings = (n + 1) // 2
+        return n * rings, 2 * n * (rings - 1) + 2 * (n - 2)
+    if node.name == 'polyhedron':
+        return len(node.points), len(node.faces) * (node.faces.shape[1] - 2)
+    return 0, 0
+
+
+def analyze(root):
+    """Collect static complexity statistics for a SuperSolid tree, without rendering it
+    Shared subtrees are counted once per place they are used, like OpenSCAD evaluates them, also the
+    ScadModule bodies that the scad file only writes once.
+    Args:
+        root: SuperSolid object
+    Returns:
+        SimpleNamespace with the node count, depth, hull/boolean counts,
+        primitive counts, vertex and facet estimates, and the estimated render cost
+    """
+    fields = ('nodes', 'depth', 'hulls', 'booleans', 'primitives', 'vertices', 'facets', 'cost')
+    memo = {}
+    stack = [(root, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if id(node) in memo:
+            continue
+        if not expanded:
+            stack.append((node, True))
+            stack.extend((child, False) for child in node.children if id(child) not in memo)
+            continue
+
+        children = [memo[id(child)] for child in node.children]
+        stats = {field: sum(c[field] for c in children) for field in fields}
+        stats['nodes'] += 1
+        stats['depth'] = 1 + max([c['depth'] for c in children], default=0)
+
+        if not children:
+            vertices, facets = primitive_size(node)
+            stats['primitives'] += 1
+            stats['vertices'] = vertices
+            stats['facets'] = facets
+        elif node.name in BOOLEAN_NAMES:
+            # CGAL folds the children pairwise, so every step pays for everything before it
+            stats['booleans'] += 1
+            accumulated = children[0]['facets']
+            for c in children[1:]:
+                accumulated += c['facets']
+                stats['cost'] += BOOLEAN_WEIGHT * accumulated
+        elif node.name == 'hull':
+            stats['hulls'] += 1
+            vertices = stats['vertices']
+            stats['facets'] = min(stats['facets'], max(2 * vertices - 4, 0))
+            stats['cost'] += HULL_WEIGHT * vertices * np.log2(max(vertices, 2))
+
+        memo[id(node)] = stats
+
+    return SimpleNamespace(**memo[id(root)])
+
+
+def format_report(stats, name='model'):
+    """Human readable complexity report"""
+    return (f'{name}: {stats.nodes} nodes, depth {stats.depth}, '
+            f'{stats.booleans} booleans, {stats.hulls} hulls, {stats.primitives} primitives, '
+            f'~{stats.facets} facets, estimated cost {stats.cost:.3g}')
+
+
+def check_budget(stats, budget, name='model'):
+    """Raise if any of the limits in budget is exceeded
+    Args:
+        stats: result of analyze
+        budget: dict with optional max_nodes, max_depth, max_facets and max_cost, None values are ignored
+        name: name of the model, for the error message
+    """
+    if not budget:
+        return
+    exceeded = []
+    for key, value in budget.items():
+        if not key.startswith('max_') or not hasattr(stats, key[4:]):
+            raise ValueError(f'Unknown render budget entry {key}')
+        if value is not None and getattr(stats, key[4:]) > value:
+            exceeded.append(f'{key[4:]} {getattr(stats, key[4:]):.3g} > {value}')
+    if exceeded:
+        raise RuntimeError(f'Render budget exceeded for {name}: ' + ', '.join(exceeded))
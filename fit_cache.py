@@ -0,0 +1,70 @@
+"""On-disk cache of fit results, so builds with unchanged inputs skip the optimizers
+
+Results are keyed by a hash of the input points. Every fit function has its own cache file, which is
+versioned with a hash of the source of the module the function is defined in: any change to the fit
+code, including its helpers, starts a new cache.
+"""
+import hashlib
+import inspect
+import os
+import pickle
+
+CACHE_DIR = '.cache/fits'
+
+
+def points_key(points):
+    """Hash of a point array, including its shape and dtype"""
+    h = hashlib.sha1(repr((points.shape, points.dtype.str)).encode())
+    h.update(points.tobytes())
+    return h.hexdigest()
+
+
+def code_version(function):
+    """Hash of the source of the module that defines function"""
+    with open(inspect.getsourcefile(function), 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+class FitCache():
+    """Results of one fit function, stored in a single pickle file
+    New results are only kept in memory until save() is called, once after a build.
+    """
+
+    def __init__(self, function, directory=CACHE_DIR):
+        self.function = function
+        self.path = os.path.join(directory, f'{function.__name__}.pkl')
+        self.version = code_version(function)
+        self.entries = self.load()
+        self.dirty = False
+
+    def load(self):
+        """The stored results, an empty cache if the file is missing, unreadable or from other fit code"""
+        try:
+            with open(self.path, 'rb') as f:
+                stored = pickle.load(f)
+        except Exception:  # truncated or corrupt files raise almost anything while unpickling
+            return {}
+        if not isinstance(stored, dict) or not isinstance(stored.get('entries'), dict):
+            return {}
+        if stored.get('version') != self.version:  # the fit code changed, old results are dropped
+            return {}
+        return stored['entries']
+
+    def save(self):
+        """Write the results to disk, if there are new ones"""
+        if not self.dirty:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({'version': self.version, 'entries': self.entries}, f)
+        os.replace(tmp_path, self.path)  # never leave a half written cache behind
+        self.dirty = False
+
+    def __call__(self, points):
+        """Run the fit on points, or return the stored result"""
+        key = points_key(points)
+        if key not in self.entries:
+            self.entries[key] = self.function(points)
+            self.dirty = True
+        return self.entries[key]
@@ -0,0 +1,174 @@
+"""Layout optimizer: searches the column parameters of the key grid for fingertip target points
+
+Candidate layouts are placed in batches with placement.torus_key_matrices, no CSG is built in the loop.
+The search is a cross entropy method: sample candidates around a mean, keep the best ones, and move the
+mean and spread of the samples to them.
+"""
+import numpy as np
+from metrics import get_cap_tops, get_metrics, get_neighbour_pairs
+from placement import torus_key_matrices
+
+# per column parameter: number of values, initial spread of the search
+COLUMN_PARAMETERS = {
+    'angle': (1, 3.),
+    'row_radius': (1, 10.),
+    'row_angle_offset': (1, 3.),
+    'z_rotation_angle': (1, 2.),
+    'column_offset': (3, 3.),
+}
+MIN_ROW_RADIUS = 5.
+
+
+class LayoutOptimizer():
+    """Fits the column parameters, so the keycap tops of chosen keys reach their targets"""
+
+    def __init__(self, kb, targets, min_spacing=18., spacing_weight=10.):
+        """
+        Args:
+            kb: Keyboard, for the fixed parameters and the starting layout
+            targets: list of dicts with col, row and point, the point where the keycap top of that key should be
+            min_spacing: minimum distance between the keycap tops of neighbouring keys, in mm
+            spacing_weight: weight of the spacing penalty relative to the squared target distances
+        """
+        self.kb = kb
+        self.ncols = kb.args.ncols
+        positions = kb.get_key_positions()
+        index = {position: k for k, position in enumerate(positions)}
+        self.rows, self.cols = np.array(positions).T
+        missing = [t for t in targets if (t['row'], t['col']) not in index]
+        if missing:
+            raise ValueError(f'Targets for keys that are not in the layout: {missing}')
+        self.target_index = np.array([index[(t['row'], t['col'])] for t in targets])
+        self.target_points = np.array([t['point'] for t in targets], dtype=float)
+        self.pairs = np.concatenate(get_neighbour_pairs(positions), axis=0)
+        self.min_spacing = min_spacing
+        self.spacing_weight = spacing_weight
+
+    def get_vector(self):
+        """The current layout of the keyboard as a flat parameter vector"""
+        kb = self.kb
+        columns = {
+            'angle': [kb.major_angle[j] for j in range(self.ncols)],
+            'row_radius': [kb.minor_radii[j] for j in range(self.ncols)],
+            'row_angle_offset': [kb.minor_angle_offset[j] for j in range(self.ncols)],
+            'z_rotation_angle': [kb.z_rotation_angle[j] for j in range(self.ncols)],
+            'column_offset': [kb.column_offsets[j] for j in range(self.ncols)],
+        }
+        return np.concatenate([np.ravel(np.array(columns[name], dtype=float)) for name in COLUMN_PARAMETERS])
+
+    def get_spread(self):
+        return np.concatenate([np.full(size * self.ncols, spread) for size, spread in COLUMN_PARAMETERS.values()])
+
+    def unpack(self, vectors):
+        """Split parameter vectors [C, n] into a dict of [C, ncols] arrays, [C, ncols, 3] for column_offset"""
+        layout = {}
+        start = 0
+        for name, (size, _) in COLUMN_PARAMETERS.items():
+            values = vectors[:, start:start + size * self.ncols]
+            layout[name] = values.reshape((-1, self.ncols, 3)) if size == 3 else values
+            start += size * self.ncols
+        return layout
+
+    def get_key_matrices(self, vectors):
+        """Placements of every key, for a batch of layouts
+        Args:
+            vectors: [C, n] parameter vectors
+        Returns:
+            [C, n_keys, 4, 4] array
+        """
+        kb = self.kb
+        layout = self.unpack(np.atleast_2d(vectors))
+        cols = self.cols
+        return torus_key_matrices(
+            row_radii=layout['row_radius'][:, cols] + kb.cth,
+            row_angles=layout['row_angle_offset'][:, cols] + kb.args.alpha * self.rows,
+            column_radii=np.array([kb.major_radii[j] + kb.cth for j in cols]),
+            column_angles=layout['angle'][:, cols],
+            z_angles=layout['z_rotation_angle'][:, cols],
+            column_offsets=layout['column_offset'][:, cols],
+            tenting_angle=kb.tenting_angle,
+            z_offset=kb.keyboard_z_offset)
+
+    def get_cap_tops(self, vectors):
+        """Keycap top centers of every key, for a batch of layouts, as [C, n_keys, 3] array"""
+        return get_cap_tops(self.get_key_matrices(vectors), self.kb.cth)
+
+    def get_metrics(self, vectors, home_row=1):
+        """Ergonomic metrics of a batch of layouts, see metrics.get_metrics"""
+        placement = self.kb.get_placement()
+        placement['key_matrices'] = self.get_key_matrices(vectors)
+        return get_metrics(**placement, home_row=home_row)
+
+    def evaluate(self, vectors):
+        """Loss of a batch of layouts: squared target distances plus the spacing penalty
+        Returns:
+            [C] array
+        """
+        tops = self.get_cap_tops(vectors)
+        loss = np.square(tops[:, self.target_index] - self.target_points).sum(axis=(1, 2))
+        if len(self.pairs):
+            distances = np.linalg.norm(tops[:, self.pairs[:, 0]] - tops[:, self.pairs[:, 1]], axis=-1)
+            loss += self.spacing_weight * np.square(np.maximum(self.min_spacing - distances, 0.)).sum(axis=1)
+        return loss
+
+    def optimize(self, iterations=100, population=1000, elite_fraction=0.05, seed=0):
+        """Search the column parameters, starting from the current layout
+        Returns:
+            (best parameter vector, its loss)
+        """
+        rng = np.random.default_rng(seed)
+        mean = self.get_vector()
+        spread = self.get_spread()
+        radius_index = self.unpack(np.arange(len(mean))[None, :].astype(float))['row_radius'][0].astype(int)
+        best, best_loss = mean, self.evaluate(mean)[0]
+        n_elite = max(2, int(population * elite_fraction))
+        for _ in range(iterations):
+            samples = mean + spread * rng.standard_normal((population, len(mean)))
+            samples[0] = best
+            samples[:, radius_index] = np.maximum(samples[:, radius_index], MIN_ROW_RADIUS)
+            losses = self.evaluate(samples)
+            order = np.argsort(losses)
+            if losses[order[0]] < best_loss:
+                best, best_loss = samples[order[0]], losses[order[0]]
+            elite = samples[order[:n_elite]]
+            mean = elite.mean(axis=0)
+            spread = elite.std(axis=0) + 1e-3
+        return best, best_loss
+
+    def to_config(self, vector):
+        """Column entries for the yaml configuration, for a parameter vector"""
+        layout = self.unpack(np.atleast_2d(vector))
+        columns = {}
+        for j in range(self.ncols):
+            columns[f'column_{j}'] = {
+                'angle': float(layout['angle'][0, j]),
+                'nrows': int(self.kb.column_nrows[j]),
+                'row_angle_offset': float(layout['row_angle_offset'][0, j]),
+                'z_rotation_angle': float(layout['z_rotation_angle'][0, j]),
+                'column_offset': [float(x) for x in layout['column_offset'][0, j]],
+                'row_radius': float(layout['row_radius'][0, j]),
+            }
+        return columns
+
+
+def optimize_layout(kb, path):
+    """Optimize the layout for the targets in a yaml file, and print the resulting column configuration
+    The file has a list of targets ({col, row, point}), and optionally min_spacing, spacing_weight,
+    iterations and population.
+    """
+    import time
+    import yaml
+    with open(path, 'r') as f:
+        spec = yaml.safe_load(f)
+    optimizer = LayoutOptimizer(kb, spec['targets'], min_spacing=spec.get('min_spacing', 18.),
+                                spacing_weight=spec.get('spacing_weight', 10.))
+    iterations = spec.get('iterations', 100)
+    population = spec.get('population', 1000)
+    start_loss = optimizer.evaluate(optimizer.get_vector())[0]
+    start = time.perf_counter()
+    best, best_loss = optimizer.optimize(iterations=iterations, population=population)
+    elapsed = time.perf_counter() - start
+    print(f'Evaluated {iterations * population} layouts in {elapsed:.2f}s '
+          f'({iterations * population / elapsed:.0f}/s), loss {start_loss:.3f} -> {best_loss:.3f}')
+    print(yaml.safe_dump(optimizer.to_config(best), default_flow_style=None, sort_keys=False))
+    return best
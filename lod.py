@@ -0,0 +1,47 @@
+"""Level of detail policy for round primitives
+
+Like OpenSCAD's $fa/$fs, the number of segments of a circle follows from its radius,
+here from the largest allowed chord error: the distance between the true circle and the
+polygon edges. Primitives without explicit segments are resolved with the active policy
+when they are written, so the same tree can be emitted as a quick draft or a final model.
+"""
+import numpy as np
+
+LOD_MODES = {
+    # fast, low poly previews, round parts get about 20x fewer facets than in final
+    'draft': {'tolerance': 0.25, 'min_segments': 6, 'max_segments': 24},
+    # full fidelity exports
+    'final': {'tolerance': 0.005, 'min_segments': 16, 'max_segments': 500},
+}
+
+_policy = dict(LOD_MODES['final'], mode='final')
+
+
+def set_lod(mode, tolerance=None):
+    """Select the level of detail
+    Args:
+        mode: one of LOD_MODES
+        tolerance: chord error in mm, overrides the tolerance of the mode
+    """
+    if mode not in LOD_MODES:
+        raise ValueError(f'Unknown level of detail {mode}, use one of {", ".join(LOD_MODES)}')
+    _policy.clear()
+    _policy.update(LOD_MODES[mode], mode=mode)
+    if tolerance is not None:
+        _policy['tolerance'] = tolerance
+
+
+def get_lod():
+    """The active policy: mode, tolerance, min_segments and max_segments"""
+    return dict(_policy)
+
+
+def segments_for_radius(r):
+    """Number of segments for a circle of radius r, such that the chord error stays below the tolerance"""
+    tolerance = _policy['tolerance']
+    if r <= tolerance:
+        n = 0
+    else:
+        # a chord spanning an angle 2 * pi / n lies r * (1 - cos(pi / n)) from the circle
+        n = int(np.ceil(np.pi / np.arccos(1 - tolerance / r)))
+    return int(np.clip(n, _policy['min_segments'], _policy['max_segments']))
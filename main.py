@@ -1,27 +1,62 @@
 import argparse
 from super_solid import Cube, Cylinder, Sphere
 from super_solid import Union, Difference, Intersection, Hull
-from super_solid import Translate, Mirror, Scale, Rotate
-from super_solid import rotation_matrix
-from solid import scad_render_to_file
+from super_solid import Translate, Mirror, Scale, Rotate, MultMatrix, ScadModule
+from super_solid import rotation_matrix, union_all
 import sys
+import os
 import numpy as np
 from collections import defaultdict
 from thumb_utils import fit_cone_to_points, fit_oriented_box_to_extent, get_cone, get_conical_shell, get_points_from_transform
-from utils import cube_around_points, cube_surrounding_column, get_cylindrical_shell, get_holder_with_hook, get_hulls, get_y_wall_between_points, rotate_around_origin, get_spherical_shell, half_cylindrical_shell
+from utils import HullGrid, cube_around_points, cube_surrounding_column, get_cylindrical_shell, get_holder_with_hook, get_hulls, get_y_wall_between_points, rotate_around_origin, get_spherical_shell, half_cylindrical_shell
 from shell import CylinderShell, BoxShell, RoundedBoxShell, SphericalShell, ConicalShell, TentedRoundedShell, WalledCylinderShells, half_cylinder_shell
-import yaml
+from shell import get_tented_base, get_tented_screw_corners, get_top_sphere_offsets
+from complexity import analyze, check_budget, format_report
+from watch import watch
+from lod import LOD_MODES, set_lod
+from placement import affine_matrices, box_corners, euler_matrices, rotation_matrices, torus_key_matrices, transform_points, write_placement_table
+from hotswap_holder import get_hotswap_module
+from projection import project_outlines, rectangle, write_projection
+from render import OPENSCAD, render_all, stitch_partitions, write_partitions
+from mesh import mirror_stl
+from backends import get_backends, prepare
+from fit_cache import FitCache
+from layout import optimize_layout
+from metrics import get_metrics
+from profiling import Profiler
 from types import SimpleNamespace
-from pprint import pprint
 
 eps = 1e-1
+# space the cut boxes leave around the model, so their faces never coincide with the faces of the model
+CUT_MARGIN = 10.
+
+# the thumb cluster that was built in before the thumbs moved to the config, used for configs without thumbs
+DEFAULT_THUMB_ORIGIN = [-4.18483045012826, -33.155898546096395, 24.16276298368095]
+DEFAULT_THUMBS = [
+    {'rotation': [14., -15., 10.], 'offset': [-15., -10., 5.]},
+    {'rotation': [10., -23., 25.], 'offset': [-35., -16., -2.]},
+    {'rotation': [10., -23., 25.], 'offset': [-23., -34., -6.]},
+    {'rotation': [6., -34., 35.], 'offset': [-39., -43., -16.]},
+    {'rotation': [6., -32., 35.], 'offset': [-51., -25., -11.5]},
+]
 
 class Keyboard():
 
     def __init__(self, args):
 
+        # caches that stay valid when the config is reloaded
+        self.fit_cache = {}
+        self.written_digests = {}
+
+        self.configure(args)
+
+    def configure(self, args):
+        """(Re)load the configuration, caches are kept"""
+        self.cli_args = args
         self.load_config(args)
         self.parse_config()
+        set_lod(self.args.lod, tolerance=self.args.lod_tolerance)
+        self.profiler = Profiler(enabled=self.args.profile, memory=self.args.profile_memory)
 
         # self.args = args
 
@@ -30,7 +65,20 @@ class Keyboard():
         self.cap_top_height = self.args.plate_thickness + self.args.key_height  #this is the distance from the bottom of the plate, to top of key
         self.cth = self.cap_top_height # shortcut
 
+    def reload(self):
+        self.configure(self.cli_args)
+
+    def __getstate__(self):
+        """Worker processes only need the configuration, the caches and the built models stay here"""
+        state = self.__dict__.copy()
+        for name in ('fit_cache', 'written_digests', 'profiler', 'top_model', 'bottom_model', 'top_and_bottom',
+                     'mirrored_top_model', 'mirrored_bottom_model', 'output_modules'):
+            state.pop(name, None)
+        return state
+
     def load_config(self, args):
+        import yaml
+        from pprint import pprint
         with open(f'config/{args.config}.yaml', 'r') as f:
             config = yaml.safe_load(f)
         print(f'Using {args.config} configuration:')
@@ -38,9 +86,6 @@ class Keyboard():
         self.args = SimpleNamespace(**config, **args.__dict__)
 
     def parse_config(self):
-        #TODO: clean up
-        self.thumb_offsets = np.array([6., -3., 7.])
-
         for i in range(self.args.ncols):
             if not hasattr(self.args, f'column_{i}'):
                 column_dict = {'angle': i * self.args.beta + self.args.column_angle_offset}
@@ -59,8 +104,28 @@ class Keyboard():
         self.column_offsets = {i : getattr(self.args, f'column_{i}')['column_offset']  for i in range(self.args.ncols)}
         self.column_nrows = {i : getattr(self.args, f'column_{i}')['nrows']  for i in range(self.args.ncols)}
 
+        self.parse_thumbs()
+        self.thumb_matrices = self.get_thumb_matrices()
+
 
 
+    def parse_thumbs(self):
+        """Thumb keys from the thumbs and thumb_origin entries of the config
+        Older configs only have n_thumbs, they get the first keys of the former built in thumb cluster.
+        """
+        if not hasattr(self.args, 'thumbs'):
+            n_thumbs = getattr(self.args, 'n_thumbs', len(DEFAULT_THUMBS))
+            if n_thumbs > len(DEFAULT_THUMBS):
+                raise ValueError(f'n_thumbs is {n_thumbs}, but only {len(DEFAULT_THUMBS)} thumb keys are built in, '
+                                 f'set the thumbs (and thumb_origin) entries of the config instead')
+            self.args.thumbs = DEFAULT_THUMBS[:n_thumbs]
+        elif getattr(self.args, 'n_thumbs', len(self.args.thumbs)) != len(self.args.thumbs):
+            raise ValueError(f'n_thumbs is {self.args.n_thumbs}, but thumbs has {len(self.args.thumbs)} keys, '
+                             f'remove n_thumbs from the config')
+        if not hasattr(self.args, 'thumb_origin'):
+            self.args.thumb_origin = DEFAULT_THUMB_ORIGIN
+        self.args.n_thumbs = len(self.args.thumbs)
+
     #TODO: clean up
     def single_keyhole(self):
 
@@ -85,7 +150,7 @@ class Keyboard():
         nw = 2.75  # nub width
         rotation = Rotate(90, [1, 0, 0])
         translation = Translate([kw /2, 0, 0])
-        partial_side_nub_1 = rotation(translation(Cylinder(1.0, r=nw, center=True, segments=30)))
+        partial_side_nub_1 = rotation(translation(Cylinder(1.0, r=nw, center=True)))
         partial_side_nub_2 = Translate([kr / 2 + kw / 2, 0, st / 2])(Cube([kr, nw, st], center=True))
         side_nub = Translate([0., 0., pt - st])(Hull()(partial_side_nub_1, partial_side_nub_2))
 
@@ -171,61 +236,128 @@ class Keyboard():
         shape = shape.translate(np.array([0., 0., self.keyboard_z_offset]))
         return shape
 
+    def get_key_positions(self):
+        """(row, col) of every key of the main grid, in the order keys are placed"""
+        return [(i, j) for j in range(self.args.ncols) for i in range(self.column_nrows[j])]
+
+    def get_key_matrices(self, tent_and_z_offset=True):
+        """Placement of every key of the main grid as a stack of 4x4 matrices, the batched transform_switch
+        Returns:
+            [n_keys, 4, 4] array, in the order of get_key_positions
+        """
+        rows, cols = np.array(self.get_key_positions()).T
+        return torus_key_matrices(
+            row_radii=np.array([self.minor_radii[j] + self.cth for j in cols]),
+            row_angles=np.array([self.minor_angle_offset[j] + self.minor_angle_delta[j] * i for i, j in zip(rows, cols)]),
+            column_radii=np.array([self.major_radii[j] + self.cth for j in cols]),
+            column_angles=np.array([self.major_angle[j] for j in cols]),
+            z_angles=np.array([self.z_rotation_angle[j] for j in cols]),
+            column_offsets=np.array([self.column_offsets[j] for j in cols], dtype=float),
+            tenting_angle=self.tenting_angle if tent_and_z_offset else None,
+            z_offset=self.keyboard_z_offset if tent_and_z_offset else None)
+
+    def get_switch_matrices(self):
+        """Placement of every switch, the main grid followed by the thumbs, as [n_keys + n_thumbs, 4, 4] array"""
+        return np.concatenate([self.get_key_matrices(), self.thumb_matrices], axis=0)
+
+    def get_placement(self):
+        """Placements of all keys, with the sizes the placement metrics need, no CSG is built"""
+        kr = self.args.key_hole_rim_width
+        return {'key_matrices': self.get_key_matrices(),
+                'thumb_matrices': self.thumb_matrices,
+                'positions': self.get_key_positions(),
+                'cth': self.cth,
+                'keyhole_size': np.array([self.args.keyswitch_width + 2 * kr, self.args.keyswitch_height + 2 * kr])}
+
+    def get_metrics(self, home_row=1):
+        """Ergonomic metrics of the layout, see metrics.get_metrics"""
+        return get_metrics(**self.get_placement(), home_row=home_row)
+
+    def get_hotswap_holders(self):
+        """A hotswap socket holder under every switch, all placing one shared OpenSCAD module"""
+        holder = get_hotswap_module(keyswitch_width=self.args.keyswitch_width, keyswitch_height=self.args.keyswitch_height)
+        return [MultMatrix(matrix)(holder) for matrix in self.get_switch_matrices()]
+
+    def get_plate_outlines(self):
+        """Outlines of the switch holes and of the keyholes around them, projected onto the xy plane
+        Returns:
+            dict of layer name to [n_switches, 4, 2] array
+        """
+        kr = self.args.key_hole_rim_width
+        kw = self.args.keyswitch_width
+        kh = self.args.keyswitch_height
+        matrices = self.get_switch_matrices()
+        return {'keyholes': project_outlines(matrices, rectangle(kw + 2 * kr, kh + 2 * kr)),
+                'cutouts': project_outlines(matrices, rectangle(kw, kh))}
+
+    def write_projections(self, fnames=('things/plate_projection.svg', 'things/plate_projection.dxf')):
+        """Write the plate outlines, from the key placements only, no 3D model is built"""
+        layers = self.get_plate_outlines()
+        for fname in fnames:
+            write_projection(fname, layers)
+        return list(fnames)
+
+    def get_placement_table(self):
+        """Placement of every key, thumb key, screw insert and hotswap holder, without building any CSG
+        Returns:
+            dict of arrays: kind [N] ('key', 'thumb', 'screw' or 'holder'), index [N] within its kind,
+            row [N] and col [N] of keys (-1 for the others) and matrix [N, 4, 4]
+        """
+        key_matrices = self.get_key_matrices()
+        screws = self.get_screw_positions(self.get_screw_corners())
+        screw_z = np.full((len(screws), 1), self.get_case_split_z())
+        parts = [('key', key_matrices, self.get_key_positions()),
+                 ('thumb', self.thumb_matrices, None),
+                 ('screw', affine_matrices(offsets=np.concatenate([screws, screw_z], axis=1)), None)]
+        if getattr(self.args, 'hotswap_holders', False):
+            parts.append(('holder', self.get_switch_matrices(), None))
+        table = {'kind': [], 'index': [], 'row': [], 'col': [], 'matrix': []}
+        for kind, matrices, positions in parts:
+            table['kind'] += [kind] * len(matrices)
+            table['index'] += list(range(len(matrices)))
+            table['row'] += [i for i, _ in positions] if positions else [-1] * len(matrices)
+            table['col'] += [j for _, j in positions] if positions else [-1] * len(matrices)
+            table['matrix'].append(matrices)
+        return {'kind': np.array(table['kind']), 'index': np.array(table['index']), 'row': np.array(table['row']),
+                'col': np.array(table['col']), 'matrix': np.concatenate(table['matrix'], axis=0)}
+
+    def write_placement_table(self, fnames=('things/placement.npz', 'things/placement.json')):
+        """Write the placement table for downstream tools, no 3D model is built"""
+        table = self.get_placement_table()
+        for fname in fnames:
+            write_placement_table(fname, table)
+        return list(fnames)
+
     def get_thumb_origin(self):
-        #TODO: use the interface I made for this
-        # position at col 1, and lastrow
-        position = np.array([-4.18483045012826, -33.155898546096395, 24.16276298368095])
-        return position
+        return np.array(self.args.thumb_origin, dtype=float)
+
+    def get_thumb_matrices(self):
+        """Placement of every thumb key as a stack of 4x4 matrices, from the thumbs in the config
+        Each key is rotated around x, y and z, then moved to the thumb origin plus its own offset.
+        """
+        rotations = np.array([thumb['rotation'] for thumb in self.args.thumbs], dtype=float)
+        offsets = np.array([thumb['offset'] for thumb in self.args.thumbs], dtype=float)
+        return affine_matrices(euler_matrices(rotations), self.get_thumb_origin() + offsets)
 
     def transform_thumb(self, shape, i):
-        # these should be on circles around some origin
-        # give a normal vector, and rotate around it,
-        # Then take an orthobgonal vector, and rotate around that too, but with opposite curvature
-        # This should create a saddle point
-
-        thumb_origin = self.get_thumb_origin()
-
-        if i == 0:
-            shape = rotate_around_origin(shape, [0., 0., 0.], 14., [1., 0., 0.])
-            shape = rotate_around_origin(shape, [0., 0., 0.], -15., [0., 1., 0.])
-            shape = rotate_around_origin(shape, [0., 0., 0.], 10., [0., 0., 1.])
-            shape = Translate(thumb_origin)(shape)
-            shape = Translate(np.array([-15., -10., 5.]))(shape)
-        elif i == 1:
-            shape = rotate_around_origin(shape, [0., 0., 0.], 10., [1., 0., 0.])
-            shape = rotate_around_origin(shape, [0., 0., 0.], -23., [0., 1., 0.])
-            shape = rotate_around_origin(shape, [0., 0., 0.], 25., [0., 0., 1.])
-            shape = Translate(thumb_origin)(shape)
-            shape = Translate(np.array([-35., -16., -2.]))(shape)
-        elif i == 2:
-            shape = rotate_around_origin(shape, [0., 0., 0.], 10., [1., 0., 0.])
-            shape = rotate_around_origin(shape, [0., 0., 0.], -23., [0., 1., 0.])
-            shape = rotate_around_origin(shape, [0., 0., 0.], 25., [0., 0., 1.])
-            shape = Translate(thumb_origin)(shape)
-            shape = Translate(np.array([-23., -34., -6.]))(shape)
-        elif i == 3:
-            shape = rotate_around_origin(shape, [0., 0., 0.], 6., [1., 0., 0.])
-            shape = rotate_around_origin(shape, [0., 0., 0.], -34., [0., 1., 0.])
-            shape = rotate_around_origin(shape, [0., 0., 0.], 35., [0., 0., 1.])
-            shape = Translate(thumb_origin)(shape)
-            shape = Translate(np.array([-39., -43., -16.]))(shape)
-        elif i == 4:
-            shape = rotate_around_origin(shape, [0., 0., 0.], 6., [1., 0., 0.])
-            shape = rotate_around_origin(shape, [0., 0., 0.], -32., [0., 1., 0.])
-            shape = rotate_around_origin(shape, [0., 0., 0.], 35., [0., 0., 1.])
-            shape = Translate(thumb_origin)(shape)
-            shape = Translate(np.array([-51., -25., -11.5]))(shape)
-        return shape
+        return MultMatrix(self.thumb_matrices[i])(shape)
+
+    def get_thumb_points(self, shape):
+        """Points of shape placed at every thumb key, transformed in one batch
+        Returns:
+            [n_thumbs * N, 3] array, the points of each key in order
+        """
+        return transform_points(self.thumb_matrices, shape.get_points()).reshape((-1, 3))
 
     def get_thumb_case_and_limit_box(self):
         points = get_points_from_transform(self)
-        oriented_box_ang, oriented_size, oriented_loc = fit_oriented_box_to_extent(points)
+        oriented_box_ang, oriented_size, oriented_loc = self.cached_fit(fit_oriented_box_to_extent, points)
         space = np.array(self.args.thumb_space)
         extent_max = points.max(axis=0) + space
         extent_min = points.min(axis=0) - space
         if self.args.thumb_case == 'cone':
-            x = fit_cone_to_points(points)
-            shell = get_conical_shell(x[0:3], x[3:6], x[6], x[7], self.args.case_thickness, segments=self.args.cone_segments)
+            x = self.cached_fit(fit_cone_to_points, points)
+            shell = get_conical_shell(x[0:3], x[3:6], x[6], x[7], self.args.case_thickness)
             if self.args.rounded_thumb_case:
                 square_box = RoundedBoxShell(extent_max - extent_min, self.args.case_thickness, radius=self.args.thumb_radius, round_top=False, round_bottom=False).translate((extent_max + extent_min) / 2)
                 square_limit_box = RoundedBoxShell(extent_max - extent_min - space + 2 * np.array([self.args.thumb_extra_x_space, 0., 500]), self.args.case_thickness, radius=self.args.thumb_radius, round_top=False, round_bottom=False).translate((extent_max + extent_min) / 2).translate([-self.args.thumb_extra_x_space, 0., 0.])
@@ -253,6 +385,21 @@ class Keyboard():
 
         return shell, limit_box
 
+    def cached_fit(self, fit_function, points):
+        """Run a fit on points, or return the result of an earlier identical fit
+        The fits only depend on the points, so config changes that don't move the thumbs skip the optimizer.
+        Results are also kept on disk (see fit_cache), so they carry over between runs.
+        """
+        name = fit_function.__name__
+        if name not in self.fit_cache:
+            self.fit_cache[name] = FitCache(fit_function)
+        return self.fit_cache[name](points)
+
+    def save_fit_caches(self):
+        """Write the fit results of this build to disk, once for all fits"""
+        for cache in self.fit_cache.values():
+            cache.save()
+
     def get_shell_for_column(self, col):
         # get a half cylindrical shell
         total_rr = self.minor_radii[col] + self.cth
@@ -267,10 +414,12 @@ class Keyboard():
         x_loc = []
         extent_min = []
         extent_max = []
+        point_dummy = box_corners([self.args.keyswitch_height + 2 * self.args.key_hole_rim_width, self.args.keyswitch_width + 2 * self.args.key_hole_rim_width, self.args.plate_thickness])
+        points = transform_points(self.get_key_matrices(tent_and_z_offset=False), point_dummy)
+        cols = np.array([j for _, j in self.get_key_positions()])
         for j in range(self.args.ncols - 1):
-            point_dummy = Cube([self.args.keyswitch_height + 2 * self.args.key_hole_rim_width, self.args.keyswitch_width + 2 * self.args.key_hole_rim_width, self.args.plate_thickness], center=True)
-            points0 = Union()([self.transform_column(self.transform_row(point_dummy, i, j), j) for i in range(self.column_nrows[j])]).get_points()
-            points1 = Union()([self.transform_column(self.transform_row(point_dummy, i, j + 1), j + 1) for i in range(self.column_nrows[j + 1])]).get_points()
+            points0 = points[cols == j].reshape((-1, 3))
+            points1 = points[cols == j + 1].reshape((-1, 3))
             if j == 0:
                 x_loc.append(points0[:,0].min() - x_margin)
             x_loc.append((points0[:,0].max() + points1[:,0].min())/2)
@@ -285,25 +434,64 @@ class Keyboard():
         return x_loc, extent_min, extent_max
 
     def get_switch_min(self):
-        switch_dummy = Cube([self.args.keyswitch_height + 2 * self.args.key_hole_rim_width, self.args.keyswitch_width + 2 * self.args.key_hole_rim_width, self.args.keyswitch_space_below], center=True).translate([0., 0., - (self.args.keyswitch_space_below) / 2 + self.args.plate_thickness])
-        all_points = []
-        dummies = []
-        for j in range(self.args.ncols):
-            for i in range(self.column_nrows[j]):
-                tr_switch_dummy = self.tent_and_z_offset(self.transform_column(self.transform_row(switch_dummy, i, j), j))
-                dummies.append(tr_switch_dummy)
-                all_points.append(tr_switch_dummy.get_points())
-        for i in range(self.args.n_thumbs):
-                tr_switch_dummy = self.transform_thumb(switch_dummy, i, )
-                dummies.append(tr_switch_dummy)
-                all_points.append(tr_switch_dummy.get_points())
-        all_points = np.concatenate(all_points, axis=0)
-        switch_min = all_points[:,2].min()
-        return switch_min
+        """Lowest point of the space below any switch"""
+        switch_dummy = box_corners([self.args.keyswitch_height + 2 * self.args.key_hole_rim_width, self.args.keyswitch_width + 2 * self.args.key_hole_rim_width, self.args.keyswitch_space_below])
+        switch_dummy += np.array([0., 0., - (self.args.keyswitch_space_below) / 2 + self.args.plate_thickness])
+        return transform_points(self.get_switch_matrices(), switch_dummy)[..., 2].min()
+
+    def get_case_split_z(self):
+        return self.get_switch_min() + self.args.cut_relative_to_lowest_switch
+
+    def get_cut_box(self, model_min, model_max, z, above, margin=CUT_MARGIN, thickness=None):
+        """Box that covers everything of the model above or below height z
+        The box reaches margin beyond the bounds of the model, on all sides but the one at z.
+        Args:
+            model_min, model_max: bounds of the model
+            above: cover the model above z, else below it
+            thickness: wall thickness for a BoxShell, None for a solid Cube
+        """
+        lo = np.append(model_min[:2] - margin, z if above else min(model_min[2], z) - margin)
+        hi = np.append(model_max[:2] + margin, max(model_max[2], z) + margin if above else z)
+        if thickness is None:
+            return Cube(hi - lo, center=True).translate((hi + lo) / 2)
+        return BoxShell(hi - lo, thickness, center=True).translate((hi + lo) / 2)
+
+    def get_tent_matrix(self):
+        """tent_and_z_offset as a 4x4 matrix"""
+        return affine_matrices(rotation_matrices([0., 1., 0.], self.tenting_angle), np.array([0., 0., self.keyboard_z_offset]))
+
+    def get_case_box(self):
+        """Extent of the rounded case of the main grid before tenting, as in get_case
+        Returns:
+            (xy_min, xy_max, at_z)
+        """
+        x_loc, extent_min, extent_max = self.get_key_separations()
+        if self.args.main_grid_support_type == 'hulls':
+            box_min, box_max = HullGrid(self, extent_min, extent_max).get_case_box()
+            return box_min[0:2], box_max[0:2], box_max[2]
+        space = np.array(self.args.grid_xy_space)
+        return extent_min[0:2] - space, extent_max[0:2] + space, extent_max[2]
+
+    def get_screw_corners(self):
+        """Corners of the case where the screws go, including the extra thumb corner, from the key placements only"""
+        if not self.args.rounded_grid_case:
+            raise ValueError('Screw corners are only defined for the rounded grid case')
+        xy_min, xy_max, at_z = self.get_case_box()
+        offsets, loc = get_top_sphere_offsets(xy_min, xy_max, at_z, self.args.grid_radius)
+        centers = transform_points(self.get_tent_matrix(), offsets + loc)
+        low, w = get_tented_base(centers, xy_max - xy_min)
+        screw_corners = [np.array(s) for s in get_tented_screw_corners(low, w, xy_min, xy_max, self.args.grid_radius)]
+        screw_corners.append(screw_corners[2] + np.array(self.args.thumb_extra_screw_offset))
+        screw_corners[2] += np.array(self.args.thumb_screw_offset) #TODO: clean this up
+        return screw_corners
 
+    def get_screw_positions(self, screw_corners):
+        """xy positions of the screws, inset from the corners, as [n_screws, 2] array"""
+        screw_corners = np.array(screw_corners)
+        return screw_corners - np.sign(screw_corners) * self.args.screw_inset
 
     def get_hulls(self, extent_min, extent_max):
-        return get_hulls(self, extent_min, extent_max)
+        return get_hulls(self, extent_min, extent_max, jobs=self.args.hull_jobs)
 
     def get_case(self):
         x_loc, extent_min, extent_max = self.get_key_separations()
@@ -331,27 +519,22 @@ class Keyboard():
 
     def get_screw_inserts(self, screw_corners, case_split_z):
 
-        outer = Cylinder(self.args.screw_insert_h , r=self.args.screw_insert_od / 2 + 1.6, center=True, segments=30).translate([0., 0., (self.args.screw_insert_h ) / 2])
-        inner = Cylinder(self.args.screw_insert_h + 2 * eps, r=self.args.screw_insert_od / 2, center=True, segments=30).translate([0., 0., -eps]).translate([0., 0., (self.args.screw_insert_h) / 2])
+        outer = Cylinder(self.args.screw_insert_h , r=self.args.screw_insert_od / 2 + 1.6, center=True).translate([0., 0., (self.args.screw_insert_h ) / 2])
+        inner = Cylinder(self.args.screw_insert_h + 2 * eps, r=self.args.screw_insert_od / 2, center=True).translate([0., 0., -eps]).translate([0., 0., (self.args.screw_insert_h) / 2])
 
         insert_post = outer.difference(inner)
 
         insert_posts = []
-        for screw_corner in screw_corners:
-            d = self.args.screw_inset
-            s = np.array(screw_corner) - np.sign(np.array(screw_corner)) * d
+        for s in self.get_screw_positions(screw_corners):
             insert_posts.append(insert_post.translate([*s, case_split_z]))
 
         return insert_posts
 
     def get_screw_hole_cutouts(self, screw_corners, bottom_case_h):
         screw_hole_cutouts = []
-        for screw_corner in screw_corners:
-            d = self.args.screw_inset
-            s = np.array(screw_corner) - np.sign(np.array(screw_corner)) * d
-
-            cutout = CylinderShell((bottom_case_h) * 2 + self.args.case_thickness, self.args.screw_head_size / 2 + self.args.case_thickness, self.args.case_thickness, close_ends=True, segments=50).translate([0., 0., -bottom_case_h  -self.args.case_thickness / 2])
-            cutout.shell = cutout.shell.difference(Cylinder(2 * self.args.case_thickness, self.args.screw_od / 2, center=True, segments=50))
+        for s in self.get_screw_positions(screw_corners):
+            cutout = CylinderShell((bottom_case_h) * 2 + self.args.case_thickness, self.args.screw_head_size / 2 + self.args.case_thickness, self.args.case_thickness, close_ends=True).translate([0., 0., -bottom_case_h  -self.args.case_thickness / 2])
+            cutout.shell = cutout.shell.difference(Cylinder(2 * self.args.case_thickness, self.args.screw_od / 2, center=True))
             screw_hole_cutouts.append(cutout.translate([*s, 0.]))
         return screw_hole_cutouts
 
@@ -359,7 +542,7 @@ class Keyboard():
         trs_hole_size = 5.0
         holder = get_holder_with_hook(self.args.trs_rest_width, self.args.trs_pcb_length, z_size - trs_hole_size / 2, self.args.trs_pcb_thickness, hook_height=1.0, hook_width=self.args.trs_rest_width)
         holder = holder.translate([0., 0., - trs_hole_size / 2])
-        cutout = Cylinder(5.0, r=trs_hole_size / 2, center=True, segments=50).rotate(90., [1., 0., 0.])
+        cutout = Cylinder(5.0, r=trs_hole_size / 2, center=True).rotate(90., [1., 0., 0.])
         return holder, cutout
 
     def get_microcontroller_holder(self, z_size):
@@ -367,74 +550,230 @@ class Keyboard():
         usb_c_width = 9.
         holder = get_holder_with_hook(self.args.mc_rest_width, self.args.mc_pcb_length + 0.5, z_size - usb_c_size / 2, self.args.mc_pcb_thickness, hook_height=1.0, hook_width=self.args.mc_rest_width)
         holder = holder.translate([0., 0., - usb_c_size / 2])
-        c1 = Cylinder(5.0, r=usb_c_size / 2, center=True, segments=50).rotate(90., [1., 0., 0.]).translate([usb_c_width / 2 - usb_c_size / 2, 0., 0.])
-        c2 = Cylinder(5.0, r=usb_c_size / 2, center=True, segments=50).rotate(90., [1., 0., 0.]).translate([-usb_c_width / 2 + usb_c_size / 2, 0., 0.])
+        c1 = Cylinder(5.0, r=usb_c_size / 2, center=True).rotate(90., [1., 0., 0.]).translate([usb_c_width / 2 - usb_c_size / 2, 0., 0.])
+        c2 = Cylinder(5.0, r=usb_c_size / 2, center=True).rotate(90., [1., 0., 0.]).translate([-usb_c_width / 2 + usb_c_size / 2, 0., 0.])
         cutout = Hull()(c1, c2)
         return holder, cutout
 
     def make_models(self):
 
-        key_holes = []
-        cutouts = []
-        for j in range(self.args.ncols):
-            for i in range(self.column_nrows[j]):
-                key_holes.append(self.transform_switch(self.single_keyhole(), i, j))
-                cutouts.append(self.transform_switch(self.switch_cutout(), i, j))
+        with self.profiler.stage('keys'):
+            # every key places the same keyhole and cutout trees
+            keyhole = self.single_keyhole()
+            switch_cutout = self.switch_cutout()
 
-        case = self.get_case()
-        screw_corners = [np.array(s) for s in case.get_screw_corners()]
-        screw_corners.append(screw_corners[2] + np.array(self.args.thumb_extra_screw_offset))
-        screw_corners[2] += np.array(self.args.thumb_screw_offset) #TODO: clean this up
+            key_holes = []
+            cutouts = []
+            for j in range(self.args.ncols):
+                for i in range(self.column_nrows[j]):
+                    key_holes.append(self.transform_switch(keyhole, i, j))
+                    cutouts.append(self.transform_switch(switch_cutout, i, j))
+
+        with self.profiler.stage('case'):
+            case = self.get_case()
+            screw_corners = self.get_screw_corners()
+
+        with self.profiler.stage('thumb_keys'):
+            for i in range(self.args.n_thumbs):
+                key_holes.append(self.transform_thumb(keyhole, i))
+                cutouts.append(self.transform_thumb(switch_cutout, i))
+
+            if getattr(self.args, 'hotswap_holders', False):
+                key_holes.extend(self.get_hotswap_holders())
 
-        for i in range(self.args.n_thumbs):
-            key_holes.append(self.transform_thumb(self.single_keyhole(), i))
-            cutouts.append(self.transform_thumb(self.switch_cutout(), i))
+        with self.profiler.stage('thumb_case'):
+            thumb_case, limit_box = self.get_thumb_case_and_limit_box()
+            case = case.difference(limit_box, outer=True)
+            case = case.union(thumb_case, outer=False)
 
-        thumb_case, limit_box = self.get_thumb_case_and_limit_box()
-        case = case.difference(limit_box, outer=True)
-        case = case.union(thumb_case, outer=False)
+            switch_min = self.get_switch_min()
+            # the case only gets smaller from here on, so its bounds size all cut boxes
+            model_min, model_max = case.outer.get_bounds()
 
-        switch_min = self.get_switch_min()
+            plate_z = switch_min - self.args.space_below_lowest_switch
+            bottom_plate = self.get_cut_box(model_min, model_max, plate_z, above=False,
+                                            margin=CUT_MARGIN + self.args.case_thickness, thickness=self.args.case_thickness)
 
-        bottom_plate = BoxShell([1000., 1000., 1000.], self.args.case_thickness, center=True).translate([0., 0., -500. + switch_min - self.args.space_below_lowest_switch])
+            case = case.difference(bottom_plate)
 
-        case = case.difference(bottom_plate)
+        with self.profiler.stage('bottom_model'):
+            case_split_z = self.get_case_split_z()
+            bottom_case_h = self.args.space_below_lowest_switch + self.args.cut_relative_to_lowest_switch
 
-        case_split_z = switch_min +  self.args.cut_relative_to_lowest_switch
-        bottom_case_h = self.args.space_below_lowest_switch + self.args.cut_relative_to_lowest_switch
+            xy_offset = screw_corners[0]
+            trs_holder, trs_cutout = self.get_trs_holder(bottom_case_h)
+            trs_holder, trs_cutout = trs_holder.rotate(90, [0., 0., 1.]), trs_cutout.rotate(90, [0., 0., 1.])
+            trs_holder = trs_holder.translate([*xy_offset, 0]).translate([self.args.case_thickness, -self.args.trs_y_offset, case_split_z])
+            trs_cutout = trs_cutout.translate([*xy_offset, 0]).translate([0., -self.args.trs_y_offset, case_split_z])
 
-        xy_offset = screw_corners[0]
-        trs_holder, trs_cutout = self.get_trs_holder(bottom_case_h)
-        trs_holder, trs_cutout = trs_holder.rotate(90, [0., 0., 1.]), trs_cutout.rotate(90, [0., 0., 1.])
-        trs_holder = trs_holder.translate([*xy_offset, 0]).translate([self.args.case_thickness, -self.args.trs_y_offset, case_split_z])
-        trs_cutout = trs_cutout.translate([*xy_offset, 0]).translate([0., -self.args.trs_y_offset, case_split_z])
+            mc_holder, mc_cutout = self.get_microcontroller_holder(bottom_case_h)
+            insert_posts = self.get_screw_inserts(screw_corners, case_split_z)
+            mc_holder = mc_holder.translate([*xy_offset, 0]).translate([self.args.mc_x_offset, -self.args.case_thickness, case_split_z])
+            mc_cutout = mc_cutout.translate([*xy_offset, 0]).translate([self.args.mc_x_offset, 0., case_split_z])
 
-        mc_holder, mc_cutout = self.get_microcontroller_holder(bottom_case_h)
-        insert_posts = self.get_screw_inserts(screw_corners, case_split_z)
-        mc_holder = mc_holder.translate([*xy_offset, 0]).translate([self.args.mc_x_offset, -self.args.case_thickness, case_split_z])
-        mc_cutout = mc_cutout.translate([*xy_offset, 0]).translate([self.args.mc_x_offset, 0., case_split_z])
+            cut_bottom = self.get_cut_box(model_min, model_max, case_split_z, above=True)
 
-        cut_bottom = Cube([1000., 1000., 1000.], center=True).translate([0., 0., 500. + case_split_z])
+            screw_hole_cutouts = self.get_screw_hole_cutouts(screw_corners, bottom_case_h)
 
-        screw_hole_cutouts = self.get_screw_hole_cutouts(screw_corners, bottom_case_h)
+            bottom_model = case
+            for screw_hole_cutout in screw_hole_cutouts:
+                bottom_model = bottom_model.difference(screw_hole_cutout.translate([0., 0., case_split_z]), outer=False)
 
-        bottom_model = case
-        for screw_hole_cutout in screw_hole_cutouts:
-            bottom_model = bottom_model.difference(screw_hole_cutout.translate([0., 0., case_split_z]), outer=False)
+            bottom_model = bottom_model.shell.difference(cut_bottom).difference(trs_cutout).difference(mc_cutout).union(trs_holder).union(mc_holder)
 
-        bottom_model = bottom_model.shell.difference(cut_bottom).difference(trs_cutout).difference(mc_cutout).union(trs_holder).union(mc_holder)
+            self.bottom_model = bottom_model
 
-        self.bottom_model = bottom_model
+        with self.profiler.stage('top_model'):
+            for cutout in cutouts:
+                case = case.difference(cutout)
 
-        for cutout in cutouts:
-            case = case.difference(cutout)
+            cut = self.get_cut_box(model_min, model_max, case_split_z, above=False)
 
-        cut = Cube([1000., 1000., 1000.], center=True).translate([0., 0., -500. + case_split_z])
+            self.top_model = Union()(case.shell.difference(cut).difference(trs_cutout).difference(mc_cutout), union_all(key_holes + insert_posts))
+            # self.top_model = case.shell.difference(cut) + sum(key_holes)
 
-        self.top_model = case.shell.difference(cut).difference(trs_cutout).difference(mc_cutout) + sum(key_holes) + sum(insert_posts)
-        # self.top_model = case.shell.difference(cut) + sum(key_holes)
+            self.top_and_bottom = self.bottom_model.translate([0., 0., -1]).union(self.top_model)
 
-        self.top_and_bottom = self.bottom_model.translate([0., 0., -1]).union(self.top_model)
+            # the other hand only references the trees that were just built, and its files only call
+            # the modules the files of this hand define
+            self.output_modules = {'things/bottom_model.scad': ScadModule('bottom_model')(self.bottom_model),
+                                   'things/model.scad': ScadModule('model')(self.top_model)}
+            self.mirrored_top_model = Mirror([1., 0., 0.])(self.output_modules['things/model.scad'])
+            self.mirrored_bottom_model = Mirror([1., 0., 0.])(self.output_modules['things/bottom_model.scad'])
+
+    # mirrored output: the output it mirrors
+    mirrored_outputs = {'things/bottom_model_mirrored.scad': 'things/bottom_model.scad',
+                        'things/model_mirrored.scad': 'things/model.scad'}
+
+    def write_output(self, fname, model):
+        """Write one output, with both halves the mirrored files call the module of the file they mirror"""
+        source = self.mirrored_outputs.get(fname)
+        if not self.args.both_halves:
+            self.to_scad(model, fname=fname)
+        elif source is not None:
+            module = self.output_modules[source]
+            uses = [(os.path.relpath(source, os.path.dirname(fname) or '.'), module)]
+            model.write_scad(fname, precision=self.args.scad_precision, uses=uses)
+        else:
+            self.to_scad(self.output_modules.get(fname, model), fname=fname)
+
+    def get_outputs(self):
+        """Output file names and the models written to them, make_models has to be called first"""
+        outputs = {'things/bottom_model.scad': self.bottom_model,
+                   'things/model.scad': self.top_model,
+                   'things/plate.scad': self.single_keyhole()}
+        if self.args.both_halves:
+            outputs['things/bottom_model_mirrored.scad'] = self.mirrored_bottom_model
+            outputs['things/model_mirrored.scad'] = self.mirrored_top_model
+        return outputs
+
+    def get_column_cuts(self):
+        """x of the planes between neighbouring columns, halfway between their keyholes after tenting"""
+        kr = self.args.key_hole_rim_width
+        keyhole = box_corners([self.args.keyswitch_width + 2 * kr, self.args.keyswitch_height + 2 * kr, self.args.plate_thickness])
+        keyhole += np.array([0., 0., self.args.plate_thickness / 2])
+        x = transform_points(self.get_key_matrices(), keyhole)[..., 0]
+        cols = np.array([j for _, j in self.get_key_positions()])
+        return [(x[cols == j].max() + x[cols == j + 1].min()) / 2 for j in range(self.args.ncols - 1)]
+
+    def get_render_regions(self, model):
+        """Disjoint boxes that split a model for a partitioned render:
+        the thumb cluster in front of the main grid, and a band for each column of the grid
+        Args:
+            model: the top or bottom model
+        Returns:
+            dict of region name to (lo, hi) box corners
+        """
+        _, extent_min, _ = self.get_key_separations()  # tenting turns around y, so y is unchanged
+        lo, hi = model.get_bounds()
+        # the outer sides stay clear of the model, the cuts are rounded so they are exact in the .scad files
+        lo, hi = np.floor(lo) - 1., np.ceil(hi) + 1.
+        thumb_y = np.round(extent_min[1], 2)
+        x_cuts = [lo[0]] + [np.round(x, 2) for x in self.get_column_cuts()] + [hi[0]]
+        regions = {'thumbs': (lo, np.array([hi[0], thumb_y, hi[2]]))}
+        for j in range(len(x_cuts) - 1):
+            regions[f'column_{j}'] = (np.array([x_cuts[j], thumb_y, lo[2]]), np.array([x_cuts[j + 1], hi[1], hi[2]]))
+        return regions
+
+    def render_outputs(self, outputs, fnames):
+        """Render written outputs to STL, all OpenSCAD renders run as parallel jobs
+        Every model goes to the fastest backend that can render it (see --backend), with the hulls
+        already rendered by the faster backends. With --partitions the top and bottom models are rendered
+        per region and stitched, mirrored halves are mirrored from the rendered STL instead of rendered again.
+        Args:
+            outputs: dict of output file name to model, see get_outputs
+            fnames: the outputs to render
+        Returns:
+            list of the STL files that were written
+        """
+        def stl_name(fname):
+            return os.path.splitext(fname)[0] + '.stl'
+
+        backends = get_backends(self.args.backend, openscad=self.args.openscad, precision=self.args.scad_precision)
+        jobs = []
+        partitioned = {}
+        mirrored = []
+        for fname in fnames:
+            source = self.mirrored_outputs.get(fname)
+            if source is not None and (source in fnames or os.path.exists(stl_name(source))):
+                mirrored.append((stl_name(source), stl_name(fname)))
+                continue
+            backend, model = prepare(outputs[fname], backends)
+            if backend.name != 'openscad':
+                backend.render(model, stl_name(fname))
+            elif self.args.partitions and any(outputs[fname] is m for m in (self.top_model, self.bottom_model)):
+                regions = self.get_render_regions(outputs[fname])
+                parts = write_partitions(model, regions, stl_name(fname), precision=self.args.scad_precision)
+                jobs.extend((part_scad, part_stl) for part_scad, part_stl, _, _ in parts)
+                partitioned[stl_name(fname)] = parts
+            elif model is outputs[fname]:
+                jobs.append((fname, stl_name(fname)))
+            else:
+                # the written output still has the original tree, the lowered one goes next to it
+                lowered_fname = os.path.splitext(fname)[0] + '_lowered.scad'
+                model.write_scad(lowered_fname, precision=self.args.scad_precision)
+                jobs.append((lowered_fname, stl_name(fname)))
+
+        render_all(jobs, n_jobs=self.args.jobs, openscad=self.args.openscad)
+        for stl, parts in partitioned.items():
+            stitch_partitions(parts, stl)
+        for source_stl, stl in mirrored:
+            mirror_stl(source_stl, stl)
+        return [stl_name(fname) for fname in fnames]
+
+    def write_outputs(self, outputs):
+        """Write the outputs, skipping files whose model did not change since they were last written
+        Returns:
+            list of the file names that were written
+        """
+        written = []
+        for fname, model in outputs.items():
+            os.makedirs(os.path.dirname(fname) or '.', exist_ok=True)
+            digest = model.digest()
+            if self.written_digests.get(fname) == digest and os.path.exists(fname):
+                continue
+            self.write_output(fname, model)
+            self.written_digests[fname] = digest
+            written.append(fname)
+        return written
+
+    def build(self):
+        """Build all models and write the outputs that changed"""
+        self.profiler.reset()
+        self.make_models()
+        self.save_fit_caches()
+        outputs = self.get_outputs()
+        with self.profiler.stage('check_budget'):
+            self.check_render_budget(outputs)
+        with self.profiler.stage('write_outputs'):
+            written = self.write_outputs(outputs)
+        if self.args.render:
+            with self.profiler.stage('render'):
+                written += self.render_outputs(outputs, written)
+        if self.profiler.enabled:
+            print(self.profiler.report())
+            self.profiler.stop()
+        return written
 
 
     def to_scad(self, model, fname=None):
@@ -442,7 +781,19 @@ class Keyboard():
         if fname is None:
             fname = self.args.output_file_name
 
-        scad_render_to_file(model, fname)
+        model.write_scad(fname, precision=self.args.scad_precision)
+
+    def check_render_budget(self, models):
+        """Analyze the models before anything is written or rendered, and fail if the render budget is exceeded
+        Args:
+            models: dict of output file name to model
+        """
+        budget = getattr(self.args, 'render_budget', None)
+        for fname, model in models.items():
+            stats = analyze(model)
+            if self.args.complexity_report:
+                print(format_report(stats, name=fname))
+            check_budget(stats, budget, name=fname)
 
     @staticmethod
     def add_args(parser):
@@ -450,6 +801,42 @@ class Keyboard():
                                help='Output filename')
         parser.add_argument('--config', default="dactyl", type=str,
                                help='Name of the yaml configuration')
+        parser.add_argument('--complexity-report', action='store_true',
+                               help='Print node, facet and render cost estimates for each output')
+        parser.add_argument('--profile', action='store_true',
+                               help='Print the time of every build stage')
+        parser.add_argument('--profile-memory', action='store_true',
+                               help='Also trace allocations with tracemalloc, and print the memory kept per stage and module')
+        parser.add_argument('--lod', default='final', choices=list(LOD_MODES),
+                               help='Level of detail of round parts: quick low poly draft, or final')
+        parser.add_argument('--lod-tolerance', default=None, type=float,
+                               help='Maximum chord error of round parts in mm, overrides the tolerance of --lod')
+        parser.add_argument('--scad-precision', default=1e-4, type=float,
+                               help='Numbers in .scad files are rounded to a multiple of this (mm and degrees)')
+        parser.add_argument('--both-halves', action='store_true',
+                               help='Also write the mirrored top and bottom models, for the other hand')
+        parser.add_argument('--render', action='store_true',
+                               help='Render the written outputs to STL with OpenSCAD')
+        parser.add_argument('--partitions', action='store_true',
+                               help='Render the top and bottom models as independent regions in parallel, and stitch them')
+        parser.add_argument('--jobs', default=None, type=int,
+                               help='Number of simultaneous OpenSCAD renders, default is the number of cores')
+        parser.add_argument('--hull-jobs', default=1, type=int,
+                               help='Number of processes that build the rows of the hull grid')
+        parser.add_argument('--backend', default='auto', choices=['auto', 'numpy', 'openscad'],
+                               help='Geometry backend for --render, auto uses the fastest one that can render each part')
+        parser.add_argument('--openscad', default=OPENSCAD, type=str,
+                               help='OpenSCAD executable')
+        parser.add_argument('--projection', action='store_true',
+                               help='Only write the 2D plate outlines as SVG and DXF, straight from the key placements')
+        parser.add_argument('--placement-table', action='store_true',
+                               help='Only write the placement of every key, thumb key, screw and holder as NPZ and JSON')
+        parser.add_argument('--optimize-layout', default=None, type=str, metavar='TARGETS',
+                               help='Only search the column parameters for the fingertip targets in this yaml file, and print them')
+        parser.add_argument('--watch', action='store_true',
+                               help='Keep running, and rebuild when a yaml configuration changes')
+        parser.add_argument('--watch-interval', default=0.5, type=float,
+                               help='Polling interval for --watch, in seconds')
 
         # parser.add_argument('--keyswitch-width', default=14.2, type=float,
         #                        help='width of the keyswitch')
@@ -501,12 +888,14 @@ if __name__ == "__main__":
     # print(kb.major_radii)
     # print(kb.minor_radii)
 
-    kb.make_models()
-
-    plate = kb.single_keyhole()
-
-
-    kb.to_scad(kb.bottom_model, fname='things/bottom_model.scad')
-    kb.to_scad(kb.top_model, fname='things/model.scad')
-
-    kb.to_scad(plate, fname='things/plate.scad')
+    if args.optimize_layout:
+        optimize_layout(kb, args.optimize_layout)
+    elif args.projection:
+        kb.write_projections()
+    elif args.placement_table:
+        kb.write_placement_table()
+    else:
+        kb.build()
+
+        if args.watch:
+            watch(kb, pattern='config/*.yaml', interval=args.watch_interval)
@@ -0,0 +1,289 @@
+"""Triangle meshes from rendered STL files, handled with NumPy
+
+Binary STL files are memory mapped with a structured dtype, so loading is zero copy and
+transforms work on all triangles at once. Files are written in chunks, large meshes never
+have to be held in memory twice.
+"""
+import argparse
+import numpy as np
+
+STL_HEADER_SIZE = 80
+STL_TRIANGLE_DTYPE = np.dtype([
+    ('normal', '<f4', (3,)),
+    ('vertices', '<f4', (3, 3)),
+    ('attribute', '<u2'),
+])
+CHUNK_SIZE = 1 << 16  # triangles per chunk when streaming
+
+
+def is_binary_stl(path):
+    """OpenSCAD writes ascii STL by default, binary files are recognized by their size"""
+    with open(path, 'rb') as f:
+        header = f.read(STL_HEADER_SIZE + 4)
+        f.seek(0, 2)
+        size = f.tell()
+    if len(header) < STL_HEADER_SIZE + 4:
+        return False
+    n = int(np.frombuffer(header[STL_HEADER_SIZE:], dtype='<u4')[0])
+    return size == STL_HEADER_SIZE + 4 + n * STL_TRIANGLE_DTYPE.itemsize
+
+
+def map_stl(path):
+    """Memory map the triangles of a binary STL file, read only
+    Returns:
+        structured array with STL_TRIANGLE_DTYPE
+    """
+    with open(path, 'rb') as f:
+        f.seek(STL_HEADER_SIZE)
+        n = int(np.frombuffer(f.read(4), dtype='<u4')[0])
+    if n == 0:  # numpy can not map an empty range
+        return np.zeros(0, dtype=STL_TRIANGLE_DTYPE)
+    return np.memmap(path, dtype=STL_TRIANGLE_DTYPE, mode='r', offset=STL_HEADER_SIZE + 4, shape=(n,))
+
+
+def read_ascii_stl(path):
+    with open(path, 'r') as f:
+        tokens = np.array(f.read().split())
+    index = np.flatnonzero(tokens == 'vertex')
+    vertices = tokens[index[:, None] + np.arange(1, 4)[None, :]].astype(float)
+    return vertices.reshape((-1, 3, 3))
+
+
+def read_stl(path):
+    """Read an ascii or binary STL file
+    Returns:
+        [N, 3, 3] array with the vertices of each triangle
+    """
+    if is_binary_stl(path):
+        return map_stl(path)['vertices'].astype(float)
+    return read_ascii_stl(path)
+
+
+class StlWriter():
+    """Write a binary STL file in chunks, the triangle count is filled in when it is closed
+
+    with StlWriter(path) as writer:
+        for vertices in chunks:
+            writer.write(vertices)
+    """
+
+    def __init__(self, path):
+        self.f = open(path, 'wb')
+        self.f.write(b'\0' * STL_HEADER_SIZE)
+        self.f.write(np.uint32(0).tobytes())
+        self.count = 0
+
+    def write(self, vertices):
+        """
+        Args:
+            vertices: [N, 3, 3] array with the vertices of each triangle, counter clockwise seen from outside
+        """
+        triangles = np.zeros(len(vertices), dtype=STL_TRIANGLE_DTYPE)
+        triangles['vertices'] = vertices
+        triangles['normal'] = get_normals(triangles['vertices'])
+        triangles.tofile(self.f)
+        self.count += len(triangles)
+
+    def close(self):
+        self.f.seek(STL_HEADER_SIZE)
+        self.f.write(np.uint32(self.count).tobytes())
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_stl(path, vertices):
+    """Write a binary STL file
+    Args:
+        vertices: [N, 3, 3] array with the vertices of each triangle, counter clockwise seen from outside
+    """
+    with StlWriter(path) as writer:
+        for start in range(0, len(vertices), CHUNK_SIZE):
+            writer.write(vertices[start:start + CHUNK_SIZE])
+
+
+def get_normals(vertices):
+    """Unit normals of triangles, from their winding"""
+    normals = np.cross(vertices[:, 1] - vertices[:, 0], vertices[:, 2] - vertices[:, 0])
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    return normals / np.where(lengths > 0, lengths, 1.)
+
+
+def transform_vertices(vertices, matrix):
+    """Apply a 4x4 affine matrix to triangles, mirroring transforms reverse the winding"""
+    matrix = np.asarray(matrix, dtype=float)
+    transformed = np.einsum('ij,...j->...i', matrix[:3, :3], vertices) + matrix[:3, 3]
+    if np.linalg.det(matrix[:3, :3]) < 0:
+        transformed = transformed[:, ::-1]
+    return transformed
+
+
+def mirror_matrix(v=(1., 0., 0.)):
+    """4x4 matrix of a mirror about a plane through the origin with normal v"""
+    v_norm = np.array(v, dtype=float) / np.linalg.norm(v)
+    matrix = np.eye(4)
+    matrix[:3, :3] -= 2 * np.outer(v_norm, v_norm)
+    return matrix
+
+
+def mirror_vertices(vertices, v=(1., 0., 0.)):
+    """Mirror triangles about a plane through the origin with normal v
+    The winding is reversed, so the mirrored triangles still face outward.
+    """
+    return transform_vertices(vertices, mirror_matrix(v))
+
+
+class Mesh():
+    """Triangle soup, the vertices can be a memory map of a binary STL file"""
+
+    def __init__(self, vertices):
+        """
+        Args:
+            vertices: [N, 3, 3] array with the vertices of each triangle, counter clockwise seen from outside
+        """
+        self.vertices = vertices
+
+    @classmethod
+    def load(cls, path):
+        """Load an STL file, binary files are memory mapped instead of read"""
+        if is_binary_stl(path):
+            return cls(map_stl(path)['vertices'])
+        return cls(read_ascii_stl(path))
+
+    @classmethod
+    def concatenate(cls, meshes):
+        if not meshes:
+            return cls(np.zeros((0, 3, 3)))
+        return cls(np.concatenate([m.vertices for m in meshes], axis=0))
+
+    def __len__(self):
+        return len(self.vertices)
+
+    def chunks(self):
+        """The triangles as float arrays of at most CHUNK_SIZE, only one chunk of a memory map is read at a time"""
+        for start in range(0, len(self), CHUNK_SIZE):
+            yield np.asarray(self.vertices[start:start + CHUNK_SIZE], dtype=float)
+
+    def save(self, path):
+        with StlWriter(path) as writer:
+            for chunk in self.chunks():
+                writer.write(chunk)
+
+    def transform(self, matrix):
+        """Apply a 4x4 affine matrix to all triangles at once"""
+        return Mesh(transform_vertices(self.vertices, matrix))
+
+    def translate(self, v):
+        matrix = np.eye(4)
+        matrix[:3, 3] = v
+        return self.transform(matrix)
+
+    def mirror(self, v=(1., 0., 0.)):
+        return self.transform(mirror_matrix(v))
+
+    def normals(self):
+        return get_normals(np.asarray(self.vertices, dtype=float))
+
+    def get_bounds(self):
+        points = self.vertices.reshape((-1, 3))
+        return points.min(axis=0).astype(float), points.max(axis=0).astype(float)
+
+    def area(self):
+        vertices = np.asarray(self.vertices, dtype=float)
+        cross = np.cross(vertices[:, 1] - vertices[:, 0], vertices[:, 2] - vertices[:, 0])
+        return 0.5 * np.linalg.norm(cross, axis=1).sum()
+
+    def volume(self):
+        """Enclosed volume, only meaningful for closed meshes"""
+        vertices = np.asarray(self.vertices, dtype=float)
+        return np.einsum('ij,ij->i', vertices[:, 0], np.cross(vertices[:, 1], vertices[:, 2])).sum() / 6.
+
+    def stats(self):
+        lo, hi = self.get_bounds()
+        return {'triangles': len(self), 'area': self.area(), 'volume': self.volume(), 'min': lo, 'max': hi}
+
+    def indexed(self):
+        """Shared points and triangle indices
+        Returns:
+            [M, 3] points and [N, 3] indices, counter clockwise seen from outside
+        """
+        vertices = np.asarray(self.vertices, dtype=float).reshape((-1, 3))
+        points, index = np.unique(vertices, axis=0, return_inverse=True)
+        return points, index.reshape((-1, 3))
+
+    def to_polyhedron(self):
+        """The mesh as a SuperSolid node, so it can be used in a tree like any primitive"""
+        from super_solid import Polyhedron
+        points, faces = self.indexed()
+        return Polyhedron(points, faces[:, ::-1])  # OpenSCAD wants faces clockwise seen from outside
+
+
+def shared_faces(boxes, tol=1e-3):
+    """The parts of the box sides that touch a neighbouring box, these are the cuts between the boxes
+    Args:
+        boxes: list of (lo, hi) corners of disjoint boxes
+    Returns:
+        list with the shared faces of every box, each as the (lo, hi) corners of a flat box
+    """
+    boxes = [(np.asarray(lo, dtype=float), np.asarray(hi, dtype=float)) for lo, hi in boxes]
+    faces = [[] for _ in boxes]
+    for a, (lo_a, hi_a) in enumerate(boxes):
+        for b, (lo_b, hi_b) in enumerate(boxes):
+            if a == b:
+                continue
+            lo, hi = np.maximum(lo_a, lo_b), np.minimum(hi_a, hi_b)
+            flat = np.abs(hi - lo) <= tol
+            # the boxes touch in a plane of one axis, and overlap with an area in the other two
+            if flat.sum() == 1 and np.all(hi[~flat] - lo[~flat] > tol):
+                faces[a].append((lo, hi))
+    return faces
+
+
+def faces_on_cuts(vertices, faces, tol=1e-3):
+    """Mask of the triangles that lie in one of the faces
+    A triangle can span the faces of several neighbours in the same plane, so it only needs to lie in the
+    plane of a face, with its center inside the face.
+    """
+    mask = np.zeros(len(vertices), dtype=bool)
+    centers = vertices.mean(axis=1)
+    for lo, hi in faces:
+        axis = np.argmin(hi - lo)
+        on_plane = (np.abs(vertices[:, :, axis] - lo[axis]) <= tol).all(axis=1)
+        mask |= on_plane & ((centers >= lo - tol) & (centers <= hi + tol)).all(axis=1)
+    return mask
+
+
+def stitch(parts, tol=1e-3):
+    """Merge meshes that were cut out of one model with disjoint boxes
+    The cut faces of neighbouring boxes lie in the same plane and face each other, they are dropped,
+    so the surfaces of the parts join along the cut. Sides of a box without a neighbour are kept, where
+    the model reaches them they are part of its surface.
+    Args:
+        parts: iterable of (mesh, faces), with each part and its shared faces, see shared_faces
+    Yields:
+        [N, 3, 3] arrays with the kept triangles, one chunk at a time
+    """
+    for part, faces in parts:
+        for chunk in part.chunks():
+            yield chunk[~faces_on_cuts(chunk, faces, tol=tol)]
+
+
+def mirror_stl(path, mirrored_path, v=(1., 0., 0.)):
+    """Mirror a rendered STL file, instead of rendering the mirrored model"""
+    matrix = mirror_matrix(v)
+    with StlWriter(mirrored_path) as writer:
+        for chunk in Mesh.load(path).chunks():
+            writer.write(transform_vertices(chunk, matrix))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Mirror a rendered half, to get the other hand')
+    parser.add_argument('input', type=str, help='Rendered STL file')
+    parser.add_argument('output', type=str, help='Mirrored STL file')
+    args = parser.parse_args()
+
+    mirror_stl(args.input, args.output)
@@ -0,0 +1,107 @@
+"""Ergonomic metrics of a layout, computed from the placement matrices only
+
+No SuperSolid trees are built, and all functions broadcast over leading dimensions, so the metrics of
+many configurations (or candidate layouts) are computed at once from stacked matrices.
+"""
+import numpy as np
+from projection import rectangle
+
+
+def get_neighbour_pairs(positions):
+    """Indices of neighbouring keys
+    Args:
+        positions: list of (row, col) of every key
+    Returns:
+        ([M, 2] pairs of the next row in the same column, [K, 2] pairs of the same row in the next column)
+    """
+    index = {position: k for k, position in enumerate(positions)}
+    row_pairs = [(k, index[(i + 1, j)]) for k, (i, j) in enumerate(positions) if (i + 1, j) in index]
+    column_pairs = [(k, index[(i, j + 1)]) for k, (i, j) in enumerate(positions) if (i, j + 1) in index]
+    return np.array(row_pairs, dtype=int).reshape((-1, 2)), np.array(column_pairs, dtype=int).reshape((-1, 2))
+
+
+def get_home_keys(positions, home_row=1):
+    """Index of the home row key of every column, the last row of columns that are shorter"""
+    index = {position: k for k, position in enumerate(positions)}
+    nrows = {}
+    for i, j in positions:
+        nrows[j] = max(nrows.get(j, 0), i + 1)
+    return np.array([index[(min(home_row, nrows[j] - 1), j)] for j in sorted(nrows)], dtype=int)
+
+
+def get_cap_tops(matrices, cth):
+    """Keycap top centers, cth above the origin of every key
+    Args:
+        matrices: [..., N, 4, 4] key placements
+        cth: scalar or [...] cap top height
+    Returns:
+        [..., N, 3] array
+    """
+    cth = np.asarray(cth, dtype=float)[..., None, None]
+    return matrices[..., :3, 2] * cth + matrices[..., :3, 3]
+
+
+def pair_distances(points, pairs):
+    return np.linalg.norm(points[..., pairs[:, 1], :] - points[..., pairs[:, 0], :], axis=-1)
+
+
+def get_metrics(key_matrices, thumb_matrices, positions, cth, keyhole_size, home_row=1):
+    """Placement metrics of one or many layouts that share the same keys
+    Args:
+        key_matrices: [..., n_keys, 4, 4] placements of the main grid, in the order of positions
+        thumb_matrices: [..., n_thumbs, 4, 4] placements of the thumb keys
+        positions: list of (row, col) of every key of the main grid
+        cth: scalar or [...] cap top height
+        keyhole_size: [..., 2] width and height of a keyhole, including its rim
+        home_row: row of the home keys
+    Returns:
+        dict of arrays, all with the leading dimensions of the inputs:
+            cap_tops [n_keys, 3], cap_top_heights [n_keys],
+            row_travel [n_row_pairs] and column_travel [n_column_pairs], cap top distances between neighbours,
+            column_stagger [ncols - 1], y of each home key relative to the one of the previous column,
+            footprint [2] and footprint_area, xy bounding box of all keyholes, after tenting,
+            thumb_reach [n_thumbs], cap top distance of every thumb key to the closest home key
+    """
+    row_pairs, column_pairs = get_neighbour_pairs(positions)
+    home_keys = get_home_keys(positions, home_row)
+    tops = get_cap_tops(key_matrices, cth)
+    thumb_tops = get_cap_tops(thumb_matrices, cth)
+    home_tops = tops[..., home_keys, :]
+
+    keyhole_size = np.asarray(keyhole_size, dtype=float)
+    corners = rectangle(1., 1.)[:, :2] * keyhole_size[..., None, :]  # in the z = 0 plane of every switch
+    batch = np.broadcast_shapes(key_matrices.shape[:-3], thumb_matrices.shape[:-3], keyhole_size.shape[:-1])
+    switch_matrices = np.concatenate([np.broadcast_to(key_matrices, batch + key_matrices.shape[-3:]),
+                                      np.broadcast_to(thumb_matrices, batch + thumb_matrices.shape[-3:])], axis=-3)
+    outlines = np.einsum('...nij,...pj->...npi', switch_matrices[..., :2, :2], corners) + switch_matrices[..., None, :2, 3]
+    outlines = outlines.reshape(outlines.shape[:-3] + (-1, 2))
+    footprint = outlines.max(axis=-2) - outlines.min(axis=-2)
+
+    thumb_reach = np.linalg.norm(thumb_tops[..., :, None, :] - home_tops[..., None, :, :], axis=-1).min(axis=-1)
+    return {
+        'cap_tops': tops,
+        'cap_top_heights': tops[..., 2],
+        'row_travel': pair_distances(tops, row_pairs),
+        'column_travel': pair_distances(tops, column_pairs),
+        'column_stagger': np.diff(home_tops[..., 1], axis=-1),
+        'footprint': footprint,
+        'footprint_area': footprint.prod(axis=-1),
+        'thumb_reach': thumb_reach,
+    }
+
+
+def batch_metrics(keyboards, home_row=1):
+    """Metrics of many keyboards at once, stacked along a first dimension
+    Args:
+        keyboards: Keyboards with the same key positions and number of thumb keys
+    Raises:
+        ValueError: if the keyboards have different keys, these need to be batched separately
+    """
+    placements = [kb.get_placement() for kb in keyboards]
+    first = placements[0]
+    for placement in placements[1:]:
+        if placement['positions'] != first['positions'] or len(placement['thumb_matrices']) != len(first['thumb_matrices']):
+            raise ValueError('Keyboards with different keys can not be stacked, batch them separately')
+    stacked = {name: np.stack([placement[name] for placement in placements])
+               for name in ('key_matrices', 'thumb_matrices', 'cth', 'keyhole_size')}
+    return get_metrics(positions=first['positions'], home_row=home_row, **stacked)
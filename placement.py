@@ -0,0 +1,140 @@
+"""Batched placement math: stacks of 4x4 affine matrices, computed with NumPy only
+
+These give the same placements as chains of Rotate/Translate nodes, without building any CSG.
+All functions broadcast over leading dimensions, so many candidate layouts can be placed at once.
+"""
+import numpy as np
+
+
+def rotation_matrices(axis, angles):
+    """Stack of rotations around a common axis
+    Args:
+        axis: [3] rotation axis
+        angles: [...] angles in degrees
+    Returns:
+        [..., 3, 3] array
+    """
+    axis = np.asarray(axis, dtype=float)
+    ux, uy, uz = axis / np.linalg.norm(axis)
+    theta = np.deg2rad(np.asarray(angles, dtype=float))[..., None, None]
+    cross = np.array([[0., -uz, uy], [uz, 0., -ux], [-uy, ux, 0.]])
+    outer = np.outer([ux, uy, uz], [ux, uy, uz])
+    return np.cos(theta) * np.eye(3) + np.sin(theta) * cross + (1 - np.cos(theta)) * outer
+
+
+def euler_matrices(angles):
+    """Stack of rotations around x, then y, then z
+    Args:
+        angles: [..., 3] angles in degrees
+    Returns:
+        [..., 3, 3] array
+    """
+    angles = np.asarray(angles, dtype=float)
+    rx = rotation_matrices([1., 0., 0.], angles[..., 0])
+    ry = rotation_matrices([0., 1., 0.], angles[..., 1])
+    rz = rotation_matrices([0., 0., 1.], angles[..., 2])
+    return rz @ ry @ rx
+
+
+def affine_matrices(linear=None, offsets=None):
+    """Stack of 4x4 affine matrices
+    Args:
+        linear: [..., 3, 3] linear parts, None for identities
+        offsets: [..., 3] translations, None for no translation
+    """
+    shape = np.shape(linear)[:-2] if linear is not None else np.shape(offsets)[:-1]
+    if linear is not None and offsets is not None:
+        shape = np.broadcast_shapes(shape, np.shape(offsets)[:-1])
+    matrices = np.zeros(shape + (4, 4))
+    matrices[..., :3, :3] = np.eye(3) if linear is None else linear
+    if offsets is not None:
+        matrices[..., :3, 3] = offsets
+    matrices[..., 3, 3] = 1.
+    return matrices
+
+
+def box_corners(size):
+    """Corners of a box centered on the origin
+    Returns:
+        [8, 3] array
+    """
+    corners = np.array([[x, y, z] for x in (-1., 1.) for y in (-1., 1.) for z in (-1., 1.)])
+    return corners * np.asarray(size, dtype=float) / 2
+
+
+def transform_points(matrices, points):
+    """Apply every matrix in a stack to the same points
+    Args:
+        matrices: [..., 4, 4] stack of affine matrices
+        points: [P, 3] points
+    Returns:
+        [..., P, 3] array
+    """
+    points = np.asarray(points, dtype=float)
+    return np.einsum('...ij,pj->...pi', matrices[..., :3, :3], points) + matrices[..., None, :3, 3]
+
+
+def translation_matrices(offsets):
+    """Stack of translations
+    Args:
+        offsets: [..., 3] translations
+    """
+    return affine_matrices(offsets=np.asarray(offsets, dtype=float))
+
+
+def pivot_matrices(axis, angles, origins):
+    """Stack of rotations around a common axis direction, each through its own point
+    Args:
+        axis: [3] rotation axis
+        angles: [...] angles in degrees
+        origins: [..., 3] points on the axes
+    """
+    linear = rotation_matrices(axis, angles)
+    origins = np.asarray(origins, dtype=float)
+    # x -> R (x - o) + o
+    return affine_matrices(linear, origins - np.einsum('...ij,...j->...i', linear, origins))
+
+
+def torus_key_matrices(row_radii, row_angles, column_radii, column_angles, z_angles, column_offsets,
+                       tenting_angle=None, z_offset=None):
+    """Placement of keys on tori, the batched form of Keyboard.transform_switch
+    Each key is rotated around x about a point at its row radius, then around y about a point at its column
+    radius, then around z, and moved to its column offset. Finally it is tented around y and lifted.
+    Args:
+        row_radii, row_angles, column_radii, column_angles, z_angles: [...] per key, radii up to the cap tops
+        column_offsets: [..., 3] per key
+        tenting_angle, z_offset: scalars or [...], None to leave them out
+    Returns:
+        [..., 4, 4] array
+    """
+    up = np.array([0., 0., 1.])
+    zeros = np.zeros(np.shape(column_offsets))
+    matrices = pivot_matrices([1., 0., 0.], row_angles, np.asarray(row_radii)[..., None] * up)
+    matrices = pivot_matrices([0., 1., 0.], column_angles, np.asarray(column_radii)[..., None] * up) @ matrices
+    matrices = pivot_matrices([0., 0., 1.], z_angles, zeros) @ matrices
+    matrices = translation_matrices(column_offsets) @ matrices
+    if tenting_angle is not None:
+        tenting_angle = np.broadcast_to(tenting_angle, np.shape(matrices)[:-2])
+        matrices = pivot_matrices([0., 1., 0.], tenting_angle, zeros) @ matrices
+    if z_offset is not None:
+        matrices = translation_matrices(zeros + np.asarray(z_offset)[..., None] * up) @ matrices
+    return matrices
+
+
+def write_placement_table(path, table):
+    """Write a placement table as .npz arrays, or as a .json list of records, depending on the extension of path
+    Args:
+        table: dict of kind [N] str, index [N], row [N] and col [N] ints (-1 for none) and matrix [N, 4, 4]
+    """
+    if path.endswith('.npz'):
+        np.savez(path, **table)
+    elif path.endswith('.json'):
+        import json
+        records = [{'kind': str(kind), 'index': int(index),
+                    'row': None if row < 0 else int(row), 'col': None if col < 0 else int(col),
+                    'matrix': matrix.tolist()}
+                   for kind, index, row, col, matrix in zip(table['kind'], table['index'], table['row'], table['col'], table['matrix'])]
+        with open(path, 'w') as f:
+            json.dump(records, f, indent=1)
+    else:
+        raise ValueError(f'Unknown placement table format for {path}, use .npz or .json')
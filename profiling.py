@@ -0,0 +1,158 @@
+"""Timing and memory profile of a build, per stage
+
+Stages are timed with perf_counter. In memory mode, tracemalloc also records the memory each stage
+keeps allocated and the peak while the stage runs. Every allocation is counted at the innermost line
+of this repository on its stack, so memory allocated inside NumPy, SciPy or the standard library
+shows up under the module calling them. Allocations made while importing modules are left out.
+"""
+import contextlib
+import os
+import time
+import tracemalloc
+
+# modules that get their own column in the memory report, everything else is counted as other
+MODULES = ('super_solid', 'shell', 'utils', 'scad')
+# stack depth recorded for every allocation, enough to reach the repository from inside NumPy and SciPy
+NFRAMES = 25
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def format_size(size):
+    for unit in ('B', 'KB', 'MB'):
+        if abs(size) < 1024:
+            return f'{size:.0f} {unit}'
+        size /= 1024
+    return f'{size:.1f} GB'
+
+
+def in_repository(filename):
+    path = os.path.abspath(filename)
+    return path.startswith(ROOT + os.sep) and 'site-packages' not in path
+
+
+def module_name(filename):
+    name = os.path.splitext(os.path.basename(filename))[0]
+    return name if name in MODULES else 'other'
+
+
+class Profiler():
+    """Records stages of a build, stage() does nothing when the profiler is disabled"""
+
+    def __init__(self, enabled=False, memory=False, top=10):
+        """
+        Args:
+            enabled: record the time of every stage
+            memory: also trace allocations, which slows the build down a lot
+            top: number of allocating source lines in the report
+        """
+        self.enabled = enabled or memory
+        self.memory = memory
+        self.top = top
+        self.reset()
+
+    def reset(self):
+        self.stages = []  # (name, seconds, allocated bytes per module, peak bytes)
+        self.first_totals = None
+        self.last_totals = None
+        self.attributed = {}  # traceback to the frame it is counted at
+
+    def start(self):
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start(NFRAMES)
+
+    def stop(self):
+        if self.memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def attribute(self, traceback):
+        """The innermost frame of traceback in this repository, the innermost frame if there is none
+        Returns None for the profiler's own allocations and for everything allocated while importing.
+        """
+        if traceback in self.attributed:
+            return self.attributed[traceback]
+        frame = None
+        if traceback[-1].filename not in (tracemalloc.__file__, __file__) \
+                and not any(f.filename.startswith('<frozen importlib') for f in traceback):
+            frame = next((f for f in reversed(traceback) if in_repository(f.filename)), traceback[-1])
+        self.attributed[traceback] = frame
+        return frame
+
+    def totals(self):
+        """Size and number of the traced blocks, per frame they are counted at
+        Returns:
+            dict of tracemalloc.Frame to [size, count]
+        """
+        totals = {}
+        for stat in tracemalloc.take_snapshot().statistics('traceback'):
+            frame = self.attribute(stat.traceback)
+            if frame is not None:
+                total = totals.setdefault(frame, [0, 0])
+                total[0] += stat.size
+                total[1] += stat.count
+        return totals
+
+    @staticmethod
+    def compare(after, before):
+        """Size and count differences per frame, largest changes first
+        Returns:
+            list of (tracemalloc.Frame, size difference, count difference)
+        """
+        diffs = [(frame, after.get(frame, (0, 0))[0] - before.get(frame, (0, 0))[0],
+                  after.get(frame, (0, 0))[1] - before.get(frame, (0, 0))[1]) for frame in after.keys() | before.keys()]
+        return sorted((diff for diff in diffs if diff[1] or diff[2]), key=lambda diff: abs(diff[1]), reverse=True)
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Context manager around one stage of the build, stages are not nested"""
+        if not self.enabled:
+            yield
+            return
+        if self.memory:
+            self.start()
+            before = self.totals() if self.last_totals is None else self.last_totals
+            if self.first_totals is None:
+                self.first_totals = before
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            allocated, peak = {}, None
+            if self.memory:
+                peak = tracemalloc.get_traced_memory()[1]
+                self.last_totals = self.totals()
+                for frame, size_diff, _ in self.compare(self.last_totals, before):
+                    module = module_name(frame.filename)
+                    allocated[module] = allocated.get(module, 0) + size_diff
+            self.stages.append((name, elapsed, allocated, peak))
+
+    def top_allocators(self):
+        """Source lines that allocated the most memory, over all stages
+        Returns:
+            list of (tracemalloc.Frame, size difference, count difference)
+        """
+        if self.first_totals is None:
+            return []
+        return self.compare(self.last_totals, self.first_totals)[:self.top]
+
+    def report(self):
+        """Human readable report of all stages"""
+        columns = MODULES + ('other',)
+        header = f'{"stage":<16}{"time":>10}'
+        if self.memory:
+            header += f'{"peak":>10}{"kept":>10}' + ''.join(f'{name:>12}' for name in columns)
+        lines = [header]
+        for name, elapsed, allocated, peak in self.stages:
+            line = f'{name:<16}{elapsed:>9.3f}s'
+            if self.memory:
+                line += f'{format_size(peak):>10}{format_size(sum(allocated.values())):>10}'
+                line += ''.join(f'{format_size(allocated.get(module, 0)):>12}' for module in columns)
+            lines.append(line)
+        lines.append(f'{"total":<16}{sum(stage[1] for stage in self.stages):>9.3f}s')
+        if self.memory:
+            lines.append(f'peak {format_size(max(stage[3] for stage in self.stages))}, top allocators:')
+            for frame, size_diff, count_diff in self.top_allocators():
+                lines.append(f'{format_size(size_diff):>10} {count_diff:>8} blocks  '
+                             f'{os.path.basename(frame.filename)}:{frame.lineno}')
+        return '\n'.join(lines)
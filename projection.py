@@ -0,0 +1,84 @@
+"""2D outlines of the plate, projected onto the xy plane straight from the placement matrices
+
+Every switch has rectangular footprints in its own frame, so their outlines follow from the placement
+matrices without building or rendering any 3D geometry. The outlines are written as SVG or DXF,
+for laser cut plate prototypes.
+"""
+import numpy as np
+from placement import transform_points
+
+
+def rectangle(width, height):
+    """Corners of a centered rectangle in the z = 0 plane, counter clockwise
+    Returns:
+        [4, 3] array
+    """
+    x, y = width / 2, height / 2
+    return np.array([[-x, -y, 0.], [x, -y, 0.], [x, y, 0.], [-x, y, 0.]])
+
+
+def project_outlines(matrices, outline):
+    """Place an outline with every matrix, and project it onto the xy plane
+    Args:
+        matrices: [N, 4, 4] stack of placements
+        outline: [K, 3] points of the outline, in the frame of a switch
+    Returns:
+        [N, K, 2] array
+    """
+    return transform_points(matrices, outline)[..., :2]
+
+
+def get_bounds(layers):
+    points = np.concatenate([np.reshape(polygons, (-1, 2)) for polygons in layers.values()], axis=0)
+    return points.min(axis=0), points.max(axis=0)
+
+
+def write_svg(path, layers, margin=5.):
+    """Write closed polygons as an SVG file in mm, every layer is a group
+    Args:
+        layers: dict of layer name to [N, K, 2] array or list of [K, 2] arrays
+        margin: space around the outlines, in mm
+    """
+    lo, hi = get_bounds(layers)
+    lo, hi = lo - margin, hi + margin
+    width, height = hi - lo
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+             f'<svg xmlns="http://www.w3.org/2000/svg" width="{width:.3f}mm" height="{height:.3f}mm" '
+             f'viewBox="0 0 {width:.3f} {height:.3f}">']
+    for name, polygons in layers.items():
+        lines.append(f'<g id="{name}" fill="none" stroke="black" stroke-width="0.1">')
+        for polygon in polygons:
+            # svg has y pointing down
+            points = ' '.join(f'{x - lo[0]:.4f},{hi[1] - y:.4f}' for x, y in polygon)
+            lines.append(f'<polygon points="{points}"/>')
+        lines.append('</g>')
+    lines.append('</svg>')
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+def write_dxf(path, layers):
+    """Write closed polygons as an R12 DXF file in mm, every layer is a DXF layer
+    Args:
+        layers: dict of layer name to [N, K, 2] array or list of [K, 2] arrays
+    """
+    lines = ['0', 'SECTION', '2', 'ENTITIES']
+    for name, polygons in layers.items():
+        for polygon in polygons:
+            lines += ['0', 'POLYLINE', '8', name, '66', '1', '70', '1']  # vertices follow, closed
+            for x, y in polygon:
+                lines += ['0', 'VERTEX', '8', name, '10', f'{x:.4f}', '20', f'{y:.4f}']
+            lines += ['0', 'SEQEND', '8', name]
+    lines += ['0', 'ENDSEC', '0', 'EOF']
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+def write_projection(path, layers):
+    """Write an .svg or .dxf file, depending on the extension of path"""
+    if path.endswith('.svg'):
+        write_svg(path, layers)
+    elif path.endswith('.dxf'):
+        write_dxf(path, layers)
+    else:
+        raise ValueError(f'Unknown projection format for {path}, use .svg or .dxf')
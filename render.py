@@ -0,0 +1,180 @@
+"""Render .scad files to STL with OpenSCAD
+
+A model can be split into disjoint boxes that are rendered as independent OpenSCAD jobs in parallel,
+the resulting meshes are stitched back together. Each box only gets the parts of the tree that can
+reach into it, so the jobs are smaller than the whole model, not just spread over more cores.
+"""
+import copy
+import os
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import mesh
+import scad
+from super_solid import Cube, Difference, Intersection, Union, apply_transforms, compose
+
+OPENSCAD = os.environ.get('OPENSCAD', 'openscad')
+
+
+def render_stl(scad_path, stl_path, openscad=OPENSCAD):
+    """Render a single .scad file with OpenSCAD, to a binary STL file that mesh.Mesh.load can memory map"""
+    result = subprocess.run([openscad, '--export-format', 'binstl', '-o', stl_path, scad_path],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f'OpenSCAD failed to render {scad_path}:\n{result.stderr}')
+    if not mesh.is_binary_stl(stl_path):  # exports of OpenSCAD versions before binstl
+        mesh.write_stl(stl_path, mesh.read_ascii_stl(stl_path))
+    return stl_path
+
+
+def render_all(jobs, n_jobs=None, openscad=OPENSCAD):
+    """Render .scad files in parallel, every job is its own OpenSCAD process
+    Args:
+        jobs: list of (scad path, stl path)
+        n_jobs: number of simultaneous renders, None for the number of cores
+    """
+    with ThreadPoolExecutor(max_workers=n_jobs or os.cpu_count()) as pool:
+        return list(pool.map(lambda job: render_stl(*job, openscad=openscad), jobs))
+
+
+def overlaps(bounds, lo, hi):
+    return bounds is not None and np.all(bounds[0] <= hi) and np.all(bounds[1] >= lo)
+
+
+def get_bounds_tree(model):
+    """Bounds of every node in the frame of the root, as a tree of [node, bounds, children] records
+    Shared subtrees get a record for every place they are used. The leaves are transformed in one
+    batch like in get_points, the bounds of the other nodes are combined from their children.
+    Bounds are (min, max) corners, or None for nodes without points.
+    """
+    leaves = []
+    leaf_records = []
+    root = [model, None, []]
+    post_order = []
+    stack = [(root, None, None)]
+    while stack:
+        record, linear, offset = stack.pop()
+        node = record[0]
+        points = node.local_points()
+        if points is not None:
+            leaves.append((points, linear, offset))
+            leaf_records.append(record)
+            continue
+        post_order.append(record)
+        if node.is_transform:
+            linear, offset = compose(linear, offset, node.linear, node.offset)
+        for child in node.children:
+            record[2].append([child, None, []])
+        stack.extend((child_record, linear, offset) for child_record in reversed(record[2]))
+
+    if leaves:
+        points = apply_transforms(leaves)
+        counts = np.array([len(leaf[0]) for leaf in leaves])
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        nonempty = counts > 0
+        mins = np.minimum.reduceat(points, starts[nonempty], axis=0) if nonempty.any() else None
+        maxs = np.maximum.reduceat(points, starts[nonempty], axis=0) if nonempty.any() else None
+        for record, lo, hi in zip([r for r, keep in zip(leaf_records, nonempty) if keep], mins, maxs):
+            record[1] = (lo, hi)
+
+    for record in reversed(post_order):
+        node, _, children = record
+        if isinstance(node, Difference):
+            # a difference never reaches outside its first child
+            children = children[:1]
+        child_bounds = [child[1] for child in children if child[1] is not None]
+        if isinstance(node, Intersection):
+            if len(child_bounds) == len(children) and child_bounds:
+                lo = np.max([b[0] for b in child_bounds], axis=0)
+                hi = np.min([b[1] for b in child_bounds], axis=0)
+                record[1] = (lo, hi) if np.all(lo <= hi) else None
+        elif child_bounds:
+            record[1] = (np.min([b[0] for b in child_bounds], axis=0), np.max([b[1] for b in child_bounds], axis=0))
+    return root
+
+
+def prune_to_box(model, lo, hi, bounds_tree=None):
+    """Drop the parts of a tree that can not reach into the box lo, hi
+    Unions and transforms lose the children outside the box, differences the subtracted parts outside
+    the box, and intersections with a part outside the box are empty. The bounds of the points are
+    conservative, so the result is the same inside the box. Hulls and primitives are kept whole.
+    Args:
+        model: SuperSolid tree
+        lo, hi: corners of the box
+        bounds_tree: result of get_bounds_tree(model), to reuse it between boxes
+    Returns:
+        the pruned tree, None if nothing is left
+    """
+    if bounds_tree is None:
+        bounds_tree = get_bounds_tree(model)
+    pruned = {}
+    stack = [(bounds_tree, False)]
+    while stack:
+        record, expanded = stack.pop()
+        node, bounds, children = record
+        if not expanded:
+            if not overlaps(bounds, lo, hi):
+                pruned[id(record)] = None
+            elif not children or not isinstance(node, (Union, Difference, Intersection)) and not node.is_transform:
+                pruned[id(record)] = node
+            else:
+                stack.append((record, True))
+                stack.extend((child, False) for child in children)
+            continue
+        kept = [pruned[id(child)] for child in children]
+        if isinstance(node, Difference):
+            kept = kept[:1] + [child for child in kept[1:] if child is not None] if kept[0] is not None else []
+        elif isinstance(node, Intersection):
+            kept = kept if all(child is not None for child in kept) else []
+        else:
+            kept = [child for child in kept if child is not None]
+        if not kept:
+            pruned[id(record)] = None
+        elif len(kept) == len(node.children) and all(a is b for a, b in zip(kept, node.children)):
+            pruned[id(record)] = node
+        elif isinstance(node, Difference) and len(kept) == 1:
+            pruned[id(record)] = kept[0]
+        else:
+            clone = copy.copy(node)
+            clone.children = kept
+            pruned[id(record)] = clone
+    return pruned[id(bounds_tree)]
+
+
+def write_partitions(model, regions, stl_path, precision=scad.DEFAULT_PRECISION):
+    """Write one .scad file per region, with the model pruned and intersected with the region
+    Args:
+        model: SuperSolid tree
+        regions: dict of region name to (lo, hi) box corners, the boxes should not overlap
+        stl_path: file name of the stitched result, the parts are written next to it in partitions/
+    Returns:
+        list of (scad path, stl path, lo, hi) for the regions that are not empty
+    """
+    directory, fname = os.path.split(stl_path)
+    directory = os.path.join(directory, 'partitions')
+    os.makedirs(directory, exist_ok=True)
+    stem = os.path.splitext(fname)[0]
+    bounds_tree = get_bounds_tree(model)
+    parts = []
+    for name, (lo, hi) in regions.items():
+        lo, hi = np.asarray(lo, dtype=float), np.asarray(hi, dtype=float)
+        pruned = prune_to_box(model, lo, hi, bounds_tree)
+        if pruned is None:
+            continue
+        part = Intersection()(pruned, Cube(hi - lo).translate(lo))
+        part_path = os.path.join(directory, f'{stem}_{name}')
+        part.write_scad(part_path + '.scad', precision=precision)
+        parts.append((part_path + '.scad', part_path + '.stl', lo, hi))
+    return parts
+
+
+def stitch_partitions(parts, stl_path, tol=1e-3):
+    """Merge the rendered regions into one STL file, see mesh.stitch
+    Args:
+        parts: list of (scad path, stl path, lo, hi), as returned by write_partitions
+    """
+    faces = mesh.shared_faces([(lo, hi) for _, _, lo, hi in parts], tol=tol)
+    meshes = ((mesh.Mesh.load(part_stl), part_faces) for (_, part_stl, _, _), part_faces in zip(parts, faces))
+    with mesh.StlWriter(stl_path) as writer:
+        for chunk in mesh.stitch(meshes, tol=tol):
+            writer.write(chunk)
@@ -0,0 +1,134 @@
+"""Canonical OpenSCAD emitter for SuperSolid trees
+
+Numbers are rounded to a fixed precision and printed without trailing zeros, and identity
+transforms are left out, so equal geometry always gives byte identical files.
+"""
+from decimal import Decimal
+
+import numpy as np
+
+DEFAULT_PRECISION = 1e-4
+INDENT = '\t'
+IDENTITY4 = np.eye(4)
+
+
+class Formatter():
+    """Formats node parameters as canonical OpenSCAD values"""
+
+    def __init__(self, precision=DEFAULT_PRECISION):
+        """
+        Args:
+            precision: numbers are rounded to a multiple of this, in mm and degrees
+        """
+        self.precision = precision
+        # enough decimals for every multiple of precision, like 0.75 for 0.25, float noise is cut off
+        self.decimals = max(0, -Decimal(f'{precision:.12g}').normalize().as_tuple().exponent)
+
+    def number(self, x):
+        x = round(float(x) / self.precision) * self.precision
+        s = f'{x:.{self.decimals}f}'
+        if '.' in s:
+            s = s.rstrip('0').rstrip('.')
+        return '0' if s == '-0' else s
+
+    def value(self, x):
+        if isinstance(x, (bool, np.bool_)):
+            return 'true' if x else 'false'
+        if isinstance(x, (int, np.integer)):
+            return str(int(x))
+        if isinstance(x, (tuple, list, np.ndarray)):
+            return '[' + ', '.join(self.value(v) for v in x) + ']'
+        return self.number(x)
+
+    def call(self, name, **params):
+        """Format a module call, params that are None are left out; $fn is passed as fn"""
+        args = ', '.join(f'{"$fn" if key == "fn" else key} = {self.value(value)}'
+                         for key, value in params.items() if value is not None)
+        return f'{name}({args})'
+
+    def matrix(self, m):
+        """Format an affine matrix, the linear part gets three extra decimals
+        Its entries are unitless and scale coordinates of up to a few hundred mm.
+        """
+        fine = Formatter(self.precision * 1e-3)
+        return '[' + ', '.join('[' + ', '.join([fine.number(x) for x in row[:3]] + [self.number(row[3])]) + ']'
+                               for row in m) + ']'
+
+    def is_zero(self, v):
+        return all(self.number(x) == '0' for x in np.ravel(v))
+
+    def is_zero_angle(self, a):
+        """Angles (degrees) that round to whole turns, also just below one, like 359.99999 or -1e-9"""
+        return self.is_zero((np.asarray(a, dtype=float) + 180.) % 360. - 180.)
+
+    def is_identity(self, m):
+        """Affine matrices that are formatted like the identity, see matrix"""
+        return self.matrix(m) == self.matrix(IDENTITY4)
+
+
+def emit(root, fmt, depth, modules):
+    """Lines of OpenSCAD code for a tree, walking it with an explicit stack
+    Args:
+        root: SuperSolid object
+        fmt: Formatter
+        depth: indentation depth of root
+        modules: dict of module node id to (unique name, node), modules met in the tree are added to it
+    """
+    lines = []
+    stack = [(root, depth)]
+    while stack:
+        node, depth = stack.pop()
+        if isinstance(node, str):  # closing brace
+            lines.append(INDENT * depth + node)
+            continue
+        if node.module is not None:  # the children are written once, in the module definition
+            if id(node) not in modules:
+                names = {name for name, _ in modules.values()}
+                name, k = node.module, 1
+                while name in names:
+                    name, k = f'{node.module}_{k}', k + 1
+                modules[id(node)] = (name, node)
+            lines.append(INDENT * depth + modules[id(node)][0] + '();')
+            continue
+        statement = node.scad(fmt)
+        children = node.children
+        if statement is None:  # identity transform
+            if len(children) == 1:
+                stack.append((children[0], depth))
+                continue
+            statement = 'union()'
+        if not children:
+            lines.append(INDENT * depth + statement + ';')
+            continue
+        lines.append(INDENT * depth + statement + ' {')
+        stack.append(('}', depth))
+        stack.extend((child, depth + 1) for child in reversed(children))
+    return lines
+
+
+def render(root, precision=DEFAULT_PRECISION, uses=()):
+    """Render a SuperSolid tree to OpenSCAD code, module definitions first
+    Args:
+        root: SuperSolid object
+        precision: numbers are rounded to a multiple of this
+        uses: (path, ScadModule) pairs of modules that another file defines, they are only called here
+    """
+    fmt = Formatter(precision)
+    modules = {id(node): (node.module, node) for _, node in uses}
+    lines = emit(root, fmt, 0, modules)
+    definitions = []
+    done = len(uses)
+    while done < len(modules):  # module bodies can use other modules
+        name, node = list(modules.values())[done]
+        definitions.append(f'module {name}() {{')
+        for child in node.children:
+            definitions.extend(emit(child, fmt, 1, modules))
+        definitions.append('}')
+        done += 1
+    header = [f'use <{path}>' for path, _ in uses]
+    return '\n'.join(header + definitions + lines) + '\n'
+
+
+def render_to_file(root, path, precision=DEFAULT_PRECISION, uses=()):
+    with open(path, 'w') as f:
+        f.write(render(root, precision=precision, uses=uses))
@@ -1,4 +1,3 @@
-#!/usr/bin/env ipython
 from super_solid import Hull, Union, Difference, Intersection
 from super_solid import Cube, Cylinder, Sphere
 from super_solid import Translate, Rotate, Scale
@@ -115,7 +114,7 @@ class Shell():
 
 #TODO: update to only close one end by choice?
 class CylinderShell(Shell):
-    def __init__(self, h, r, thickness, close_ends=False, center=True, segments=50):
+    def __init__(self, h, r, thickness, close_ends=False, center=True, segments=None):
         if close_ends:
             self.inner = Cylinder(h - thickness, r=(r - thickness), center=center, segments=segments)
         else:
@@ -151,7 +150,7 @@ class BoxShell(Shell):
         self.shell = Difference()(self.outer, self.inner)
 
 class RoundedBoxShell(Shell):
-    def __init__(self, size, thickness, radius, round_top=True, round_bottom=False, segments=50):
+    def __init__(self, size, thickness, radius, round_top=True, round_bottom=False, segments=None):
         assert radius > thickness, "Cannot round corners if radius < thickness"
         inner = []
         outer = []
@@ -174,7 +173,7 @@ class RoundedBoxShell(Shell):
         self.shell = Difference()(self.outer, self.inner)
 
 class RoundedBoxShellNoHulls(Shell): #Slow, very very slow
-    def __init__(self, size, thickness, radius, round_top=True, round_bottom=False, segments=50):
+    def __init__(self, size, thickness, radius, round_top=True, round_bottom=False, segments=None):
         boxshell = BoxShell(size, thickness, close_top=True, close_bottom=True, center=True)
 
         assert radius > thickness, "Cannot round corners if radius < thickness"
@@ -256,13 +255,13 @@ class RoundedBoxShellNoHulls(Shell): #Slow, very very slow
 
 
 class SphericalShell(Shell):
-    def __init__(self, r, thickness, segments=50):
+    def __init__(self, r, thickness, segments=None):
         self.outer = Sphere(r, segments=segments)
         self.inner = Sphere(r - thickness, segments=segments)
         self.shell = Difference()(self.outer, self.inner)
 
 class ConicalShell(Shell):
-    def __init__(self, h, r, thickness, center=False, segments=50):
+    def __init__(self, h, r, thickness, center=False, segments=None):
 
         self.outer = Cylinder(h, r1=r, r2=0., center=center, segments=segments)
         if not center:
@@ -342,7 +341,7 @@ class TentedBoxShell(Shell):
     pass
 
 class TentedRoundedShell(Shell):
-    def __init__(self, xy_min, xy_max, at_z, z_below, tent_function, thickness, radius, segments=50):
+    def __init__(self, xy_min, xy_max, at_z, z_below, tent_function, thickness, radius, segments=None):
         """
         Args:
             xy_min, xy_max, at_z: extent and location in z BEFORE tenting
@@ -353,34 +352,19 @@ class TentedRoundedShell(Shell):
         xy_max, xy_min = np.array(xy_max), np.array(xy_min)
         size_xy = xy_max - xy_min
         loc_xy = (xy_min + xy_max) / 2
-        loc = np.array([*loc_xy, at_z - radius])
         inner = []
         outer = []
-        for i,j in zip([1, 1, -1, -1], [1, -1, 1, -1]):
-            outer.append(Sphere(r=radius, segments=segments).translate([(size_xy[0] / 2 - radius) * i, (size_xy[1] / 2 - radius) * j, 0.]).translate(loc))
-            inner.append(Sphere(r=(radius - thickness), segments=segments).translate([(size_xy[0] / 2 - radius) * i, (size_xy[1] / 2 - radius) * j, 0.]).translate(loc))
+        offsets, loc = get_top_sphere_offsets(xy_min, xy_max, at_z, radius)
+        for offset in offsets:
+            outer.append(Sphere(r=radius, segments=segments).translate(offset).translate(loc))
+            inner.append(Sphere(r=(radius - thickness), segments=segments).translate(offset).translate(loc))
 
         inner = [tent_function(shape) for shape in inner]
         outer = [tent_function(shape) for shape in outer]
 
-        outer_posns = np.concatenate([o.get_points() for o in outer])
-        sorted_outer_posns = outer_posns[outer_posns[:,2].argsort()]
-
-        # first two should be the lower ones, last two the higher
-        # we want the z-height of the lowest one, set the x to x - l / cos(theta), where
-        # tan(theta) = dz / dx
-        high = sorted_outer_posns[2]
-        low = sorted_outer_posns[0]
-
-
-        dx = abs(low[0] - high[0])
-        dz = abs(low[2] - high[2])
+        outer_posns = np.array([o.get_points().mean(axis=0) for o in outer]) # sphere centers
+        low, w = get_tented_base(outer_posns, size_xy)
 
-
-        w = size_xy[0] / np.cos(np.arctan(dz / dx))
-
-
-        self.outer_xy = []
         for i in [1, -1]:
             outer.append(Sphere(r=radius, segments=segments).translate([low[0] - w, i * (size_xy[1] / 2 - radius) + loc_xy[1], low[2]]))
             inner.append(Sphere(r=radius - thickness, segments=segments).translate([low[0] - w, i * (size_xy[1] / 2 - radius) + loc_xy[1], low[2]]))
@@ -391,8 +375,7 @@ class TentedRoundedShell(Shell):
             inner.append(Sphere(r=radius - thickness, segments=segments).translate([low[0], i * (size_xy[1] / 2 - radius) + loc_xy[1], low[2] - z_below]))
             inner.append(Sphere(r=radius - thickness, segments=segments).translate([low[0] - w, i * (size_xy[1] / 2 - radius) + loc_xy[1], low[2] - z_below]))
 
-            self.outer_xy.append([low[0] - w - radius, i * (size_xy[1] / 2 ) + loc_xy[1]])
-            self.outer_xy.append([low[0] + radius, i * (size_xy[1] / 2 ) + loc_xy[1]])
+        self.outer_xy = get_tented_screw_corners(low, w, xy_min, xy_max, radius)
 
         self.inner = Hull()(*inner)
         self.outer = Hull()(*outer)
@@ -401,6 +384,47 @@ class TentedRoundedShell(Shell):
     def get_screw_corners(self):
         return self.outer_xy
 
+def get_top_sphere_offsets(xy_min, xy_max, at_z, radius):
+    """Centers of the four top spheres of a TentedRoundedShell before tenting, as offsets from a common location
+    Returns:
+        ([4, 3] offsets, [3] location)
+    """
+    xy_max, xy_min = np.array(xy_max), np.array(xy_min)
+    size_xy = xy_max - xy_min
+    loc = np.array([*(xy_min + xy_max) / 2, at_z - radius])
+    offsets = np.array([[(size_xy[0] / 2 - radius) * i, (size_xy[1] / 2 - radius) * j, 0.]
+                        for i, j in zip([1, 1, -1, -1], [1, -1, 1, -1])])
+    return offsets, loc
+
+def get_tented_base(centers, size_xy):
+    """Lowest tented top sphere center, and the x length of the base under it
+    Args:
+        centers: [4, 3] tented centers of the top spheres
+    """
+    sorted_centers = centers[centers[:,2].argsort()]
+
+    # first two should be the lower ones, last two the higher
+    # we want the z-height of the lowest one, set the x to x - l / cos(theta), where
+    # tan(theta) = dz / dx
+    high = sorted_centers[2]
+    low = sorted_centers[0]
+    dx = abs(low[0] - high[0])
+    dz = abs(low[2] - high[2])
+
+    w = size_xy[0] / np.cos(np.arctan(dz / dx))
+    return low, w
+
+def get_tented_screw_corners(low, w, xy_min, xy_max, radius):
+    """xy corners of the base of a TentedRoundedShell, where the screws go, see get_tented_base"""
+    xy_max, xy_min = np.array(xy_max), np.array(xy_min)
+    size_xy = xy_max - xy_min
+    loc_xy = (xy_min + xy_max) / 2
+    corners = []
+    for i in [1, -1]:
+        corners.append([low[0] - w - radius, i * (size_xy[1] / 2 ) + loc_xy[1]])
+        corners.append([low[0] + radius, i * (size_xy[1] / 2 ) + loc_xy[1]])
+    return corners
+
 def box_around(mins, maxs):
     mins = np.array(mins)
     maxs = np.array(maxs)
@@ -1,11 +1,35 @@
-from solid import union, difference, intersection, hull
-from solid import cube, sphere, cylinder
-from solid import translate, mirror, scale, rotate
-from solid import scad_render_to_file
 import numpy as np
+import hashlib
+from functools import lru_cache
+from lod import segments_for_radius
 
 class SuperSolid():
-    """Parent class with some useful shortcuts for a more pythonic feel"""
+    """Parent class with some useful shortcuts for a more pythonic feel
+
+    Nodes are small slotted objects that only hold their own parameters and children,
+    they are written to OpenSCAD by scad.render.
+    """
+    __slots__ = ('children',)
+    name = None
+
+    def __init__(self):
+        self.children = []
+
+    def __call__(self, *args):
+        """Add children, lists are flattened and integers are skipped (which allows sum())"""
+        for child in args:
+            self.add(child)
+        return self
+
+    def add(self, child):
+        if isinstance(child, (list, tuple)):
+            for c in child:
+                self.add(c)
+        elif isinstance(child, int):
+            pass
+        else:
+            self.children.append(child)
+        return self
 
     def rotate(self, a, v):
         """apply a rotation
@@ -64,7 +88,10 @@ class SuperSolid():
         """
         return Hull()(self, *objects)
 
-    def __sum__(self, *args):
+    def __add__(self, *args):
+        return Union()(self, *args)
+
+    def __radd__(self, *args):
         return Union()(self, *args)
 
     def __sub__(self, *args):
@@ -73,70 +100,340 @@ class SuperSolid():
     def __mul__(self, *args):
         return Intersection()(self, *args)
 
-    def write_scad(self, path):
-        scad_render_to_file(self, path)
+    # Tree walks: all of them use an explicit stack, so deep trees never hit the recursion limit
 
+    is_transform = False
+    combines_points = False  # the node computes its points from the points of its children, see combine_points
+    linear = None  # 3x3 linear part of transform nodes, None is the identity
+    offset = None  # translation of transform nodes, None is no translation
+    module = None  # name of the OpenSCAD module the children are emitted in, see ScadModule
 
-class Cube(SuperSolid, cube):
+    @property
+    def matrix(self):
+        """4x4 affine matrix of transform nodes"""
+        if self.is_transform:
+            return affine(self.linear, self.offset)
+        return None
 
-    def __init__(self, size, center=False):
-        cube.__init__(self, size, center=center)
-        size = np.array(size)
-        self.points = np.array([
-            [0.0, 0.0, 0.0],
-            [1.0, 0.0, 0.0],
-            [0.0, 1.0, 0.0],
-            [0.0, 0.0, 1.0],
-            [1.0, 1.0, 0.0],
-            [0.0, 1.0, 1.0],
-            [1.0, 0.0, 1.0],
-            [1.0, 1.0, 1.0],
-        ]) * size.reshape((1, -1))
-
-        if center:
-            self.points -= 0.5 * size.reshape((1, -1))
+    def params(self):
+        """Parameters of this node, used for hashing"""
+        return ()
+
+    def local_points(self):
+        """Points of a leaf in its own frame, None for nodes that pass on the points of their children"""
+        return None
+
+    def point_children(self):
+        """Children that contribute to the points of this node"""
+        return self.children
+
+    def combine_points(self, parts):
+        """Points of a node that combines the points of its children itself, see combines_points
+        Args:
+            parts: list of [N_i, 3] points of every point child, in the frame of this node
+        """
+        raise NotImplementedError()
+
+    def walk(self):
+        """Iterate over all nodes in the tree, depth first in child order"""
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(node.children))
 
     def get_points(self):
-        return self.points
+        """Get the points of all leaves, in the frame of this node
+        The transforms are accumulated while walking the tree, and applied to all leaves in one batch.
+        Nodes that combine the points of their children (combines_points) collect the leaves of every child
+        in the frame of the node, and are finished by a post-order marker once all children are walked.
+        Their points are kept for this call only, so shared subtrees are combined once and edits or LOD
+        changes between calls are always seen.
+        """
+        leaves = []
+        combined = {}  # id of a combining node -> its points
+        # (node, linear, offset, list the leaves go to, per child leaves of a post-order marker or None)
+        stack = [(self, None, None, leaves, None)]
+        while stack:
+            node, linear, offset, target, parts = stack.pop()
+            if parts is not None:
+                points = combined[id(node)] = node.combine_points([apply_transforms(part) for part in parts])
+                target.append((points, linear, offset))
+                continue
+            points = node.local_points()
+            if points is None:
+                points = combined.get(id(node))
+            if points is not None:
+                target.append((points, linear, offset))
+                continue
+            children = node.point_children()
+            if node.combines_points:
+                parts = [[] for _ in children]
+                stack.append((node, linear, offset, target, parts))
+                stack.extend((child, None, None, part, None) for child, part in zip(reversed(children), reversed(parts)))
+                continue
+            if node.is_transform:
+                linear, offset = compose(linear, offset, node.linear, node.offset)
+            stack.extend((child, linear, offset, target, None) for child in reversed(children))
+        return apply_transforms(leaves)
+
+    def get_bounds(self):
+        """Get the minimum and maximum corner of the axis aligned bounding box"""
+        points = self.get_points()
+        return points.min(axis=0), points.max(axis=0)
+
+    def digest(self):
+        """Content hash of the tree, equal trees give equal hashes regardless of object identity"""
+        memo = {}
+        stack = [(self, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if id(node) in memo:
+                continue
+            if not expanded:
+                stack.append((node, True))
+                stack.extend((child, False) for child in node.children if id(child) not in memo)
+                continue
+            h = hashlib.sha1(repr((node.name, node.params())).encode())
+            for child in node.children:
+                h.update(memo[id(child)])
+            memo[id(node)] = h.digest()
+        return memo[id(self)].hex()
+
+    def scad(self, fmt):
+        """The OpenSCAD statement for this node, without children, None for identity transforms
+        Args:
+            fmt: scad.Formatter
+        """
+        raise NotImplementedError()
+
+    def write_scad(self, path, precision=None, uses=()):
+        """Write the tree as canonical OpenSCAD code
+        Args:
+            path: output file name
+            precision: numbers are rounded to a multiple of this, None for scad.DEFAULT_PRECISION
+            uses: (path, ScadModule) pairs of modules in the tree that another file defines, see scad.render
+        """
+        import scad
+        scad.render_to_file(self, path, precision=precision or scad.DEFAULT_PRECISION, uses=uses)
+
+
+def compose(linear, offset, node_linear, node_offset):
+    """Append the transform of a node to an accumulated transform x -> linear @ x + offset
+    None parts are the identity, so chains of translations never multiply matrices
+    """
+    if node_offset is not None:
+        node_offset = np.array(node_offset) if linear is None else linear @ node_offset
+        offset = node_offset if offset is None else offset + node_offset
+    if node_linear is not None:
+        linear = node_linear if linear is None else linear @ node_linear
+    return linear, offset
+
+
+def apply_transforms(leaves):
+    """Transform a list of point arrays, each with its own accumulated transform, in one batch
+    Args:
+        leaves: list of (points, linear, offset), with points [N_i, 3], linear [3, 3] and offset [3], see compose
+    """
+    if not leaves:
+        return np.zeros((0, 3))
+    if len(leaves) == 1:
+        points, linear, offset = leaves[0]
+        if linear is not None:
+            points = points @ linear.T
+        return points if offset is None else points + offset
+    points = np.concatenate([leaf[0] for leaf in leaves], axis=0)
+    index = np.repeat(np.arange(len(leaves)), [len(leaf[0]) for leaf in leaves])
+    linears = np.stack([IDENTITY3 if leaf[1] is None else leaf[1] for leaf in leaves])
+    offsets = np.stack([ZERO3 if leaf[2] is None else leaf[2] for leaf in leaves])
+    return np.einsum('nij,nj->ni', linears[index], points) + offsets[index]
+
+
+IDENTITY3 = np.eye(3)
+ZERO3 = np.zeros(3)
+
+
+def affine(linear=None, offset=None):
+    """4x4 affine matrix from a 3x3 linear part and an offset"""
+    matrix = np.eye(4)
+    if linear is not None:
+        matrix[:3, :3] = linear
+    if offset is not None:
+        matrix[:3, 3] = offset
+    return matrix
+
+
+def as_floats(v):
+    """Store vectors as plain tuples, they are much smaller than numpy arrays"""
+    if isinstance(v, np.ndarray):
+        return tuple(v.ravel().astype(float).tolist())
+    return tuple(map(float, v))
+
+
+@lru_cache(maxsize=None)
+def unit_circle(segments):
+    """[segments, 2] points on the unit circle, at the angles OpenSCAD uses
+    Cached per number of segments and read only, primitives scale it when their points are needed.
+    """
+    angles = 2 * np.pi * np.arange(segments) / segments
+    circle = np.column_stack([np.cos(angles), np.sin(angles)])
+    circle.flags.writeable = False
+    return circle
+
+
+@lru_cache(maxsize=None)
+def unit_sphere(segments):
+    """[rings * segments, 3] points on the unit sphere, with the (segments + 1) // 2 rings OpenSCAD uses"""
+    rings = (segments + 1) // 2
+    phi = np.pi * (np.arange(rings) + 0.5) / rings
+    circle = unit_circle(segments)
+    sphere = np.concatenate([np.column_stack([np.sin(p) * circle, np.full(segments, np.cos(p))]) for p in phi])
+    sphere.flags.writeable = False
+    return sphere
+
+
+UNIT_CUBE = np.array([
+    [0.0, 0.0, 0.0],
+    [1.0, 0.0, 0.0],
+    [0.0, 1.0, 0.0],
+    [0.0, 0.0, 1.0],
+    [1.0, 1.0, 0.0],
+    [0.0, 1.0, 1.0],
+    [1.0, 0.0, 1.0],
+    [1.0, 1.0, 1.0],
+])
+
+
+class Cube(SuperSolid):
+    __slots__ = ('size', 'center')
+    name = 'cube'
+
+    def __init__(self, size, center=False):
+        SuperSolid.__init__(self)
+        if np.isscalar(size):
+            size = [size] * 3
+        self.size = as_floats(size)
+        self.center = center
+
+    def params(self):
+        return (self.size, self.center)
+
+    def local_points(self):
+        points = UNIT_CUBE * np.array(self.size).reshape((1, -1))
+        if self.center:
+            points -= 0.5 * np.array(self.size).reshape((1, -1))
+        return points
 
     def is_in(self, points):
         #TODO: return an array of equal size to points with True or False
         pass
 
+    def scad(self, fmt):
+        return fmt.call('cube', size=self.size, center=self.center)
+
 
 #TODO: expand to the full definition:
-class Cylinder(SuperSolid, cylinder):
+class Cylinder(SuperSolid):
+    __slots__ = ('h', 'r1', 'r2', 'center', 'segments')
+    name = 'cylinder'
 
     def __init__(self, h, r=None, r1=None, r2=None, center=False, segments=None):
-        cylinder.__init__(self, h=h, r=r, r1=r1, r2=r2, center=center, segments=segments)
-        self.points = np.array([
-            [0.0, 0.0, 0.0],
-            [0.0, 0.0, h],
-        ])
-        #TODO: add segments around the perimiters, in "number of segments", as given
-
-        if center:
-            self.points -= 0.5 * np.array([[0., 0., h]])
-
-    def get_points(self):
-        return self.points
+        SuperSolid.__init__(self)
+        self.h = float(h)
+        self.r1 = float(r if r is not None else r1)
+        self.r2 = float(r if r is not None else r2)
+        self.center = center
+        self.segments = segments
+
+    def resolved_segments(self):
+        """Explicit segments, or the number of segments of the active level of detail"""
+        if self.segments is not None:
+            return self.segments
+        return segments_for_radius(max(self.r1, self.r2))
+
+    def params(self):
+        return (self.h, self.r1, self.r2, self.center, self.resolved_segments())
+
+    def local_points(self):
+        """The vertices OpenSCAD generates: a ring (or apex) at the bottom and one at the top"""
+        circle = unit_circle(self.resolved_segments())
+        z0 = -0.5 * self.h if self.center else 0.
+        rings = []
+        for r, z in [(self.r1, z0), (self.r2, z0 + self.h)]:
+            if r > 0:
+                rings.append(np.column_stack([r * circle, np.full(len(circle), z)]))
+            else:
+                rings.append(np.array([[0., 0., z]]))
+        return np.concatenate(rings, axis=0)
+
+    def scad(self, fmt):
+        if self.r1 == self.r2:
+            return fmt.call('cylinder', h=self.h, r=self.r1, center=self.center, fn=self.resolved_segments())
+        return fmt.call('cylinder', h=self.h, r1=self.r1, r2=self.r2, center=self.center, fn=self.resolved_segments())
 
 
 #TODO: expand to full def:
-class Sphere(SuperSolid, sphere):
+class Sphere(SuperSolid):
+    __slots__ = ('r', 'segments')
+    name = 'sphere'
 
-    #TODO: add segments around the perimiters, in "number of segments", as given
     def __init__(self, r, segments=None):
-        sphere.__init__(self, r=r, segments=segments)
-        self.points = np.array([
-            [0.0, 0.0, 0.0],
-        ])
+        SuperSolid.__init__(self)
+        self.r = float(r)
+        self.segments = segments
 
-    def get_points(self):
+    def resolved_segments(self):
+        """Explicit segments, or the number of segments of the active level of detail"""
+        if self.segments is not None:
+            return self.segments
+        return segments_for_radius(self.r)
+
+    def params(self):
+        return (self.r, self.resolved_segments())
+
+    def local_points(self):
+        """The vertices OpenSCAD generates, rings of segments points"""
+        return self.r * unit_sphere(self.resolved_segments())
+
+    def scad(self, fmt):
+        return fmt.call('sphere', r=self.r, fn=self.resolved_segments())
+
+class Polyhedron(SuperSolid):
+    __slots__ = ('points', 'faces')
+    name = 'polyhedron'
+
+    def __init__(self, points, faces):
+        """Generate a polyhedron, for example from a rendered mesh (see mesh.Mesh.to_polyhedron)
+        Args:
+            points: [N, 3] array of points
+            faces: [M, k] array of point indices, clockwise seen from outside like in OpenSCAD
+        """
+        SuperSolid.__init__(self)
+        self.points = np.array(points, dtype=float)
+        self.faces = np.array(faces, dtype=int)
+        self.points.flags.writeable = False
+        self.faces.flags.writeable = False
+
+    def params(self):
+        # the arrays can be large, they are hashed instead of printed
+        return (hashlib.sha1(self.points.tobytes()).hexdigest(), hashlib.sha1(self.faces.tobytes()).hexdigest())
+
+    def local_points(self):
         return self.points
 
+    def to_mesh(self):
+        import mesh
+        faces = self.faces[:, ::-1]  # counter clockwise seen from outside, like STL
+        triangles = np.concatenate([faces[:, [0, i, i + 1]] for i in range(1, faces.shape[1] - 1)], axis=0)
+        return mesh.Mesh(self.points[triangles])
+
+    def scad(self, fmt):
+        return fmt.call('polyhedron', points=self.points, faces=self.faces)
+
 # TODO: expand functionality to full openscad style:
-class Rotate(SuperSolid, rotate):
+class Rotate(SuperSolid):
+    __slots__ = ('a', 'v')
+    name = 'rotate'
 
     def __init__(self, a, v):
         """Generate a rotation
@@ -144,117 +441,286 @@ class Rotate(SuperSolid, rotate):
             a: angle (degrees)
             v: vector around which to rotate
         """
-        rotate.__init__(self, a=a, v=v)
+        SuperSolid.__init__(self)
+        self.a = float(a)
+        self.v = as_floats(v)
 
-        self.rotation_matrix = rotation_matrix(v, a * np.pi / 180.)
+    @property
+    def rotation_matrix(self):
+        return rotation_matrix(self.v, self.a * np.pi / 180.)
 
-    def get_points(self):
-        points = []
-        for child in self.children:
-            points.append(np.einsum('ij,dj->di', self.rotation_matrix, child.get_points()))
-        return np.concatenate(points, axis=0)
+    is_transform = True
+
+    @property
+    def linear(self):
+        return self.rotation_matrix
+
+    def params(self):
+        return (self.a, self.v)
+
+    def scad(self, fmt):
+        if fmt.is_zero_angle(self.a):
+            return None
+        return fmt.call('rotate', a=self.a, v=self.v)
 
 
 # TODO: expand functionality to full openscad style:
-class Translate(SuperSolid, translate):
+class Translate(SuperSolid):
+    __slots__ = ('v',)
+    name = 'translate'
 
     def __init__(self, v):
         """Generate a translation
         Args:
             v: vector of the translation
         """
-        translate.__init__(self, v=v)
+        SuperSolid.__init__(self)
+        self.v = as_floats(v)
 
-        self.v = np.array(v)
+    is_transform = True
 
-    def get_points(self):
-        points = []
-        for child in self.children:
-            points.append(child.get_points() + self.v.reshape((1,3)))
-        return np.concatenate(points, axis=0)
+    @property
+    def offset(self):
+        return self.v
+
+    def params(self):
+        return self.v
+
+    def scad(self, fmt):
+        if fmt.is_zero(self.v):
+            return None
+        return fmt.call('translate', v=self.v)
 
-class Scale(SuperSolid, scale):
+class Scale(SuperSolid):
+    __slots__ = ('v',)
+    name = 'scale'
 
     def __init__(self, v):
         """Generate a scaling
         Args:
             v: scale parameters
         """
-        scale.__init__(self, v=v)
+        SuperSolid.__init__(self)
+        if np.isscalar(v):
+            v = [v] * 3
+        self.v = as_floats(v)
 
-        self.v = np.array(v)
+    is_transform = True
 
-    def get_points(self):
-        points = []
-        for child in self.children:
-            points.append(child.get_points() * self.v.reshape((1,3)))
-        return np.concatenate(points, axis=0)
+    @property
+    def linear(self):
+        return np.diag(self.v)
+
+    def params(self):
+        return self.v
 
-class Mirror(SuperSolid, mirror):
+    def scad(self, fmt):
+        if fmt.is_zero(np.array(self.v) - 1.):
+            return None
+        return fmt.call('scale', v=self.v)
+
+class Mirror(SuperSolid):
+    __slots__ = ('v',)
+    name = 'mirror'
 
     def __init__(self, v):
         """Generate a mirror about a plane through the origin with normal v
         Args:
             v: normal vector
         """
-        mirror.__init__(self, v=v)
+        SuperSolid.__init__(self)
+        self.v = as_floats(v)
 
-        self.v = np.array(v)
-        self.v_norm = self.v / np.linalg.norm(self.v)
+    is_transform = True
 
-    def get_points(self):
-        points = []
-        for child in self.children:
-            child_points = child.get_points()
-            #project onto normal vector:
-            projections = np.dot(child_points, self.v_norm).reshape((-1,1)) * self.v_norm.reshape((1, 3))
-            #and subtract twice to get mirror
-            points.append(child_points - 2 * projections)
-        return np.concatenate(points, axis=0)
+    @property
+    def linear(self):
+        v_norm = np.array(self.v) / np.linalg.norm(self.v)
+        # subtract the projection onto the normal twice
+        return np.eye(3) - 2 * np.outer(v_norm, v_norm)
 
-class Union(SuperSolid, union):
+    def params(self):
+        return self.v
 
-    def __init__(self):
-        union.__init__(self)
+    def scad(self, fmt):
+        return fmt.call('mirror', v=self.v)
 
-    def get_points(self):
-        points = []
-        for child in self.children:
-            points.append(child.get_points())
-        return np.concatenate(points, axis=0)
+class MultMatrix(SuperSolid):
+    __slots__ = ('m',)
+    name = 'multmatrix'
 
-class Intersection(SuperSolid, intersection):
+    def __init__(self, m):
+        """Generate an arbitrary affine transform
+        Args:
+            m: 4x4 affine matrix, or its top 3x4 part
+        """
+        SuperSolid.__init__(self)
+        self.m = as_floats(np.asarray(m, dtype=float)[:3, :4])
 
-    def __init__(self):
-        intersection.__init__(self)
+    is_transform = True
 
-    def get_points(self):
-        points = []
-        for child in self.children:
-            points.append(child.get_points())
-        return np.concatenate(points, axis=0)
+    @property
+    def linear(self):
+        return np.array(self.m).reshape((3, 4))[:, :3]
 
-class Difference(SuperSolid, difference):
+    @property
+    def offset(self):
+        return self.m[3::4]
 
-    def __init__(self):
-        difference.__init__(self)
+    def params(self):
+        return self.m
 
-    def get_points(self):
-        points = []
-        for child in self.children:
-            points.append(child.get_points())
-        return np.concatenate(points, axis=0)
+    def rows(self):
+        return [list(self.m[i:i + 4]) for i in range(0, 12, 4)] + [[0., 0., 0., 1.]]
 
-class Hull(SuperSolid, hull):
+    def scad(self, fmt):
+        if fmt.is_identity(self.rows()):
+            return None
+        return f'multmatrix(m = {fmt.matrix(self.rows())})'
 
-    def __init__(self):
-        hull.__init__(self)
+class PivotRotate(MultMatrix):
+    __slots__ = ('a', 'v', 'origin')
 
-    def get_points(self):
-        points = []
-        for child in self.children:
-            points.append(child.get_points())
-        return np.concatenate(points, axis=0)
+    def __init__(self, a, v, origin):
+        """Generate a rotation around an axis through an arbitrary point, as a single node
+        Args:
+            a: angle (degrees)
+            v: vector around which to rotate
+            origin: point on the axis
+        """
+        self.a = float(a)
+        self.v = as_floats(v)
+        self.origin = as_floats(origin)
+        linear = rotation_matrix(self.v, self.a * np.pi / 180.)
+        # x -> R (x - o) + o
+        MultMatrix.__init__(self, affine(linear, np.array(self.origin) - linear @ self.origin))
+
+    def params(self):
+        return (self.a, self.v, self.origin)
+
+    def scad(self, fmt):
+        if fmt.is_zero(self.origin):  # a plain rotation keeps the exact angle
+            return None if fmt.is_zero_angle(self.a) else fmt.call('rotate', a=self.a, v=self.v)
+        return MultMatrix.scad(self, fmt)
+
+class ScadModule(SuperSolid):
+    __slots__ = ('module',)
+    name = 'module'
+
+    def __init__(self, module):
+        """Emit the children once, as an OpenSCAD module, and every place this node is used as a call to it
+        Share one node between all places, placing it with transforms like any other node.
+        Args:
+            module: name of the module, it is made unique when the file is written
+        """
+        SuperSolid.__init__(self)
+        self.module = module
+
+    def params(self):
+        return (self.module,)
+
+    def scad(self, fmt):
+        return f'{self.module}()'
+
+class Union(SuperSolid):
+    __slots__ = ()
+    name = 'union'
+
+    def __add__(self, x):
+        """Adding to a union extends it, instead of nesting a new union"""
+        return Union()(self.children, x)
+
+    def scad(self, fmt):
+        return 'union()'
+
+UNION_GROUP_SIZE = 8
+
+def union_all(parts, group_size=UNION_GROUP_SIZE):
+    """Union of many parts, as a balanced tree of unions that groups nearby parts
+    OpenSCAD unions the children of a union one after the other, so with a tree nearby parts are merged first,
+    and the tree is only log(n) deep. Parts are split at the median of their bounding box centers along the
+    widest axis, until at most group_size are left, these keep their original order.
+    Args:
+        parts: list of SuperSolid
+        group_size: maximum number of parts in one union, None for a single flat union
+    """
+    parts = list(parts)
+    if group_size is None or len(parts) <= group_size:
+        return Union()(parts)
+    centers = np.array([np.mean(part.get_bounds(), axis=0) for part in parts])
+    root = Union()
+    stack = [(root, np.arange(len(parts)))]
+    while stack:
+        node, index = stack.pop()
+        if len(index) <= group_size:
+            node(*[parts[k] for k in index])
+            continue
+        axis = np.ptp(centers[index], axis=0).argmax()
+        order = index[np.argsort(centers[index, axis], kind='stable')]
+        half = len(order) // 2
+        groups = (np.sort(order[:half]), np.sort(order[half:]))
+        children = (Union(), Union())
+        node(*children)
+        stack.extend(zip(children, groups))
+    return root
+
+class Intersection(SuperSolid):
+    __slots__ = ()
+    name = 'intersection'
+
+    combines_points = True
+
+    def combine_points(self, points):
+        """Points of the children clipped to the overlap of their bounding boxes, the intersection lies inside it"""
+        if not points or any(len(p) == 0 for p in points):
+            return np.zeros((0, 3))
+        lo = np.max([p.min(axis=0) for p in points], axis=0)
+        hi = np.min([p.max(axis=0) for p in points], axis=0)
+        if np.any(lo > hi):
+            return np.zeros((0, 3))
+        return np.clip(np.concatenate(points, axis=0), lo, hi)
+
+    def scad(self, fmt):
+        return 'intersection()'
+
+class Difference(SuperSolid):
+    __slots__ = ()
+    name = 'difference'
+
+    def point_children(self):
+        """The subtracted children never add to the shape, so only the first child counts"""
+        return self.children[:1]
+
+    def scad(self, fmt):
+        return 'difference()'
+
+class Hull(SuperSolid):
+    __slots__ = ()
+    name = 'hull'
+    combines_points = True
+
+    def combine_points(self, parts):
+        """Only the vertices of the convex hull of the children, interior points never matter to a hull"""
+        return hull_vertices(np.concatenate(parts, axis=0) if parts else np.zeros((0, 3)))
+
+    def scad(self, fmt):
+        return 'hull()'
+
+# below this qhull costs more than it saves: hull points are not cached, so every query pays for qhull again.
+# The post to post hulls of the plate web have 32 points, reducing them too makes get_bounds of the models slower.
+HULL_MIN_POINTS = 64
+
+def hull_vertices(points):
+    """The points that are vertices of their convex hull, all unique points if they do not span a volume
+    Small point sets are returned as they are.
+    """
+    if len(points) < HULL_MIN_POINTS:
+        return points
+    from scipy.spatial import ConvexHull, QhullError
+    try:
+        return points[ConvexHull(points).vertices]
+    except QhullError:  # flat or degenerate, no points can be dropped safely
+        return np.unique(points, axis=0)
 
 def rotation_matrix(axis, theta):
     axis = axis / np.linalg.norm(axis)
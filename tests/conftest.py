@@ -0,0 +1,44 @@
+import argparse
+import os
+import shutil
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture
+def keyboard(monkeypatch):
+    """Keyboard with the default configuration, configs are loaded relative to the repository"""
+    monkeypatch.chdir(ROOT)
+    return make_keyboard()
+
+
+@pytest.fixture
+def build_dir(tmp_path, monkeypatch):
+    """Empty working directory with a copy of the configs, for tests that write outputs"""
+    shutil.copytree(os.path.join(ROOT, 'config'), tmp_path / 'config')
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def make_keyboard(*argv):
+    """Keyboard from command line arguments, configs are loaded from the working directory"""
+    from main import Keyboard
+    parser = argparse.ArgumentParser()
+    Keyboard.add_args(parser)
+    return Keyboard(parser.parse_args(list(argv)))
+
+
+BOX_QUADS = [(0, 1, 3, 2), (4, 6, 7, 5), (0, 4, 5, 1), (2, 3, 7, 6), (0, 2, 6, 4), (1, 5, 7, 3)]
+
+
+def box_mesh(lo, hi):
+    """Closed box mesh, two triangles per side, counter clockwise seen from outside"""
+    import numpy as np
+    from mesh import Mesh
+    lo, hi = np.asarray(lo, dtype=float), np.asarray(hi, dtype=float)
+    corners = np.array([[x, y, z] for x in (lo[0], hi[0]) for y in (lo[1], hi[1]) for z in (lo[2], hi[2])])
+    return Mesh(np.array([corners[list(t)] for a, b, c, d in BOX_QUADS for t in ((a, b, c), (a, c, d))]))
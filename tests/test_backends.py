@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+from scipy.spatial import ConvexHull
+
+from backends import NumpyBackend, OpenSCADBackend, get_backends, lower, prepare, select_backend
+from super_solid import Cube, Difference, Hull, Polyhedron, Rotate, Sphere, Translate, Union
+
+
+def hull_of_cubes():
+    return Hull()(Cube(1.), Translate([3., 0., 0.])(Cube(1.)),
+                  Translate([1., 2., 1.])(Rotate(30., [0., 0., 1.])(Cube([1., 2., 1.]))))
+
+
+def test_hull_mesh_matches_qhull():
+    node = hull_of_cubes()
+    result = NumpyBackend().to_mesh(node)
+    hull = ConvexHull(node.get_points())
+    assert result.volume() == pytest.approx(hull.volume)
+    assert result.area() == pytest.approx(hull.area)
+    lo, hi = result.get_bounds()
+    np.testing.assert_allclose(lo, hull.min_bound)
+    np.testing.assert_allclose(hi, hull.max_bound)
+
+
+def test_box_hull_volume():
+    assert NumpyBackend().to_mesh(Hull()(Cube(1.), Translate([3., 0., 0.])(Cube(1.)))).volume() == pytest.approx(4.)
+
+
+def test_transforms_above_a_hull():
+    node = Translate([5., 0., 0.])(Rotate(90., [0., 0., 1.])(hull_of_cubes()))
+    backend = NumpyBackend()
+    assert backend.supports(node)
+    assert backend.to_mesh(node).volume() == pytest.approx(ConvexHull(hull_of_cubes().get_points()).volume)
+    np.testing.assert_allclose(backend.to_mesh(node).get_bounds(), node.get_bounds())
+
+
+def test_support():
+    backend = NumpyBackend()
+    assert backend.supports(Sphere(2.))
+    assert backend.supports(Hull()(Union()(Cube(1.), Sphere(1.))))
+    assert not backend.supports(Union()(Cube(1.), Sphere(1.)))  # a union of overlapping parts is no single mesh
+    assert not backend.supports(Hull()(Difference()(Cube(2.), Sphere(1.))))
+
+
+def test_booleans_go_to_openscad(keyboard):
+    keyhole = keyboard.single_keyhole()
+    assert any(isinstance(node, Difference) for node in keyhole.walk())
+    backends = get_backends('auto')
+    assert select_backend(keyhole, backends).name == 'openscad'
+    backend, lowered = prepare(keyhole, backends)
+    assert backend.name == 'openscad'
+    assert lowered is keyhole  # the keyhole has no hulls the numpy backend could take over
+
+
+def test_lower_keeps_differences_and_replaces_hulls():
+    inner = Hull()(Difference()(Cube(2.), Sphere(1.)), Translate([4., 0., 0.])(Cube(1.)))
+    plain = hull_of_cubes()
+    shared = Translate([0., 10., 0.])(plain)
+    root = Difference()(Union()(shared, inner, Translate([0., 20., 0.])(plain)), Sphere(3.))
+    lowered = lower(root, NumpyBackend())
+    assert lowered is not root
+    union = lowered.children[0]
+    assert isinstance(union.children[0].children[0], Polyhedron)
+    assert union.children[0].children[0] is union.children[2].children[0]  # shared hulls stay shared
+    assert union.children[1] is inner
+    assert lowered.children[1] is root.children[1]
+    assert isinstance(lowered, Difference)
+
+
+def test_get_backends():
+    assert [b.name for b in get_backends('auto')] == ['numpy', 'openscad']
+    assert isinstance(get_backends('openscad')[0], OpenSCADBackend)
+    with pytest.raises(ValueError, match='cgal'):
+        get_backends('cgal')
+    with pytest.raises(ValueError):
+        select_backend(Union()(Cube(1.), Sphere(1.)), get_backends('numpy'))
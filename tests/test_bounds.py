@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from super_solid import Cube, Difference, Intersection, Rotate, Sphere, Translate, Union
+
+
+def test_difference_is_bounded_by_its_first_child():
+    node = Difference()(Cube(2.), Translate([1., 1., 1.])(Cube(1000., center=True)), Sphere(50.))
+    np.testing.assert_allclose(node.get_bounds(), [[0., 0., 0.], [2., 2., 2.]])
+    assert len(node.get_points()) == 8
+
+
+def test_intersection_is_bounded_by_the_overlap():
+    node = Intersection()(Cube(4.), Translate([2., 1., -10.])(Cube([10., 10., 11.])))
+    np.testing.assert_allclose(node.get_bounds(), [[2., 1., 0.], [4., 4., 1.]])
+    moved = Translate([0., 0., 5.])(Rotate(90., [0., 0., 1.])(node))
+    np.testing.assert_allclose(moved.get_bounds(), [[-4., 2., 5.], [-1., 4., 6.]], atol=1e-12)
+
+
+def test_disjoint_intersection_has_no_points():
+    node = Intersection()(Cube(1.), Translate([5., 0., 0.])(Cube(1.)))
+    assert node.get_points().shape == (0, 3)
+    union = Union()(node, Translate([0., 0., 3.])(Cube(1.)))
+    np.testing.assert_allclose(union.get_bounds(), [[0., 0., 3.], [1., 1., 4.]])
+
+
+@pytest.fixture
+def models(keyboard):
+    keyboard.make_models()
+    return keyboard
+
+
+def test_models_have_tight_bounds(models):
+    for model in (models.top_model, models.bottom_model):
+        lo, hi = model.get_bounds()
+        assert np.all(hi - lo < 300.)
+
+
+def test_cut_boxes_cover_the_model(models):
+    lo, hi = models.top_model.get_bounds()
+    split = models.get_case_split_z()
+    above = models.get_cut_box(lo, hi, split, above=True).get_bounds()
+    below = models.get_cut_box(lo, hi, split, above=False).get_bounds()
+    assert above[0][2] == pytest.approx(split)
+    assert below[1][2] == pytest.approx(split)
+    for box in (above, below):
+        assert np.all(box[0][:2] < lo[:2]) and np.all(box[1][:2] > hi[:2])
+    assert above[1][2] > hi[2] and below[0][2] < lo[2]
+    # the split does not need to lie within the model
+    assert models.get_cut_box(lo, hi, hi[2] + 5., above=True).get_bounds()[1][2] > hi[2] + 5.
+
+
+def test_bottom_plate_walls_stay_outside(models):
+    lo, hi = models.top_model.get_bounds()
+    margin = 3.
+    plate = models.get_cut_box(lo, hi, lo[2] + 1., above=False, margin=margin + 2., thickness=2.)
+    inner_lo, inner_hi = plate.inner.get_bounds()
+    assert np.all(inner_lo[:2] >= lo[:2] - margin - 1e-9) and np.all(inner_hi[:2] <= hi[:2] + margin + 1e-9)
+    assert np.all(inner_lo[:2] < lo[:2]) and np.all(inner_hi[:2] > hi[:2])
+    assert plate.outer.get_bounds()[1][2] == pytest.approx(lo[2] + 1.)
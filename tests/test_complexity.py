@@ -0,0 +1,49 @@
+import pytest
+
+from complexity import analyze, check_budget, get_fragments, primitive_size
+from super_solid import Cube, Cylinder, Difference, Hull, ScadModule, Sphere, Translate, Union
+
+
+def test_primitive_sizes_match_their_points():
+    for node in (Cylinder(5., r=3., segments=20), Cylinder(5., r1=3., r2=0., segments=20), Sphere(4., segments=16)):
+        vertices, facets = primitive_size(node)
+        assert vertices == len(node.local_points())
+        assert facets == 2 * vertices - 4  # closed triangle meshes of genus 0
+    assert primitive_size(Cube(1.)) == (8, 12)
+
+
+def test_fragments():
+    assert get_fragments(0., 30) == 3
+    assert get_fragments(2., 1) == 3
+    assert get_fragments(2., 30) == 30
+
+
+def test_counts():
+    cube = Cube(1.)
+    tree = Union()(Difference()(cube, Translate([1., 0., 0.])(cube)), Hull()(cube, Translate([5., 0., 0.])(cube)))
+    stats = analyze(tree)
+    assert stats.nodes == 9  # the shared cube is counted at every place it is used
+    assert stats.primitives == 4
+    assert stats.booleans == 2
+    assert stats.hulls == 1
+    assert stats.depth == 4
+    assert stats.vertices == 32
+    assert stats.facets == 12 + 12 + 12 + 12
+    assert stats.cost > 0
+
+
+def test_modules_are_counted_per_use():
+    key = ScadModule('key')(Cube(1.))
+    stats = analyze(Union()(Translate([1., 0., 0.])(key), Translate([2., 0., 0.])(key)))
+    assert stats.primitives == 2
+    assert stats.facets == 24
+
+
+def test_budget():
+    stats = analyze(Union()(Cube(1.), Cube(2.)))
+    check_budget(stats, {'max_nodes': 3, 'max_facets': None})
+    check_budget(stats, None)
+    with pytest.raises(RuntimeError, match='nodes 3 > 2'):
+        check_budget(stats, {'max_nodes': 2})
+    with pytest.raises(ValueError, match='max_volume'):
+        check_budget(stats, {'max_volume': 1.})
@@ -0,0 +1,67 @@
+import pickle
+
+import numpy as np
+import pytest
+
+import fit_cache
+from fit_cache import FitCache
+
+POINTS = np.arange(12.).reshape((4, 3))
+
+
+def centroid(points):
+    centroid.calls += 1
+    return points.mean(axis=0)
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    centroid.calls = 0
+    return str(tmp_path / 'fits')
+
+
+def test_results_are_stored_once(cache_dir):
+    cache = FitCache(centroid, directory=cache_dir)
+    np.testing.assert_allclose(cache(POINTS), [4.5, 5.5, 6.5])
+    cache(POINTS)
+    assert centroid.calls == 1
+    assert cache.dirty
+    cache.save()
+    assert not cache.dirty
+
+    cache = FitCache(centroid, directory=cache_dir)
+    cache(POINTS)
+    assert centroid.calls == 1
+    assert not cache.dirty
+
+
+def test_misses_are_not_written_before_save(cache_dir):
+    cache = FitCache(centroid, directory=cache_dir)
+    cache(POINTS)
+    assert FitCache(centroid, directory=cache_dir).entries == {}
+
+
+def test_other_code_version_is_dropped(cache_dir, monkeypatch):
+    cache = FitCache(centroid, directory=cache_dir)
+    cache(POINTS)
+    cache.save()
+    monkeypatch.setattr(fit_cache, 'code_version', lambda function: 'changed')
+    cache = FitCache(centroid, directory=cache_dir)
+    assert cache.entries == {}
+    cache(POINTS)
+    assert centroid.calls == 2
+
+
+@pytest.mark.parametrize('payload', [b'', b'\x80\x04\x95', b'not a pickle', pickle.dumps([1, 2, 3]),
+                                     pickle.dumps({'version': 'x'}), pickle.dumps({'entries': None})])
+def test_corrupt_file_gives_cold_cache(cache_dir, payload):
+    cache = FitCache(centroid, directory=cache_dir)
+    cache(POINTS)
+    cache.save()
+    with open(cache.path, 'wb') as f:
+        f.write(payload)
+    cache = FitCache(centroid, directory=cache_dir)
+    assert cache.entries == {}
+    np.testing.assert_allclose(cache(POINTS), [4.5, 5.5, 6.5])
+    cache.save()
+    assert FitCache(centroid, directory=cache_dir).entries.keys() == cache.entries.keys()
@@ -0,0 +1,32 @@
+import numpy as np
+
+import scad
+from conftest import make_keyboard
+from super_solid import Cube, Mirror, ScadModule, Translate
+
+
+def test_used_modules_are_only_called():
+    module = ScadModule('part')(Translate([1., 0., 0.])(ScadModule('inner')(Cube(1.))))
+    text = scad.render(Mirror([1., 0., 0.])(module), uses=[('part.scad', module)])
+    assert text == 'use <part.scad>\nmirror(v = [1, 0, 0]) {\n\tpart();\n}\n'
+
+
+def test_mirrored_halves_call_the_module_of_the_other_half(build_dir):
+    kb = make_keyboard('--both-halves')
+    written = kb.build()
+    assert 'things/model_mirrored.scad' in written
+    assert (build_dir / 'things' / 'model_mirrored.scad').read_text() == \
+        'use <model.scad>\nmirror(v = [1, 0, 0]) {\n\tmodel();\n}\n'
+    assert (build_dir / 'things' / 'bottom_model_mirrored.scad').read_text() == \
+        'use <bottom_model.scad>\nmirror(v = [1, 0, 0]) {\n\tbottom_model();\n}\n'
+    model = (build_dir / 'things' / 'model.scad').read_text().splitlines()
+    assert model[-1] == 'model();'
+    assert sum(line.startswith('module model()') for line in model) == 1
+
+    points = kb.top_model.get_points()
+    np.testing.assert_allclose(kb.mirrored_top_model.get_points(), points * [-1., 1., 1.])
+
+
+def test_one_half_is_written_without_module(build_dir):
+    make_keyboard().build()
+    assert not (build_dir / 'things' / 'model.scad').read_text().startswith('module model()')
@@ -0,0 +1,68 @@
+import numpy as np
+
+import scad
+from conftest import make_keyboard
+from hotswap_holder import get_hotswap_module
+from placement import transform_points
+from super_solid import Cube, MultMatrix, ScadModule
+
+SHAPE = Cube([3., 4., 5.], center=True)
+
+
+def test_key_matrices_match_transform_switch(keyboard):
+    matrices = keyboard.get_key_matrices()
+    positions = keyboard.get_key_positions()
+    assert matrices.shape == (len(positions), 4, 4)
+    for matrix, (i, j) in zip(matrices, positions):
+        expected = keyboard.transform_switch(SHAPE, i, j).get_points()
+        np.testing.assert_allclose(transform_points(matrix, SHAPE.get_points()), expected, atol=1e-9)
+
+
+def test_key_matrices_without_tenting(keyboard):
+    matrices = keyboard.get_key_matrices(tent_and_z_offset=False)
+    for matrix, (i, j) in zip(matrices, keyboard.get_key_positions()):
+        expected = keyboard.transform_switch(SHAPE, i, j, tent_and_z_offset=False).get_points()
+        np.testing.assert_allclose(transform_points(matrix, SHAPE.get_points()), expected, atol=1e-9)
+
+
+def test_holder_module_is_shared():
+    module = get_hotswap_module()
+    assert isinstance(module, ScadModule)
+    assert get_hotswap_module() is module
+    assert get_hotswap_module(keyswitch_width=14.) is not module
+    assert module.get_bounds()[1][2] <= 1e-9  # the holder hangs below the switch plate
+
+
+def test_one_holder_per_switch(keyboard):
+    keyboard.args.hotswap_holders = True
+    holders = keyboard.get_hotswap_holders()
+    matrices = keyboard.get_switch_matrices()
+    assert len(holders) == len(keyboard.get_key_positions()) + len(keyboard.thumb_matrices) == len(matrices)
+    module = get_hotswap_module(keyswitch_width=keyboard.args.keyswitch_width,
+                                keyswitch_height=keyboard.args.keyswitch_height)
+    for holder, matrix in zip(holders, matrices):
+        assert isinstance(holder, MultMatrix)
+        assert holder.children[0] is module
+        np.testing.assert_allclose(holder.matrix, matrix)
+
+    code = scad.render(MultMatrix(np.eye(4))(*holders))
+    assert code.count('module hotswap_holder()') == 1
+    assert code.count('hotswap_holder();') == len(holders)
+
+
+def test_placement_table_holders(keyboard):
+    assert 'holder' not in keyboard.get_placement_table()['kind']
+    keyboard.args.hotswap_holders = True
+    table = keyboard.get_placement_table()
+    np.testing.assert_allclose(table['matrix'][table['kind'] == 'holder'], keyboard.get_switch_matrices())
+
+
+def test_config_without_hotswap_holders(build_dir):
+    with open('config/dactyl.yaml') as f:
+        lines = [line for line in f if not line.startswith('hotswap_holders')]
+    with open('config/dactyl.yaml', 'w') as f:
+        f.writelines(lines)
+    keyboard = make_keyboard()
+    assert not hasattr(keyboard.args, 'hotswap_holders')
+    assert 'holder' not in keyboard.get_placement_table()['kind']
+    keyboard.make_models()
@@ -0,0 +1,39 @@
+import pytest
+
+from conftest import make_keyboard
+from utils import HullGrid
+
+
+def digests(parts):
+    return [part.digest() for part in parts]
+
+
+@pytest.fixture
+def grid(keyboard):
+    _, extent_min, extent_max = keyboard.get_key_separations()
+    return HullGrid(keyboard, extent_min, extent_max)
+
+
+def test_cells_do_not_depend_on_the_number_of_jobs(grid):
+    hulls, blocks = grid.get_cells()
+    assert len(blocks) == (grid.i2range - 1) * (grid.j2range - 1)
+    assert len(hulls) < len(blocks)  # no hulls over the key holes
+    for jobs in (2, 3):
+        parallel_hulls, parallel_blocks = grid.get_cells(jobs=jobs)
+        assert digests(parallel_hulls) == digests(hulls)
+        assert digests(parallel_blocks) == digests(blocks)
+
+
+def test_cells_share_their_posts(grid):
+    hulls, _ = grid.get_cells()
+    posts = {id(post) for hull in hulls for post in hull.children}
+    assert len(posts) < sum(len(hull.children) for hull in hulls)
+    assert len(posts) == len(grid.posts)
+
+
+def test_models_do_not_depend_on_the_number_of_jobs(keyboard):
+    keyboard.make_models()
+    parallel = make_keyboard('--hull-jobs', '2')
+    parallel.make_models()
+    assert parallel.top_model.digest() == keyboard.top_model.digest()
+    assert parallel.bottom_model.digest() == keyboard.bottom_model.digest()
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from layout import COLUMN_PARAMETERS, LayoutOptimizer
+from metrics import get_cap_tops
+
+
+def home_targets(kb, shift=(0., 0., 0.)):
+    tops = get_cap_tops(kb.get_key_matrices(), kb.cth)
+    positions = kb.get_key_positions()
+    return [{'row': i, 'col': j, 'point': list(tops[k] + shift)} for k, (i, j) in enumerate(positions) if i == 1]
+
+
+def test_current_layout_matches_the_keyboard(keyboard):
+    optimizer = LayoutOptimizer(keyboard, home_targets(keyboard), min_spacing=0.)
+    vector = optimizer.get_vector()
+    assert vector.shape == (sum(size for size, _ in COLUMN_PARAMETERS.values()) * keyboard.args.ncols,)
+    np.testing.assert_allclose(optimizer.get_key_matrices(vector)[0], keyboard.get_key_matrices(), atol=1e-9)
+    assert optimizer.evaluate(vector)[0] == pytest.approx(0., abs=1e-12)
+
+
+def test_batches_are_evaluated_per_layout(keyboard):
+    optimizer = LayoutOptimizer(keyboard, home_targets(keyboard), min_spacing=0.)
+    vector = optimizer.get_vector()
+    vectors = np.stack([vector, vector + 1., vector])
+    losses = optimizer.evaluate(vectors)
+    assert losses.shape == (3,)
+    assert losses[0] == losses[2] < losses[1]
+    assert optimizer.get_key_matrices(vectors).shape == (3, len(keyboard.get_key_positions()), 4, 4)
+
+
+def test_spacing_penalty(keyboard):
+    targets = home_targets(keyboard)
+    vector = LayoutOptimizer(keyboard, targets).get_vector()
+    loose = LayoutOptimizer(keyboard, targets, min_spacing=0.).evaluate(vector)[0]
+    tight = LayoutOptimizer(keyboard, targets, min_spacing=100.).evaluate(vector)[0]
+    assert loose < tight
+
+
+def test_optimize_reduces_the_loss(keyboard):
+    optimizer = LayoutOptimizer(keyboard, home_targets(keyboard, shift=(0., 4., -3.)))
+    start_loss = optimizer.evaluate(optimizer.get_vector())[0]
+    best, best_loss = optimizer.optimize(iterations=10, population=200)
+    assert best_loss < 0.5 * start_loss
+    assert optimizer.evaluate(best)[0] == pytest.approx(best_loss)
+    again, again_loss = optimizer.optimize(iterations=10, population=200)
+    np.testing.assert_array_equal(again, best)  # seeded, so runs are repeatable
+
+
+def test_to_config(keyboard):
+    optimizer = LayoutOptimizer(keyboard, home_targets(keyboard))
+    columns = optimizer.to_config(optimizer.get_vector())
+    assert list(columns) == [f'column_{j}' for j in range(keyboard.args.ncols)]
+    for j, column in enumerate(columns.values()):
+        assert column['nrows'] == keyboard.column_nrows[j]
+        assert column['angle'] == pytest.approx(keyboard.major_angle[j])
+        assert column['row_radius'] == pytest.approx(keyboard.minor_radii[j])
+        np.testing.assert_allclose(column['column_offset'], keyboard.column_offsets[j])
+        assert all(isinstance(x, float) for x in column['column_offset'])
+
+
+def test_unknown_target_raises(keyboard):
+    with pytest.raises(ValueError, match='not in the layout'):
+        LayoutOptimizer(keyboard, [{'row': 99, 'col': 0, 'point': [0., 0., 0.]}])
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+import lod
+from lod import get_lod, segments_for_radius, set_lod
+from super_solid import Cylinder, Sphere
+
+
+@pytest.fixture(autouse=True)
+def restore_lod():
+    policy = get_lod()
+    yield
+    set_lod(policy['mode'], tolerance=policy['tolerance'])
+
+
+def chord_error(r, n):
+    return r * (1 - np.cos(np.pi / n))
+
+
+@pytest.mark.parametrize('mode', list(lod.LOD_MODES))
+def test_segments_keep_the_chord_error_below_the_tolerance(mode):
+    set_lod(mode)
+    policy = get_lod()
+    for r in (0.5, 1., 2.5, 10., 40., 200.):
+        n = segments_for_radius(r)
+        assert policy['min_segments'] <= n <= policy['max_segments']
+        if policy['min_segments'] < n < policy['max_segments']:
+            # the fewest segments that meet the tolerance
+            assert chord_error(r, n) <= policy['tolerance'] + 1e-12
+            assert chord_error(r, n - 1) > policy['tolerance']
+
+
+def test_segments_are_clipped():
+    set_lod('final')
+    assert segments_for_radius(1e-3) == get_lod()['min_segments']
+    assert segments_for_radius(1e5) == get_lod()['max_segments']
+
+
+def test_tolerance_override():
+    set_lod('final', tolerance=0.05)
+    assert get_lod()['tolerance'] == 0.05
+    coarse = segments_for_radius(10.)
+    set_lod('final')
+    assert segments_for_radius(10.) > coarse
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError, match='draft'):
+        set_lod('preview')
+
+
+def test_primitives_follow_the_policy():
+    cylinder, sphere, fixed = Cylinder(2., r=5.), Sphere(5.), Cylinder(2., r=5., segments=10)
+    set_lod('draft')
+    draft = len(cylinder.local_points()), len(sphere.local_points()), len(fixed.local_points())
+    set_lod('final')
+    final = len(cylinder.local_points()), len(sphere.local_points()), len(fixed.local_points())
+    assert final[0] > draft[0] and final[1] > draft[1]
+    assert final[2] == draft[2] == 20
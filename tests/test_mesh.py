@@ -0,0 +1,85 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+import mesh
+import render
+from conftest import box_mesh
+
+
+def write_ascii_stl(path, vertices):
+    with open(path, 'w') as f:
+        f.write('solid test\n')
+        for triangle in vertices:
+            f.write('facet normal 0 0 0\nouter loop\n')
+            f.writelines(f'vertex {x} {y} {z}\n' for x, y, z in triangle)
+            f.write('endloop\nendfacet\n')
+        f.write('endsolid test\n')
+
+
+def test_box_volume_and_area():
+    box = box_mesh([0., 0., 0.], [1., 2., 3.])
+    assert box.volume() == pytest.approx(6.)
+    assert box.area() == pytest.approx(22.)
+
+
+def test_save_and_load_binary(tmp_path):
+    path = str(tmp_path / 'box.stl')
+    box = box_mesh([1., 2., 3.], [2., 4., 6.])
+    box.save(path)
+    assert mesh.is_binary_stl(path)
+    loaded = mesh.Mesh.load(path)
+    assert isinstance(loaded.vertices, np.memmap)
+    np.testing.assert_allclose(loaded.vertices, box.vertices)
+    assert loaded.volume() == pytest.approx(6.)
+
+
+def test_load_ascii(tmp_path):
+    path = str(tmp_path / 'box.stl')
+    box = box_mesh([0., 0., 0.], [1., 1., 1.])
+    write_ascii_stl(path, box.vertices)
+    assert not mesh.is_binary_stl(path)
+    np.testing.assert_allclose(mesh.Mesh.load(path).vertices, box.vertices)
+
+
+def test_mirror_keeps_volume_positive(tmp_path):
+    box = box_mesh([1., 0., 0.], [3., 1., 1.])
+    for v in ((1., 0., 0.), (0., 1., 0.), (1., 1., 1.)):
+        mirrored = box.mirror(v)
+        assert mirrored.volume() == pytest.approx(box.volume())
+    lo, hi = box.mirror().get_bounds()
+    np.testing.assert_allclose(lo, [-3., 0., 0.])
+    np.testing.assert_allclose(hi, [-1., 1., 1.])
+
+    path, mirrored_path = str(tmp_path / 'box.stl'), str(tmp_path / 'mirrored.stl')
+    box.save(path)
+    mesh.mirror_stl(path, mirrored_path)
+    assert mesh.Mesh.load(mirrored_path).volume() == pytest.approx(box.volume())
+
+
+FAKE_OPENSCAD = """#!{python}
+# writes the ascii STL of a unit cube, like OpenSCAD versions without binary export
+import sys
+sys.path.insert(0, {root!r})
+from conftest import box_mesh
+from test_mesh import write_ascii_stl
+with open({log!r}, 'w') as f:
+    f.write(' '.join(sys.argv[1:]))
+write_ascii_stl(sys.argv[sys.argv.index('-o') + 1], box_mesh([0., 0., 0.], [1., 1., 1.]).vertices)
+"""
+
+
+def test_rendered_parts_are_memory_mapped(tmp_path):
+    log = str(tmp_path / 'args.txt')
+    openscad = tmp_path / 'openscad'
+    openscad.write_text(FAKE_OPENSCAD.format(python=sys.executable, root=os.path.dirname(__file__), log=log))
+    openscad.chmod(0o755)
+    stl = str(tmp_path / 'part.stl')
+    render.render_stl(str(tmp_path / 'part.scad'), stl, openscad=str(openscad))
+    assert open(log).read().split()[:2] == ['--export-format', 'binstl']
+    assert mesh.is_binary_stl(stl)
+    loaded = mesh.Mesh.load(stl)
+    assert isinstance(loaded.vertices, np.memmap)
+    assert loaded.volume() == pytest.approx(1.)
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from conftest import make_keyboard
+from metrics import batch_metrics, get_cap_tops, get_home_keys, get_metrics, get_neighbour_pairs
+from placement import affine_matrices
+
+# two columns of three keys and a short third column, 20 mm apart
+POSITIONS = [(0, 0), (1, 0), (2, 0), (0, 1), (1, 1), (2, 1), (0, 2)]
+
+
+def flat_grid(spacing=20., z=5.):
+    return affine_matrices(offsets=np.array([[spacing * j, -spacing * i, z] for i, j in POSITIONS]))
+
+
+def test_neighbour_pairs():
+    row_pairs, column_pairs = get_neighbour_pairs(POSITIONS)
+    np.testing.assert_array_equal(row_pairs, [[0, 1], [1, 2], [3, 4], [4, 5]])
+    np.testing.assert_array_equal(column_pairs, [[0, 3], [1, 4], [2, 5], [3, 6]])
+    assert get_neighbour_pairs([(0, 0)])[0].shape == (0, 2)
+
+
+def test_home_keys_of_short_columns():
+    np.testing.assert_array_equal(get_home_keys(POSITIONS), [1, 4, 6])
+    np.testing.assert_array_equal(get_home_keys(POSITIONS, home_row=0), [0, 3, 6])
+
+
+def test_cap_tops_follow_the_key_normal():
+    tilted = affine_matrices(linear=np.array([[1., 0., 0.], [0., 0., -1.], [0., 1., 0.]]), offsets=np.array([1., 2., 3.]))
+    np.testing.assert_allclose(get_cap_tops(tilted[None], 10.), [[1., -8., 3.]])
+
+
+def test_metrics_of_a_flat_grid():
+    metrics = get_metrics(flat_grid(), affine_matrices(offsets=np.array([[0., -50., 5.]])), POSITIONS,
+                          cth=2., keyhole_size=[18., 18.])
+    np.testing.assert_allclose(metrics['cap_top_heights'], 7.)
+    np.testing.assert_allclose(metrics['row_travel'], 20.)
+    np.testing.assert_allclose(metrics['column_travel'], 20.)
+    np.testing.assert_allclose(metrics['column_stagger'], [0., 20.])  # the short column has its home key higher up
+    np.testing.assert_allclose(metrics['footprint'], [58., 18. + 50.])
+    assert metrics['footprint_area'] == pytest.approx(58. * 68.)
+    np.testing.assert_allclose(metrics['thumb_reach'], [30.])
+
+
+def test_batched_metrics_match_single_layouts():
+    grids = np.stack([flat_grid(), flat_grid(spacing=19.)])
+    thumbs = affine_matrices(offsets=np.array([[0., -50., 5.], [20., -50., 5.]]))
+    batched = get_metrics(grids, thumbs, POSITIONS, cth=np.array([2., 3.]), keyhole_size=[18., 18.])
+    for k, (grid, cth) in enumerate(zip(grids, (2., 3.))):
+        single = get_metrics(grid, thumbs, POSITIONS, cth=cth, keyhole_size=[18., 18.])
+        for name, value in single.items():
+            np.testing.assert_allclose(batched[name][k], value, err_msg=name)
+
+
+def test_batch_metrics_of_keyboards(keyboard):
+    other = make_keyboard()
+    other.cth += 1.
+    metrics = batch_metrics([keyboard, other])
+    n_keys = len(keyboard.get_key_positions())
+    assert metrics['cap_tops'].shape == (2, n_keys, 3)
+    assert metrics['thumb_reach'].shape == (2, len(keyboard.thumb_matrices))
+    assert metrics['footprint_area'].shape == (2,)
+    single = keyboard.get_metrics()
+    for name, value in single.items():
+        np.testing.assert_allclose(metrics[name][0], value, err_msg=name)
+
+
+def test_batch_metrics_need_the_same_keys(keyboard):
+    other = make_keyboard()
+    other.column_nrows[0] -= 1
+    with pytest.raises(ValueError, match='batch them separately'):
+        batch_metrics([keyboard, other])
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from main import DEFAULT_THUMBS
+from placement import transform_points
+from super_solid import Cube, MultMatrix, Translate
+from utils import rotate_around_origin
+
+SHAPE = Cube([3., 4., 5.], center=True)
+
+
+def test_thumb_matrices_match_rotation_chain(keyboard):
+    """The thumbs were placed with rotations around x, y and z, then two translations"""
+    origin = keyboard.get_thumb_origin()
+    assert len(keyboard.thumb_matrices) == len(keyboard.args.thumbs)
+    for matrix, thumb in zip(keyboard.thumb_matrices, keyboard.args.thumbs):
+        shape = SHAPE
+        for angle, axis in zip(thumb['rotation'], np.eye(3)):
+            shape = rotate_around_origin(shape, [0., 0., 0.], angle, axis)
+        shape = Translate(thumb['offset'])(Translate(origin)(shape))
+        np.testing.assert_allclose(transform_points(matrix, SHAPE.get_points()), shape.get_points(), atol=1e-9)
+
+
+def test_thumb_points_are_placed_in_one_batch(keyboard):
+    points = keyboard.get_thumb_points(SHAPE).reshape((len(keyboard.thumb_matrices), -1, 3))
+    for matrix, thumb_points in zip(keyboard.thumb_matrices, points):
+        np.testing.assert_allclose(thumb_points, MultMatrix(matrix)(SHAPE).get_points())
+
+
+def test_config_without_thumbs_uses_built_in_cluster(keyboard):
+    expected = keyboard.thumb_matrices
+    del keyboard.args.thumbs
+    del keyboard.args.thumb_origin
+    keyboard.args.n_thumbs = 3
+    keyboard.parse_thumbs()
+    assert keyboard.args.thumbs == DEFAULT_THUMBS[:3]
+    assert keyboard.args.n_thumbs == 3
+    np.testing.assert_allclose(keyboard.get_thumb_matrices(), expected[:3])
+
+
+def test_thumb_config_errors(keyboard):
+    del keyboard.args.thumbs
+    keyboard.args.n_thumbs = 7
+    with pytest.raises(ValueError, match='thumbs'):
+        keyboard.parse_thumbs()
+    keyboard.args.thumbs = DEFAULT_THUMBS
+    keyboard.args.n_thumbs = 4
+    with pytest.raises(ValueError, match='remove n_thumbs'):
+        keyboard.parse_thumbs()
@@ -0,0 +1,66 @@
+import json
+
+import numpy as np
+import pytest
+
+import super_solid
+from placement import write_placement_table
+
+COLUMNS = ['kind', 'index', 'row', 'col', 'matrix']
+
+
+@pytest.fixture
+def table(keyboard):
+    return keyboard.get_placement_table()
+
+
+def test_columns(keyboard, table):
+    assert list(table) == COLUMNS
+    n = len(table['kind'])
+    assert all(len(table[name]) == n for name in COLUMNS)
+    assert table['matrix'].shape == (n, 4, 4)
+    kinds = list(dict.fromkeys(table['kind']))
+    assert kinds == ['key', 'thumb', 'screw']
+    for kind in kinds:
+        np.testing.assert_array_equal(table['index'][table['kind'] == kind], np.arange(np.sum(table['kind'] == kind)))
+    keys = table['kind'] == 'key'
+    assert list(zip(table['row'][keys], table['col'][keys])) == keyboard.get_key_positions()
+    assert np.all(table['row'][~keys] == -1) and np.all(table['col'][~keys] == -1)
+
+
+def test_matrices_agree_with_the_placement(keyboard, table):
+    np.testing.assert_allclose(table['matrix'][table['kind'] == 'key'], keyboard.get_key_matrices())
+    np.testing.assert_allclose(table['matrix'][table['kind'] == 'thumb'], keyboard.thumb_matrices)
+    screws = table['matrix'][table['kind'] == 'screw']
+    np.testing.assert_allclose(screws[:, :3, :3], np.broadcast_to(np.eye(3), (len(screws), 3, 3)))
+    for matrix, post in zip(screws, keyboard.get_screw_inserts(keyboard.get_screw_corners(), keyboard.get_case_split_z())):
+        lo, hi = post.get_bounds()
+        np.testing.assert_allclose(matrix[:2, 3], (lo[:2] + hi[:2]) / 2, atol=1e-9)
+        assert matrix[2, 3] == pytest.approx(lo[2])
+
+
+def test_no_csg_is_built(keyboard, monkeypatch):
+    keyboard.get_placement_table()  # the thumbs and screw corners are fitted once per keyboard
+
+    def fail(*args, **kwargs):
+        raise AssertionError('a SuperSolid was built')
+    monkeypatch.setattr(super_solid.SuperSolid, '__init__', fail)
+    keyboard.get_placement_table()
+
+
+def test_write_npz_and_json(tmp_path, table):
+    write_placement_table(str(tmp_path / 'placement.npz'), table)
+    stored = np.load(str(tmp_path / 'placement.npz'))
+    for name in COLUMNS:
+        np.testing.assert_array_equal(stored[name], table[name])
+
+    write_placement_table(str(tmp_path / 'placement.json'), table)
+    with open(tmp_path / 'placement.json') as f:
+        records = json.load(f)
+    assert len(records) == len(table['kind'])
+    assert records[0]['kind'] == 'key' and records[0]['row'] == table['row'][0]
+    assert records[-1]['kind'] == 'screw' and records[-1]['row'] is None and records[-1]['col'] is None
+    np.testing.assert_allclose([record['matrix'] for record in records], table['matrix'])
+
+    with pytest.raises(ValueError, match='.npz or .json'):
+        write_placement_table(str(tmp_path / 'placement.csv'), table)
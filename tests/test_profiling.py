@@ -0,0 +1,68 @@
+import json
+import sys
+import tracemalloc
+
+import pytest
+
+import profiling
+from profiling import NFRAMES, Profiler, format_size
+
+N_ITEMS = 5000
+
+
+@pytest.fixture
+def profiler():
+    profiler = Profiler(memory=True)
+    yield profiler
+    profiler.stop()
+
+
+def parse_items():
+    return json.loads(json.dumps([f'item {i}' for i in range(N_ITEMS)]))
+
+
+def test_disabled_profiler_records_nothing():
+    profiler = Profiler()
+    with profiler.stage('build'):
+        pass
+    assert profiler.stages == []
+
+
+def test_stages_are_timed():
+    profiler = Profiler(enabled=True)
+    with profiler.stage('first'):
+        pass
+    with profiler.stage('second'):
+        pass
+    assert [stage[0] for stage in profiler.stages] == ['first', 'second']
+    assert all(stage[1] >= 0. and stage[2] == {} and stage[3] is None for stage in profiler.stages)
+    assert profiler.report().splitlines()[-1].startswith('total')
+
+
+def test_allocations_are_counted_in_the_repository(profiler, monkeypatch):
+    monkeypatch.setattr(profiling, 'MODULES', profiling.MODULES + ('test_profiling',))
+    with profiler.stage('parse'):
+        kept = parse_items()  # the strings are allocated inside the json decoder
+    assert tracemalloc.get_traceback_limit() == NFRAMES
+    frame, size, count = profiler.top_allocators()[0]
+    assert frame.filename == __file__
+    assert count >= N_ITEMS
+    assert profiler.stages[0][2]['test_profiling'] >= size
+    assert 'test_profiling.py' in profiler.report()
+    del kept
+
+
+def test_imports_are_left_out(profiler, tmp_path, monkeypatch):
+    (tmp_path / 'big_module.py').write_text('ITEMS = [str(i) for i in range(%d)]\n' % N_ITEMS)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    with profiler.stage('import'):
+        import big_module  # noqa: F401
+    assert all(not frame.filename.startswith('<frozen') for frame, _, _ in profiler.top_allocators())
+    assert sum(profiler.stages[0][2].values()) < N_ITEMS * 10
+    del sys.modules['big_module']
+
+
+def test_format_size():
+    assert format_size(512) == '512 B'
+    assert format_size(2048) == '2 KB'
+    assert format_size(3 * 1024 ** 3) == '3.0 GB'
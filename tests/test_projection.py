@@ -0,0 +1,66 @@
+import re
+
+import numpy as np
+import pytest
+
+from placement import affine_matrices
+from projection import project_outlines, rectangle, write_dxf, write_projection, write_svg
+
+LAYERS = {'keyholes': np.array([[[0., 0.], [10., 0.], [10., 5.], [0., 5.]]]),
+          'cutouts': np.array([[[2., 1.], [8., 1.], [8., 4.], [2., 4.]]])}
+
+
+def test_rectangle_is_counter_clockwise():
+    corners = rectangle(4., 2.)
+    x, y = corners[:, 0], corners[:, 1]
+    assert 0.5 * np.sum(x * np.roll(y, -1) - np.roll(x, -1) * y) == pytest.approx(8.)
+    np.testing.assert_allclose(corners.mean(axis=0), 0.)
+
+
+def test_projection_of_placed_outlines():
+    matrices = affine_matrices(offsets=np.array([[1., 2., 3.], [-5., 0., 10.]]))
+    outlines = project_outlines(matrices, rectangle(2., 2.))
+    assert outlines.shape == (2, 4, 2)
+    np.testing.assert_allclose(outlines[1], rectangle(2., 2.)[:, :2] + [-5., 0.])
+
+    tilted = np.eye(4)
+    tilted[1:3, 1:3] = [[0., -1.], [1., 0.]]  # 90 degrees around x, the outline is seen edge on
+    np.testing.assert_allclose(project_outlines(tilted[None], rectangle(2., 2.))[0, :, 1], 0., atol=1e-12)
+
+
+def test_plate_outlines_follow_the_switches(keyboard):
+    layers = keyboard.get_plate_outlines()
+    n_switches = len(keyboard.get_switch_matrices())
+    assert layers['keyholes'].shape == layers['cutouts'].shape == (n_switches, 4, 2)
+    centers = keyboard.get_switch_matrices()[:, :2, 3]
+    np.testing.assert_allclose(layers['cutouts'].mean(axis=1), centers, atol=1e-9)
+
+
+def test_svg(tmp_path):
+    path = str(tmp_path / 'plate.svg')
+    write_svg(path, LAYERS, margin=1.)
+    with open(path) as f:
+        svg = f.read()
+    assert 'width="12.000mm" height="7.000mm"' in svg
+    assert re.findall(r'<g id="(\w+)"', svg) == ['keyholes', 'cutouts']
+    # y is flipped, the outlines keep their place within the margin
+    assert '<polygon points="1.0000,6.0000 11.0000,6.0000 11.0000,1.0000 1.0000,1.0000"/>' in svg
+
+
+def test_dxf(tmp_path):
+    path = str(tmp_path / 'plate.dxf')
+    write_dxf(path, LAYERS)
+    with open(path) as f:
+        lines = f.read().split('\n')
+    assert lines[:4] == ['0', 'SECTION', '2', 'ENTITIES']
+    assert lines[-3:] == ['0', 'EOF', '']
+    assert lines.count('POLYLINE') == 2
+    assert lines.count('VERTEX') == 8
+    assert lines.count('SEQEND') == 2
+
+
+def test_format_from_extension(tmp_path):
+    write_projection(str(tmp_path / 'plate.dxf'), LAYERS)
+    write_projection(str(tmp_path / 'plate.svg'), LAYERS)
+    with pytest.raises(ValueError, match='svg or .dxf'):
+        write_projection(str(tmp_path / 'plate.pdf'), LAYERS)
@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+
+import mesh
+from conftest import box_mesh
+from placement import box_corners, transform_points
+from render import get_bounds_tree, prune_to_box, stitch_partitions, write_partitions
+from super_solid import Cube, Difference, Hull, Intersection, Sphere, Translate, Union
+
+
+def grid_model():
+    """Cubes on a grid, with holes drilled in some and a hull and an intersection in the middle"""
+    parts = []
+    for x in range(5):
+        for y in range(4):
+            cube = Translate([10. * x, 10. * y, 0.])(Cube([6., 6., 6.]))
+            if (x + y) % 2:
+                cube = Difference()(cube, Translate([10. * x + 3., 10. * y + 3., 0.])(Sphere(2.)))
+            parts.append(cube)
+    parts.append(Hull()(Translate([20., 15., 10.])(Sphere(2.)), Translate([25., 15., 10.])(Sphere(2.))))
+    parts.append(Intersection()(Cube([50., 50., 50.]), Translate([12., 12., 0.])(Cube([4., 4., 20.]))))
+    return Union()(*parts)
+
+
+def leaf_points(model, lo, hi):
+    """The leaf points of a tree that lie in the box, as a set of rounded tuples"""
+    points = model.get_points()
+    inside = np.all((points >= lo) & (points <= hi), axis=1)
+    return set(map(tuple, np.round(points[inside], 9)))
+
+
+def test_prune_keeps_geometry_in_box():
+    model = grid_model()
+    bounds_tree = get_bounds_tree(model)
+    for lo, hi in [([-1., -1., -1.], [16., 16., 7.]), ([18., 8., -1.], [32., 22., 15.]), ([5., 5., 2.], [36., 26., 3.])]:
+        lo, hi = np.array(lo), np.array(hi)
+        pruned = prune_to_box(model, lo, hi, bounds_tree)
+        assert pruned is not None
+        assert leaf_points(pruned, lo, hi) == leaf_points(model, lo, hi)
+        assert len(list(pruned.walk())) < len(list(model.walk()))
+
+
+def test_prune_outside_is_empty():
+    assert prune_to_box(grid_model(), np.array([100., 100., 100.]), np.array([110., 110., 110.])) is None
+
+
+def test_prune_keeps_subtracted_parts_in_box():
+    hole = Translate([3., 3., 3.])(Sphere(2.))
+    far_hole = Translate([50., 3., 3.])(Sphere(2.))
+    model = Difference()(Cube([60., 6., 6.]), hole, far_hole)
+    pruned = prune_to_box(model, np.array([-1., -1., -1.]), np.array([10., 7., 7.]))
+    assert isinstance(pruned, Difference)
+    assert pruned.children[1] is hole
+    assert far_hole not in pruned.children
+
+
+def test_stitch_only_drops_shared_faces():
+    regions = [([0., 0., 0.], [2., 2., 2.]), ([2., 0., 0.], [4., 1., 2.]), ([2., 1., 0.], [4., 2., 2.])]
+    faces = mesh.shared_faces(regions)
+    assert [len(f) for f in faces] == [2, 2, 2]
+    parts = [(box_mesh(lo, hi), part_faces) for (lo, hi), part_faces in zip(regions, faces)]
+    stitched = mesh.Mesh(np.concatenate(list(mesh.stitch(parts))))
+    whole = box_mesh([0., 0., 0.], [4., 2., 2.])
+    assert stitched.volume() == pytest.approx(whole.volume())
+    assert stitched.area() == pytest.approx(whole.area())
+
+
+def test_stitch_partitions(tmp_path):
+    regions = [(np.array([0., 0., 0.]), np.array([1., 3., 1.])), (np.array([1., 0., 0.]), np.array([3., 3., 1.]))]
+    parts = []
+    for k, (lo, hi) in enumerate(regions):
+        stl = str(tmp_path / f'part_{k}.stl')
+        box_mesh(lo, hi).save(stl)
+        parts.append((None, stl, lo, hi))
+    stitch_partitions(parts, str(tmp_path / 'model.stl'))
+    stitched = mesh.Mesh.load(str(tmp_path / 'model.stl'))
+    assert len(stitched) == 2 * 12 - 4
+    assert stitched.volume() == pytest.approx(9.)
+
+
+def test_regions_follow_the_tented_columns(keyboard):
+    keyboard.make_models()
+    args = keyboard.args
+    kr = args.key_hole_rim_width
+    keyhole = box_corners([args.keyswitch_width + 2 * kr, args.keyswitch_height + 2 * kr, args.plate_thickness])
+    keyhole += np.array([0., 0., args.plate_thickness / 2])
+    points = transform_points(keyboard.get_key_matrices(), keyhole)
+    for model in (keyboard.top_model, keyboard.bottom_model):
+        regions = keyboard.get_render_regions(model)
+        assert len(regions) == args.ncols + 1
+        assert all(len(faces) > 0 for faces in mesh.shared_faces(list(regions.values())))
+        model_points = model.get_points()
+        inside = [np.all((model_points >= r_lo) & (model_points <= r_hi), axis=1) for r_lo, r_hi in regions.values()]
+        assert np.any(inside, axis=0).all()
+        for (i, j), key_points in zip(keyboard.get_key_positions(), points):
+            r_lo, r_hi = regions[f'column_{j}']
+            assert np.all(key_points[:, 0] > r_lo[0]) and np.all(key_points[:, 0] < r_hi[0])
+
+
+def test_write_partitions_skips_empty_regions(tmp_path):
+    from super_solid import Cube, Union
+    model = Union()(Cube([2., 2., 2.]), Cube([2., 2., 2.]).translate([4., 0., 0.]))
+    regions = {'left': ([-1., -1., -1.], [3., 3., 3.]), 'right': ([3., -1., -1.], [7., 3., 3.]),
+               'far': ([20., -1., -1.], [30., 3., 3.])}
+    parts = write_partitions(model, regions, str(tmp_path / 'model.stl'))
+    assert [part[0] for part in parts] == [str(tmp_path / 'partitions' / f'model_{name}.scad') for name in ('left', 'right')]
+    text = open(parts[0][0]).read()
+    assert text.startswith('intersection() {') and 'translate(v = [4, 0, 0])' not in text
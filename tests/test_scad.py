@@ -0,0 +1,72 @@
+import numpy as np
+
+import scad
+from super_solid import Cube, Cylinder, MultMatrix, Rotate, ScadModule, Sphere, Translate, Union
+
+FMT = scad.Formatter()
+
+
+def sample_tree(noise=0.):
+    key = ScadModule('key')(Cube([14., 14., 2.], center=True))
+    return Union()(
+        Translate([10. + noise, 0., 0.])(key),
+        Translate([-10., 0., noise])(Rotate(360. - noise, [0., 0., 1.])(key)),
+        Cylinder(5., r=2.),
+        Sphere(3.),
+    )
+
+
+def test_render_is_canonical():
+    assert scad.render(sample_tree()) == scad.render(sample_tree(noise=1e-9))
+
+
+def test_render_output():
+    lines = scad.render(sample_tree()).splitlines()
+    assert lines[:3] == ['module key() {', '\tcube(size = [14, 14, 2], center = true);', '}']
+    assert lines[3] == 'union() {'
+    assert lines[4:7] == ['\ttranslate(v = [10, 0, 0]) {', '\t\tkey();', '\t}']
+    assert lines[-1] == '}'
+    assert sum(line.strip() == 'key();' for line in lines) == 2
+
+
+def test_write_scad_round_trip(tmp_path):
+    path = tmp_path / 'model.scad'
+    tree = sample_tree()
+    tree.write_scad(str(path))
+    assert path.read_text() == scad.render(tree)
+    tree.write_scad(str(path))
+    assert path.read_text() == scad.render(sample_tree())
+
+
+def test_formatter_numbers():
+    assert FMT.number(1.00004) == '1'
+    assert FMT.number(-0.00001) == '0'
+    assert FMT.number(2.5) == '2.5'
+    assert FMT.value([1, 2.0, True]) == '[1, 2, true]'
+
+
+def test_identity_angles():
+    for angle in (0., 360., -720., 359.99999, -1e-9):
+        assert FMT.is_zero_angle(angle)
+        assert Rotate(angle, [0., 0., 1.]).scad(FMT) is None
+    for angle in (180., 0.001, -90.):
+        assert not FMT.is_zero_angle(angle)
+
+
+def test_identity_matrix_uses_formatted_values():
+    assert MultMatrix(np.eye(4)).scad(FMT) is None
+    shear = np.eye(4)
+    shear[0, 1] = 2e-5  # below the precision, but not below the finer one of the linear part
+    assert MultMatrix(shear).scad(FMT) is not None
+    shear[0, 1] = 2e-8
+    assert MultMatrix(shear).scad(FMT) is None
+
+
+def test_every_number_is_a_multiple_of_the_precision():
+    for precision in (1e-4, 0.25, 0.5, 2.5e-5, 10.):
+        fmt = scad.Formatter(precision)
+        for x in np.linspace(-3., 3., 241):
+            steps = float(fmt.number(x)) / precision
+            assert abs(steps - round(steps)) < 1e-6
+    assert scad.Formatter(0.25).number(0.75) == '0.75'
+    assert scad.Formatter(0.25).number(0.8) == '0.75'
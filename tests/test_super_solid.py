@@ -0,0 +1,145 @@
+import numpy as np
+import pytest
+
+import scad
+import super_solid
+from lod import get_lod, set_lod
+from super_solid import Cube, Cylinder, Hull, Intersection, Sphere, Translate, Union, hull_vertices, union_all, unit_circle, unit_sphere
+
+DEEP = 5000  # deeper than the recursion limit
+
+
+def leaves(tree):
+    return [node for node in tree.walk() if not node.children]
+
+
+def spheres(n):
+    rng = np.random.default_rng(0)
+    return [Translate(rng.uniform(-50., 50., 3))(Sphere(1.)) for _ in range(n)]
+
+
+def depth(tree):
+    deepest, stack = 0, [(tree, 1)]
+    while stack:
+        node, d = stack.pop()
+        deepest = max(deepest, d)
+        stack.extend((child, d + 1) for child in node.children)
+    return deepest
+
+
+def test_deep_trees_are_walked_without_recursion():
+    node = Cube(1.)
+    for _ in range(DEEP):
+        node = Union()(Translate([1., 0., 0.])(node))
+    lo, hi = node.get_bounds()
+    np.testing.assert_allclose(lo, [DEEP, 0., 0.])
+    np.testing.assert_allclose(hi, [DEEP + 1., 1., 1.])
+    assert len(list(node.walk())) == 2 * DEEP + 1
+    assert len(node.digest()) == 40
+    assert scad.render(node).count('translate') == DEEP
+
+
+def test_nested_hulls_and_intersections():
+    node = Cube(1.)
+    for i in range(2000):
+        node = Hull()(Translate([0.001, 0., 0.])(node)) if i % 2 else Intersection()(node, Cube(10.))
+    lo, hi = node.get_bounds()
+    np.testing.assert_allclose(lo, [1., 0., 0.])
+    np.testing.assert_allclose(hi, [2., 1., 1.])
+
+
+def test_cylinder_points():
+    points = Cylinder(4., r=2., segments=12).local_points()
+    assert points.shape == (24, 3)
+    np.testing.assert_allclose(np.linalg.norm(points[:, :2], axis=1), 2.)
+    np.testing.assert_allclose(points[0], [2., 0., 0.], atol=1e-12)  # OpenSCAD starts at angle 0
+    assert sorted(set(points[:, 2])) == [0., 4.]
+
+    cone = Cylinder(4., r1=3., r2=0., center=True, segments=12).local_points()
+    assert cone.shape == (13, 3)
+    np.testing.assert_allclose(cone[-1], [0., 0., 2.])
+    np.testing.assert_allclose(cone[:, 2].min(), -2.)
+
+
+def test_sphere_points():
+    points = Sphere(3., segments=10).local_points()
+    assert points.shape == (5 * 10, 3)
+    np.testing.assert_allclose(np.linalg.norm(points, axis=1), 3.)
+    # the rings sit between the poles, OpenSCAD has no vertex at the poles
+    assert np.abs(points[:, 2]).max() < 3.
+
+
+def test_unit_buffers_are_shared_and_read_only():
+    assert unit_circle(16) is unit_circle(16)
+    assert not unit_circle(16).flags.writeable
+    assert not unit_sphere(16).flags.writeable
+    points = Cylinder(1., r=5., segments=16).local_points()
+    points += 1.  # the points of a primitive are its own
+    np.testing.assert_allclose(np.linalg.norm(Cylinder(1., r=5., segments=16).local_points()[:, :2], axis=1), 5.)
+
+
+@pytest.mark.parametrize('n', [1, 8, 9, 50, 200])
+def test_union_all_has_the_leaves_of_a_flat_union(n):
+    parts = spheres(n)
+    tree = union_all(parts)
+    flat = Union()(parts)
+    assert sorted(map(id, leaves(tree))) == sorted(map(id, leaves(flat)))
+    np.testing.assert_allclose(tree.get_bounds(), flat.get_bounds())
+
+
+def test_union_all_groups_are_small_and_shallow():
+    tree = union_all(spheres(200), group_size=8)
+    for node in tree.walk():
+        if isinstance(node, Union):
+            assert len(node.children) <= 8
+    assert depth(tree) <= 2 * 6 + 2  # log2(200 / 8) levels of unions above the translated spheres
+    assert len(union_all(spheres(20), group_size=None).children) == 20
+
+
+def test_union_all_groups_nearby_parts():
+    parts = [Translate([x, 0., 0.])(Cube(1.)) for x in (0., 100., 1., 101., 2., 102.)]
+    tree = union_all(parts, group_size=3)
+    groups = [sorted(child.get_bounds()[0][0] for child in group.children) for group in tree.children]
+    assert sorted(groups) == [[0., 1., 2.], [100., 101., 102.]]
+
+
+def test_adding_to_a_union_extends_it():
+    parts = spheres(10)
+    total = sum(parts[1:], parts[0])
+    assert isinstance(total, Union)
+    assert len(total.children) == 10
+    assert depth(total) == 3
+
+
+
+def test_hull_vertices():
+    rng = np.random.default_rng(0)
+    corners = np.array([[x, y, z] for x in (0., 1.) for y in (0., 1.) for z in (0., 1.)])
+    points = np.concatenate([corners, rng.uniform(0.1, 0.9, (super_solid.HULL_MIN_POINTS, 3))])
+    assert sorted(map(tuple, hull_vertices(points))) == sorted(map(tuple, corners))
+    small = points[:super_solid.HULL_MIN_POINTS - 1]
+    assert hull_vertices(small) is small
+    flat = np.concatenate([rng.uniform(size=(super_solid.HULL_MIN_POINTS, 2)), np.zeros((super_solid.HULL_MIN_POINTS, 1))], axis=1)
+    assert len(hull_vertices(np.concatenate([flat, flat]))) == len(flat)  # no volume, only the duplicates are dropped
+
+
+def test_hull_points_follow_edits():
+    inner = Translate([0., 0., 0.])(Cube([1., 1., 1.]))
+    hull = Hull()(inner, Translate([5., 0., 0.])(Cube([1., 1., 1.])))
+    model = Union()(hull, Translate([0., 10., 0.])(hull))
+    assert model.get_bounds()[1][2] == pytest.approx(1.)
+    inner.add(Translate([0., 0., 9.])(Cube([1., 1., 1.])))
+    assert model.get_bounds()[1][2] == pytest.approx(10.)
+
+
+def test_hull_points_follow_lod():
+    hull = Hull()(Cylinder(1., r=10.), Translate([30., 0., 0.])(Cylinder(1., r=10.)))
+    policy = get_lod()
+    try:
+        set_lod('draft')
+        draft = len(hull.get_points())
+        set_lod('final')
+        fine = len(hull.get_points())
+    finally:
+        set_lod(policy['mode'], tolerance=policy['tolerance'])
+    assert fine > draft
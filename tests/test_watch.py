@@ -0,0 +1,76 @@
+import os
+
+import watch
+from conftest import make_keyboard
+from watch import PollingWatcher
+
+
+def touch(path, text, mtime_ns):
+    with open(path, 'w') as f:
+        f.write(text)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_watcher_reports_added_modified_and_removed_files(tmp_path):
+    a, b = str(tmp_path / 'a.yaml'), str(tmp_path / 'b.yaml')
+    touch(a, 'a: 1', 10 ** 18)
+    watcher = PollingWatcher(str(tmp_path / '*.yaml'))
+    assert watcher.changes() == []
+    touch(b, 'b: 1', 10 ** 18)
+    assert watcher.changes() == [b]
+    touch(a, 'a: 2', 2 * 10 ** 18)
+    assert watcher.changes() == [a]
+    os.remove(b)
+    assert watcher.changes() == [b]
+    assert watcher.changes() == []
+
+
+class FakeWatcher():
+    """Reports the changes of a list, then stops the watch loop like ctrl-c"""
+
+    def __init__(self, changes):
+        self.pending = list(changes)
+
+    def __call__(self, pattern, interval):
+        return self
+
+    def wait(self):
+        if not self.pending:
+            raise KeyboardInterrupt()
+        return self.pending.pop(0)
+
+
+class FakeKeyboard():
+
+    def __init__(self):
+        self.builds = 0
+
+    def reload(self):
+        if self.builds == 0:
+            self.builds += 1
+            raise ValueError('half edited config')
+
+    def build(self):
+        self.builds += 1
+        return ['things/model.scad']
+
+
+def test_watch_survives_failed_rebuilds(monkeypatch, capsys):
+    monkeypatch.setattr(watch, 'PollingWatcher', FakeWatcher([['config/a.yaml'], ['config/a.yaml']]))
+    kb = FakeKeyboard()
+    watch.watch(kb)
+    assert kb.builds == 2
+    captured = capsys.readouterr()
+    assert 'half edited config' in captured.err
+    assert 'wrote: things/model.scad' in captured.out
+
+
+def test_rebuild_only_writes_changed_outputs(build_dir):
+    kb = make_keyboard()
+    assert sorted(kb.build()) == ['things/bottom_model.scad', 'things/model.scad', 'things/plate.scad']
+    assert kb.build() == []
+
+    config = build_dir / 'config' / 'dactyl.yaml'
+    config.write_text(config.read_text().replace('screw_inset: 3.5', 'screw_inset: 4.5'))
+    kb.reload()
+    assert sorted(kb.build()) == ['things/bottom_model.scad', 'things/model.scad']  # the plate has no screws
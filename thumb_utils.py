@@ -4,10 +4,10 @@ from super_solid import Union, Difference, Intersection, Hull
 from super_solid import Translate, Mirror, Scale, Rotate
 from super_solid import rotation_matrix
 import numpy as np
-from scipy.optimize import minimize
 
 
 def fit_cone_to_points(points):
+    from scipy.optimize import minimize
 
     origin0 = [700., -1500., -700.]
     v0 = [-1., -0.5, 0.]
@@ -42,6 +42,7 @@ def fit_cone_to_points(points):
     return res.x
 
 def fit_oriented_box_to_extent(points):
+    from scipy.optimize import minimize
 
     x0 = 0.
     def opt_func(x, points):
@@ -67,7 +68,7 @@ def get_cone(origin, v, psi, phi):
     r2 = np.tan(phi) * z2
     return Cylinder((z2 - z1), r1=r1, r2=r2, center=False).translate([0., 0., z1]).rotate(psi * 180 / np.pi, v).translate(origin)
 
-def get_conical_shell(origin, v, psi, phi, thickness, segments=50):
+def get_conical_shell(origin, v, psi, phi, thickness, segments=None):
     z2 = 3000.
     r2 = np.tan(phi) * z2
     return ConicalShell(z2, r2, thickness, segments=segments).translate([0., 0., -z2]).rotate(180., [1., 0., 0.]).rotate(psi * 180 / np.pi, v).translate(origin)
@@ -81,8 +82,4 @@ def get_points_from_transform(kb):
 
     extent = Cube([kw + kr * 2, kh + kr * 2, pt], center=True).translate([0., 0., pt / 2])
 
-    points = []
-    for i in range(kb.args.n_thumbs):
-        points.append(kb.transform_thumb(extent, i).get_points())
-
-    return np.concatenate(points, axis=0)
+    return kb.get_thumb_points(extent)
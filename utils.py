@@ -1,29 +1,27 @@
-#!/usr/bin/env ipython
 from shell import BoxShell, RoundedBoxShell, TentedRoundedShell
 from super_solid import Cube, Cylinder, Sphere
-from super_solid import Union, Difference, Intersection, Hull
-from super_solid import Translate, Mirror, Scale, Rotate
-from super_solid import rotation_matrix
+from super_solid import Difference, Intersection, Hull
+from super_solid import Translate, Mirror, Scale, Rotate, PivotRotate
+from super_solid import rotation_matrix, union_all
 import numpy as np
 
 def rotate_around_origin(shape, origin, angle, axis):
-    shape = shape.translate([-v for v in origin]).rotate(angle, axis).translate(origin)
-    return shape
+    return PivotRotate(angle, axis, origin)(shape)
 
-def get_spherical_shell(outer_radius, thickness, segments=50):
+def get_spherical_shell(outer_radius, thickness, segments=None):
 
     shell = Difference()(Sphere(outer_radius, segments=segments), Sphere(outer_radius - thickness, segments=segments))
 
     return shell
 
 
-def get_cylindrical_shell(outer_radius, thickness, z, segments=50, center=True):
+def get_cylindrical_shell(outer_radius, thickness, z, segments=None, center=True):
 
     shell = Difference()(Cylinder(z, r=outer_radius, center=center, segments=segments), Cylinder(z * 1.1, r=outer_radius - thickness, center=center, segments=segments))
     return shell
 
 
-def half_cylindrical_shell(outer_radius, thickness, length, segments=50):
+def half_cylindrical_shell(outer_radius, thickness, length, segments=None):
     """Generate a cylinder shell, centered at the origin, with its axis along the x-axis, restricted to z < 0"""
 
     shell = Rotate(90, [0, 1, 0])(get_cylindrical_shell(outer_radius, thickness, length, segments=segments, center=True))
@@ -32,7 +30,7 @@ def half_cylindrical_shell(outer_radius, thickness, length, segments=50):
 
     return shell
 
-def half_cylinder(radius, length, segments=50):
+def half_cylinder(radius, length, segments=None):
     """Generate a cylinder shell, centered at the origin, with its axis along the x-axis, restricted to z < 0"""
     cyl = Cylinder(length, r=radius, center=center, segments=segments)
     shell = Rotate(90, [0, 1, 0])(cyl)
@@ -95,37 +93,53 @@ def get_y_wall_between_points(points0, points1, thickness, margin):
     return Translate(offset)(Cube(extent, center=True))
 
 
-def get_hulls(kb, extent_min, extent_max, interpolate_z=False):
-    orig_extent_max = extent_max
-    orig_extent_min = extent_min
-    space_max = np.array([3., 3., -5.])
-    space_min = np.array([3., 3., 0.])
-    extent_max = extent_max + space_max
-    extent_min = extent_min - space_min
-    d = 0.1
-    i2range = 2 * (max([kb.column_nrows[j] for j in range(kb.args.ncols)]) + 1)
-    j2range = 2 * (kb.args.ncols + 1)
-
-    def is_key(i2, j2):
+class HullGrid():
+    """The grid of posts around and between the key holes, hulled into the plate web and the outer blocks
+
+    Grid index (i2, j2) runs over the corners of the keys, with the ends of the grid at the case walls.
+    Every cell only depends on its indices, so rows of cells can be built in other processes.
+    """
+
+    def __init__(self, kb, extent_min, extent_max, interpolate_z=False):
+        self.kb = kb
+        self.orig_extent_max = extent_max
+        self.orig_extent_min = extent_min
+        self.space_max = np.array([3., 3., -5.])
+        self.space_min = np.array([3., 3., 0.])
+        self.extent_max = extent_max + self.space_max
+        self.extent_min = extent_min - self.space_min
+        self.interpolate_z = interpolate_z
+        self.d = 0.1
+        self.i2range = 2 * (max([kb.column_nrows[j] for j in range(kb.args.ncols)]) + 1)
+        self.j2range = 2 * (kb.args.ncols + 1)
+        self.posts = {}  # (i2, j2): post, posts are shared by up to four cells
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['posts'] = {}
+        return state
+
+    def is_key(self, i2, j2):
         # check if the grid square between i2,j2 and i2+1 and j2+1 is a key hole
         i, j = (i2 - 1) // 2, (j2 - 1) // 2
         rem_i, rem_j = (i2 - 1) % 2, (j2 - 1) % 2
         if rem_i != 0 or rem_j != 0:
             return False
-        if j >= 0 and j < kb.args.ncols and i >= 0 and i < kb.column_nrows[j]:
+        if j >= 0 and j < self.kb.args.ncols and i >= 0 and i < self.kb.column_nrows[j]:
             return True
         else:
             return False
 
-    def is_end(i2, j2):
-        return i2 == 0 or j2 == 0 or (i2 == (i2range - 1)) or (j2 == (j2range - 1))
+    def is_end(self, i2, j2):
+        return i2 == 0 or j2 == 0 or (i2 == (self.i2range - 1)) or (j2 == (self.j2range - 1))
 
-    def is_corner(i2, j2):
+    def is_corner(self, i2, j2):
+        i2range, j2range = self.i2range, self.j2range
         return ((i2 == 0) and (j2 == 0)) or ((i2 == (i2range - 1)) and (j2 == 0)) or ((i2 == 0) and (j2 == (j2range - 1))) or ((i2 == (i2range - 1)) and (j2 == (j2range - 1)))
 
-    def walk_to_nearest_key(i2, j2, di2=0, dj2=0):
+    def walk_to_nearest_key(self, i2, j2, di2=0, dj2=0):
         iterations = 0
-        while not (is_key(2 * ( (i2 - 1) // 2) + 1, 2 * ( (j2 - 1) // 2) + 1) or is_end(i2, j2)):
+        while not (self.is_key(2 * ( (i2 - 1) // 2) + 1, 2 * ( (j2 - 1) // 2) + 1) or self.is_end(i2, j2)):
             iterations += 1
             i2 += di2
             j2 += dj2
@@ -133,7 +147,8 @@ def get_hulls(kb, extent_min, extent_max, interpolate_z=False):
                 raise RuntimeError(f"You're walking the wrong way my friend: i2 {i2}, j2 {j2}, di2 {di2}, dj2: {dj2}")
         return i2, j2
 
-    def get_regular_post(i2, j2):
+    def get_regular_post(self, i2, j2):
+        kb, d = self.kb, self.d
         sx = kb.args.keyswitch_width / 2+ kb.args.key_hole_rim_width
         sy = kb.args.keyswitch_height / 2+ kb.args.key_hole_rim_width
         c = Cube([d, d, kb.args.plate_thickness], center=True)
@@ -146,146 +161,180 @@ def get_hulls(kb, extent_min, extent_max, interpolate_z=False):
         posts = {(0, 0) : tl, (0, 1) : tr, (1, 0): bl, (1, 1): br}
         return kb.transform_switch(posts[(rem_i, rem_j)], i, j, tent_and_z_offset=False)
 
-    def get_y_between_for_i(i2p1, j2p1,i2p2, j2p2, i2):
-        if is_end(i2p1, j2p1):
+    def get_y_between_for_i(self, i2p1, j2p1,i2p2, j2p2, i2):
+        extent_min, extent_max = self.extent_min, self.extent_max
+        if self.is_end(i2p1, j2p1):
             if j2p1 == 0:
                 y1 = extent_max[1]
             else:
                 y1 = extent_min[1]
         else:
-            y1 = get_regular_post(i2p1, j2p1).get_points().mean(axis=0)[1]
-        if is_end(i2p2, j2p2):
+            y1 = self.get_regular_post(i2p1, j2p1).get_points().mean(axis=0)[1]
+        if self.is_end(i2p2, j2p2):
             if j2p2 == 0:
                 y2 = extent_max[1]
             else:
                 y2 = extent_min[1]
         else:
-            y2 = get_regular_post(i2p2, j2p2).get_points().mean(axis=0)[1]
+            y2 = self.get_regular_post(i2p2, j2p2).get_points().mean(axis=0)[1]
 
         y = y1
         if not (i2p2 == i2p1):
             y = y + (y2 - y1) * (i2 - i2p1) / (i2p2 - i2p1)
         return y
 
-    def get_x_between_for_j(i2p1, j2p1,i2p2, j2p2, j2):
-        if is_end(i2p1, j2p1):
+    def get_x_between_for_j(self, i2p1, j2p1,i2p2, j2p2, j2):
+        extent_min, extent_max = self.extent_min, self.extent_max
+        if self.is_end(i2p1, j2p1):
             if i2p1 == 0:
                 x1 = extent_max[0]
             else:
                 x1 = extent_min[0]
         else:
-            x1 = get_regular_post(i2p1, j2p1).get_points().mean(axis=0)[0]
-        if is_end(i2p2, j2p2):
+            x1 = self.get_regular_post(i2p1, j2p1).get_points().mean(axis=0)[0]
+        if self.is_end(i2p2, j2p2):
             if i2p2 == 0:
                 x2 = extent_max[0]
             else:
                 x2 = extent_min[0]
         else:
-            x2 = get_regular_post(i2p2, j2p2).get_points().mean(axis=0)[0]
+            x2 = self.get_regular_post(i2p2, j2p2).get_points().mean(axis=0)[0]
 
         x = x1
         if not (j2p2 == j2p1):
             x = x + (x2 - x1) * (j2 - j2p1) / (j2p2 - j2p1)
         return x
 
-    def get_end_post(i2, j2):
-        if is_corner(i2, j2):
+    def get_end_post(self, i2, j2):
+        kb, extent_min, extent_max = self.kb, self.extent_min, self.extent_max
+        if self.is_corner(i2, j2):
             tr = [extent_min[0] * (1 - np.sign(j2)) + extent_max[0] * np.sign(j2), extent_max[1] * (1 - np.sign(i2)) + extent_min[1] * np.sign(i2), extent_max[2] - kb.args.case_thickness / 2]
         elif i2 == 0:
-            i2p1, j2p1 = walk_to_nearest_key(i2 + 1, j2, di2=-1)
-            i2p2, j2p2 = walk_to_nearest_key(i2 + 1, j2, di2=1)
-            x = get_x_between_for_j(i2p1, j2p1, i2p2, j2p2, j2)
+            i2p1, j2p1 = self.walk_to_nearest_key(i2 + 1, j2, di2=-1)
+            i2p2, j2p2 = self.walk_to_nearest_key(i2 + 1, j2, di2=1)
+            x = self.get_x_between_for_j(i2p1, j2p1, i2p2, j2p2, j2)
             tr = [x, extent_max[1], extent_max[2] - kb.args.case_thickness / 2]
         elif j2 == 0:
-            i2p1, j2p1 = walk_to_nearest_key(i2, j2 + 1, di2=-1)
-            i2p2, j2p2 = walk_to_nearest_key(i2, j2 + 1, di2=1)
-            y = get_y_between_for_i(i2p1, j2p1, i2p2, j2p2, i2)
+            i2p1, j2p1 = self.walk_to_nearest_key(i2, j2 + 1, di2=-1)
+            i2p2, j2p2 = self.walk_to_nearest_key(i2, j2 + 1, di2=1)
+            y = self.get_y_between_for_i(i2p1, j2p1, i2p2, j2p2, i2)
             tr = [extent_min[0], y, extent_max[2] - kb.args.case_thickness / 2]
-        elif i2 == (i2range - 1):
-            i2p1, j2p1 = walk_to_nearest_key(i2 - 1, j2, di2=-1)
-            i2p2, j2p2 = walk_to_nearest_key(i2 - 1, j2, di2=1)
-            x = get_x_between_for_j(i2p1, j2p1, i2p2, j2p2, j2)
+        elif i2 == (self.i2range - 1):
+            i2p1, j2p1 = self.walk_to_nearest_key(i2 - 1, j2, di2=-1)
+            i2p2, j2p2 = self.walk_to_nearest_key(i2 - 1, j2, di2=1)
+            x = self.get_x_between_for_j(i2p1, j2p1, i2p2, j2p2, j2)
             tr = [x, extent_min[1], extent_max[2] - kb.args.case_thickness / 2]
-        elif j2 == (j2range - 1):
-            i2p1, j2p1 = walk_to_nearest_key(i2, j2 - 1, di2=-1)
-            i2p2, j2p2 = walk_to_nearest_key(i2, j2 - 1, di2=1)
-            y = get_y_between_for_i(i2p1, j2p1, i2p2, j2p2, i2)
+        elif j2 == (self.j2range - 1):
+            i2p1, j2p1 = self.walk_to_nearest_key(i2, j2 - 1, di2=-1)
+            i2p2, j2p2 = self.walk_to_nearest_key(i2, j2 - 1, di2=1)
+            y = self.get_y_between_for_i(i2p1, j2p1, i2p2, j2p2, i2)
             tr = [extent_max[0], y, extent_max[2] - kb.args.case_thickness / 2]
-        return Cube([d, d, kb.args.case_thickness], center=True).translate(tr)
+        return Cube([self.d, self.d, kb.args.case_thickness], center=True).translate(tr)
 
-    def get_regular_or_end_post(i2, j2):
-        if is_key(2 * ( (i2 - 1) // 2) + 1, 2 * ( (j2 - 1) // 2) + 1):
-            return get_regular_post(i2, j2)
-        elif is_end(i2, j2):
-            return get_end_post(i2, j2)
+    def get_regular_or_end_post(self, i2, j2):
+        if self.is_key(2 * ( (i2 - 1) // 2) + 1, 2 * ( (j2 - 1) // 2) + 1):
+            return self.get_regular_post(i2, j2)
+        elif self.is_end(i2, j2):
+            return self.get_end_post(i2, j2)
         else:
             raise RuntimeError('something went wrong')
 
-    def get_interpolate(i2, j2):
-        i2p1, _ = walk_to_nearest_key(i2, j2, di2=-1)
-        i2p2, _ = walk_to_nearest_key(i2, j2, di2=1)
-        _, j2p1 = walk_to_nearest_key(i2, j2, dj2=-1)
-        _, j2p2 = walk_to_nearest_key(i2, j2, dj2=1)
+    def get_interpolate(self, i2, j2):
+        i2p1, _ = self.walk_to_nearest_key(i2, j2, di2=-1)
+        i2p2, _ = self.walk_to_nearest_key(i2, j2, di2=1)
+        _, j2p1 = self.walk_to_nearest_key(i2, j2, dj2=-1)
+        _, j2p2 = self.walk_to_nearest_key(i2, j2, dj2=1)
 
-        pos_ip1 = get_regular_or_end_post(i2p1, j2).get_points().mean(axis=0)
-        pos_ip2 = get_regular_or_end_post(i2p2, j2).get_points().mean(axis=0)
-        pos_jp1 = get_regular_or_end_post(i2, j2p1).get_points().mean(axis=0)
-        pos_jp2 = get_regular_or_end_post(i2, j2p2).get_points().mean(axis=0)
+        pos_ip1 = self.get_regular_or_end_post(i2p1, j2).get_points().mean(axis=0)
+        pos_ip2 = self.get_regular_or_end_post(i2p2, j2).get_points().mean(axis=0)
+        pos_jp1 = self.get_regular_or_end_post(i2, j2p1).get_points().mean(axis=0)
+        pos_jp2 = self.get_regular_or_end_post(i2, j2p2).get_points().mean(axis=0)
         y = pos_ip1[1] + ((i2 - i2p1) / (i2p2 - i2p1) * (pos_ip2[1] - pos_ip1[1]))
         x = pos_jp1[0] + ((j2 - j2p1) / (j2p2 - j2p1) * (pos_jp2[0] - pos_jp1[0]))
-        if interpolate_z:
+        if self.interpolate_z:
             z = 0.5 * (pos_jp1[2] + ((j2 - j2p1) / (j2p2 - j2p1) * (pos_jp2[2] - pos_jp1[2])) + pos_ip1[2] + ((i2 - i2p1) / (i2p2 - i2p1) * (pos_ip2[2] - pos_ip1[2])))
         else:
-            z = extent_max[2]
-        return Cube([d, d, kb.args.plate_thickness], center=True).translate([x, y, z])
-
-    def get_post(i2, j2):
-        if is_key(2 * ( (i2 - 1) // 2) + 1, 2 * ( (j2 - 1) // 2) + 1):
-            return get_regular_post(i2, j2)
-            # return Cube([d, d, kb.args.plate_thickness], center=True).translate(extent_max)
-        elif is_end(i2, j2):
-            return get_end_post(i2, j2)
-            # return Cube([d, d, kb.args.plate_thickness], center=True).translate(extent_max)
+            z = self.extent_max[2]
+        return Cube([self.d, self.d, self.kb.args.plate_thickness], center=True).translate([x, y, z])
+
+    def get_post(self, i2, j2):
+        if (i2, j2) in self.posts:
+            return self.posts[(i2, j2)]
+        if self.is_key(2 * ( (i2 - 1) // 2) + 1, 2 * ( (j2 - 1) // 2) + 1):
+            post = self.get_regular_post(i2, j2)
+        elif self.is_end(i2, j2):
+            post = self.get_end_post(i2, j2)
         else:
-            # return Cube([d, d, kb.args.plate_thickness], center=True).translate(extent_max)
-            return get_interpolate(i2, j2)
-
-    def get_hull(i2, j2, i2p1, j2p1):
-        return Hull()(get_post(i2,j2), get_post(i2,j2p1), get_post(i2p1,j2), get_post(i2p1, j2p1))
-
-    def get_block(i2, j2, i2p1, j2p1, at_z):
-        p1 = get_post(i2,j2)
-        p2 = get_post(i2,j2p1)
-        p3 = get_post(i2p1,j2)
-        p4 = get_post(i2p1,j2p1)
-        pts = [Cube([d, d, kb.args.plate_thickness], center=True).translate([*p.get_points().mean(axis=0)[0:2], at_z]) for p in [p1, p2, p3, p4]]
+            post = self.get_interpolate(i2, j2)
+        self.posts[(i2, j2)] = post
+        return post
+
+    def get_hull(self, i2, j2, i2p1, j2p1):
+        return Hull()(self.get_post(i2,j2), self.get_post(i2,j2p1), self.get_post(i2p1,j2), self.get_post(i2p1, j2p1))
+
+    def get_block(self, i2, j2, i2p1, j2p1, at_z):
+        d = self.d
+        p1 = self.get_post(i2,j2)
+        p2 = self.get_post(i2,j2p1)
+        p3 = self.get_post(i2p1,j2)
+        p4 = self.get_post(i2p1,j2p1)
+        pts = [Cube([d, d, self.kb.args.plate_thickness], center=True).translate([*p.get_points().mean(axis=0)[0:2], at_z]) for p in [p1, p2, p3, p4]]
         pts = pts + [p1, p2, p3, p4]
         return Hull()(*pts)
 
-    hulls = []
-    for i2 in range(i2range - 1):
-        for j2 in range(j2range - 1):
-            if not is_key(i2, j2):
-                # hulls.append(get_post(i2, j2))
-                hulls.append(get_hull(i2, j2, i2+1, j2+1))
-
-    z_max = get_post(0,0).get_points().max(axis=0)[2]
-    for i2 in range(i2range - 1):
-        for j2 in range(j2range - 1):
-            z = get_post(0,0).get_points().max(axis=0)[2]
-            if z > z_max:
-                z_max = z
-
-    outer = []
-    for i2 in range(i2range - 1):
-        for j2 in range(j2range - 1):
-            outer.append(get_block(i2, j2, i2+1, j2+1, z_max + 20.))
-
-    hulls = Union()(hulls)
-    outer = Union()(outer)
-    xy_space = (np.array([*kb.args.grid_xy_space, 0]) - space_max) * np.array([1., 1., 0.])
-    box_extent_max = extent_max + xy_space
-    box_extent_min = extent_min - xy_space
+    def get_case_box(self):
+        """Extent of the rounded case around the grid, before tenting
+        Returns:
+            (box_extent_min, box_extent_max)
+        """
+        xy_space = (np.array([*self.kb.args.grid_xy_space, 0]) - self.space_max) * np.array([1., 1., 0.])
+        return self.extent_min - xy_space, self.extent_max + xy_space
+
+    def get_rows(self, rows, at_z):
+        """The hulls and blocks of the cells in some rows of the grid
+        Args:
+            rows: the i2 indices of the rows
+            at_z: height of the top of the blocks
+        Returns:
+            (hulls, blocks), lists in row order
+        """
+        hulls = []
+        blocks = []
+        for i2 in rows:
+            for j2 in range(self.j2range - 1):
+                if not self.is_key(i2, j2):
+                    hulls.append(self.get_hull(i2, j2, i2+1, j2+1))
+                blocks.append(self.get_block(i2, j2, i2+1, j2+1, at_z))
+        return hulls, blocks
+
+    def get_cells(self, jobs=1):
+        """The hulls and blocks of all cells, with rows built in a process pool when jobs > 1
+        The results are merged in row order, so they do not depend on the number of jobs.
+        """
+        at_z = self.get_post(0,0).get_points().max(axis=0)[2] + 20.
+        rows = list(range(self.i2range - 1))
+        if jobs <= 1:
+            return self.get_rows(rows, at_z)
+        from concurrent.futures import ProcessPoolExecutor
+        chunks = [rows[k * len(rows) // jobs:(k + 1) * len(rows) // jobs] for k in range(jobs)]
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(self.get_rows, chunks, [at_z] * jobs))
+        return [hull for hulls, _ in results for hull in hulls], [block for _, blocks in results for block in blocks]
+
+
+def get_hulls(kb, extent_min, extent_max, interpolate_z=False, jobs=1):
+    """Case of the main grid: a rounded shell, with the plate web of hulls between the key holes
+    Args:
+        jobs: number of processes that build the rows of the grid
+    """
+    grid = HullGrid(kb, extent_min, extent_max, interpolate_z=interpolate_z)
+    hulls, outer = grid.get_cells(jobs=jobs)
+    orig_extent_max, orig_extent_min = grid.orig_extent_max, grid.orig_extent_min
+    space_min = grid.space_min
+
+    hulls = union_all(hulls)
+    outer = union_all(outer)
+    box_extent_min, box_extent_max = grid.get_case_box()
 
     cutout_size = orig_extent_max + np.array([0., 0., 2.]) - orig_extent_min + 2 * space_min
     cutout_offset = (orig_extent_max + np.array([0., 0., 2.]) + orig_extent_min) / 2
@@ -0,0 +1,69 @@
+import glob
+import os
+import time
+import traceback
+
+
+class PollingWatcher():
+    """Detect changes to files matching a glob pattern by polling their modification times"""
+
+    def __init__(self, pattern, interval=0.5):
+        """
+        Args:
+            pattern: glob pattern of the files to watch
+            interval: time between polls, in seconds
+        """
+        self.pattern = pattern
+        self.interval = interval
+        self.mtimes = self.snapshot()
+
+    def snapshot(self):
+        mtimes = {}
+        for path in glob.glob(self.pattern):
+            try:
+                mtimes[path] = os.stat(path).st_mtime_ns
+            except FileNotFoundError:  # removed between glob and stat
+                pass
+        return mtimes
+
+    def changes(self):
+        """Files that were added, removed or modified since the last call"""
+        mtimes = self.snapshot()
+        changed = sorted(path for path in set(mtimes) | set(self.mtimes) if mtimes.get(path) != self.mtimes.get(path))
+        self.mtimes = mtimes
+        return changed
+
+    def wait(self):
+        """Block until at least one file changes, and return the changed files"""
+        while True:
+            changed = self.changes()
+            if changed:
+                return changed
+            time.sleep(self.interval)
+
+
+def watch(kb, pattern='config/*.yaml', interval=0.5):
+    """Rebuild kb every time a file matching pattern changes, until interrupted
+    The keyboard and its caches stay in memory, only outputs whose model changed are written again.
+    Args:
+        kb: Keyboard, already built once
+        pattern: glob pattern of the files to watch
+        interval: polling interval, in seconds
+    """
+    watcher = PollingWatcher(pattern, interval=interval)
+    print(f'Watching {pattern} for changes, press ctrl-c to stop')
+    try:
+        while True:
+            changed = watcher.wait()
+            start = time.perf_counter()
+            try:
+                kb.reload()
+                written = kb.build()
+            except Exception:
+                # a half edited config should not end the session
+                traceback.print_exc()
+                continue
+            print(f'{", ".join(changed)} changed, rebuilt in {time.perf_counter() - start:.2f}s, '
+                  f'wrote: {", ".join(written) if written else "nothing"}')
+    except KeyboardInterrupt:
+        pass